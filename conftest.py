@@ -0,0 +1,58 @@
+import pytest
+from celery import Task
+from django.core.cache import cache
+from monitoring.instrumentation import collect
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # Cached catalogue data outlives the per-test database rollback.
+    cache.clear()
+    yield
+
+
+@pytest.fixture
+def run_tasks_inline(monkeypatch):
+    """Run queued tasks in-process, whatever CELERY_TASK_ALWAYS_EAGER says."""
+    def apply_async(task, args=None, kwargs=None, **options):
+        return task.apply(args, kwargs)
+
+    monkeypatch.setattr(Task, "apply_async", apply_async)
+    monkeypatch.setattr(Task, "delay", lambda task, *args, **kwargs: task.apply(args, kwargs))
+
+
+def _measure(fetch):
+    # A cached response would hide the queries behind it.
+    cache.clear()
+    with collect() as stats:
+        response = fetch()
+    assert response.status_code == 200, (response.status_code, getattr(response, "data", None))
+    return stats, response
+
+
+@pytest.fixture
+def assert_constant_queries(db):
+    """Check that fetch() runs as many queries after seed(9 * n) as after seed(n).
+
+    seed(count) adds `count` more rows to whatever fetch() reads. On growth
+    the failure lists each SQL signature whose count went up, which points
+    at the missing select_related/prefetch_related. Returns the response
+    from the larger run.
+    """
+    def check(seed, fetch, n=1, factor=10):
+        seed(n)
+        small, _ = _measure(fetch)
+        seed(n * factor - n)
+        large, response = _measure(fetch)
+        grown = [
+            (small.signatures[sql], count, sql)
+            for sql, count in large.signatures.most_common()
+            if count > small.signatures[sql]
+        ]
+        assert large.query_count <= small.query_count, "\n".join(
+            [f"{small.query_count} queries for {n} rows, {large.query_count} for {n * factor}:"]
+            + [f"  {before} -> {after}: {sql}" for before, after, sql in grown]
+        )
+        return response
+
+    return check
@@ -0,0 +1,24 @@
+import ipaddress
+from django.conf import settings
+
+
+def _trusted_proxy(address):
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(proxy, strict=False) for proxy in settings.TRUSTED_PROXY_IPS)
+
+
+def client_ip(request):
+    """The caller's address.
+
+    REMOTE_ADDR, unless it is one of TRUSTED_PROXY_IPS: then the proxy's
+    X-Real-IP, or the last X-Forwarded-For hop it appended. Headers from
+    any other peer are ignored, since a client can set them to anything.
+    """
+    remote = request.META.get("REMOTE_ADDR", "")
+    if not _trusted_proxy(remote):
+        return remote
+    forwarded = request.META.get("HTTP_X_REAL_IP") or request.META.get("HTTP_X_FORWARDED_FOR", "").split(",")[-1]
+    return forwarded.strip() or remote
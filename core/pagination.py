@@ -0,0 +1,49 @@
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class OptInCursorPagination(PageNumberPagination):
+    """
+    Page-number pagination unless the client asks for keyset pagination with
+    ?pagination=cursor (or follows a cursor link). Cursor pages skip the
+    COUNT(*) query and seek on `cursor_ordering` instead of using OFFSET.
+
+    Query parameters that choose their own order (listed in
+    `cursor_incompatible_params`) are refused in cursor mode rather than
+    silently replaced by `cursor_ordering`.
+    """
+    cursor_ordering = ('-id',)
+    cursor_incompatible_params = ()
+    mode_query_param = 'pagination'
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        if self.use_cursor(request):
+            conflicting = [param for param in self.cursor_incompatible_params if request.query_params.get(param)]
+            if conflicting:
+                raise ValidationError({
+                    param: "Not supported with cursor pagination; use page-number pagination." for param in conflicting
+                })
+            self.cursor_paginator = self.get_cursor_paginator()
+            return self.cursor_paginator.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def use_cursor(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or CursorPagination.cursor_query_param in request.query_params
+        )
+
+    def get_cursor_paginator(self):
+        paginator = CursorPagination()
+        paginator.ordering = self.cursor_ordering
+        paginator.page_size = self.page_size
+        paginator.page_size_query_param = self.page_size_query_param
+        paginator.max_page_size = self.max_page_size
+        return paginator
@@ -12,8 +12,10 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 from datetime import timedelta
 from decouple import config
+from corsheaders.defaults import default_headers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -29,6 +31,9 @@ SECRET_KEY = config("SECRET_KEY")
 DEBUG = config("DEBUG", cast=bool)
 
 ALLOWED_HOSTS = config("ALLOWED_HOSTS", cast=lambda v: [s.strip() for s in v.split(",")])
+# Reverse proxies (addresses or CIDR ranges, e.g. the nginx container's network)
+# whose X-Real-IP / X-Forwarded-For headers name the real client. See core.http.
+TRUSTED_PROXY_IPS = config("TRUSTED_PROXY_IPS", default="", cast=lambda v: [s.strip() for s in v.split(",") if s.strip()])
 
 
 # Application definition
@@ -48,9 +53,12 @@ INSTALLED_APPS = [
     'customer',
     'drf_yasg',
     'order',
+    'monitoring',
 ]
 
 MIDDLEWARE = [
+    'monitoring.middleware.PerformanceMiddleware',
+    'monitoring.middleware.ProfilerMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -152,7 +160,7 @@ AUTH_USER_MODEL = 'customer.Customer'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'customer.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
@@ -170,8 +178,13 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=REFRESH_TOKEN_LIFETIME),
     "BLACKLIST_AFTER_ROTATION": True,
     "ROTATE_REFRESH_TOKENS": True,
+    "TOKEN_REFRESH_SERIALIZER": "customer.serializers.CachedBlacklistTokenRefreshSerializer",
 }
 
+# customer.authentication caches the request user's auth fields.
+AUTH_USER_CACHE_TTL = config("AUTH_USER_CACHE_TTL", default=300, cast=int)
+AUTH_USER_LOCAL_TTL = config("AUTH_USER_LOCAL_TTL", default=5, cast=int)
+
 
 
 CACHES = {
@@ -193,6 +206,13 @@ EMAIL_USE_TLS = config("EMAIL_USE_TLS", cast=bool)
 EMAIL_HOST_USER = config("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = config("EMAIL_HOST_PASSWORD")
 DEFAULT_FROM_EMAIL = config("DEFAULT_FROM_EMAIL")
+# Transactional email is queued in Redis and sent in batches by flush_email_queue.
+MAIL_BATCH_SIZE = config("MAIL_BATCH_SIZE", default=100, cast=int)
+MAIL_FLUSH_INTERVAL = config("MAIL_FLUSH_INTERVAL", default=10, cast=int)
+MAIL_MAX_ATTEMPTS = config("MAIL_MAX_ATTEMPTS", default=5, cast=int)
+MAIL_RETRY_BACKOFF = config("MAIL_RETRY_BACKOFF", default=30, cast=int)
+# A claimed batch not settled within this many seconds (worker crashed) is queued again.
+MAIL_PROCESSING_TIMEOUT = config("MAIL_PROCESSING_TIMEOUT", default=300, cast=int)
 
 
 
@@ -201,11 +221,96 @@ CELERY_BROKER_URL = config("CELERY_BROKER_URL")
 CELERY_ACCEPT_CONTENT = config("CELERY_ACCEPT_CONTENT").split(",")
 CELERY_TASK_SERIALIZER = config("CELERY_TASK_SERIALIZER")
 
+FLASH_SALE_RECONCILE_INTERVAL = config("FLASH_SALE_RECONCILE_INTERVAL", default=5, cast=int)
+
+CART_RESERVATION_ENABLED = config("CART_RESERVATION_ENABLED", default=False, cast=bool)
+CART_RESERVATION_TTL = config("CART_RESERVATION_TTL", default=900, cast=int)
+CART_RESERVATION_SWEEP_INTERVAL = config("CART_RESERVATION_SWEEP_INTERVAL", default=60, cast=int)
+
+# Pending payments older than this many seconds are settled by reconciliation.
+PAYMENT_RECONCILE_AFTER = config("PAYMENT_RECONCILE_AFTER", default=30 * 60, cast=int)
+PAYMENT_RECONCILE_INTERVAL = config("PAYMENT_RECONCILE_INTERVAL", default=10 * 60, cast=int)
+# A payment the gateway keeps answering with a non-definitive code is marked
+# failed, and logged for an operator, once it is this many seconds old.
+PAYMENT_RECONCILE_GIVE_UP_AFTER = config("PAYMENT_RECONCILE_GIVE_UP_AFTER", default=3 * 24 * 60 * 60, cast=int)
+
+# Fallback for the run_outbox_relay process; see order.outbox.
+OUTBOX_RELAY_INTERVAL = config("OUTBOX_RELAY_INTERVAL", default=30, cast=int)
+
+TOKEN_PURGE_INTERVAL = config("TOKEN_PURGE_INTERVAL", default=60 * 60, cast=int)
+
+CELERY_BEAT_SCHEDULE = {
+    "purge-expired-tokens": {
+        "task": "customer.tasks.purge_expired_tokens_task",
+        "schedule": TOKEN_PURGE_INTERVAL,
+    },
+    "relay-outbox": {
+        "task": "order.tasks.relay_outbox",
+        "schedule": OUTBOX_RELAY_INTERVAL,
+    },
+    "flush-email-queue": {
+        "task": "order.tasks.flush_email_queue",
+        "schedule": MAIL_FLUSH_INTERVAL,
+    },
+    "reconcile-flash-sales": {
+        "task": "order.tasks.reconcile_flash_sales",
+        "schedule": FLASH_SALE_RECONCILE_INTERVAL,
+    },
+    "release-expired-cart-reservations": {
+        "task": "order.tasks.release_expired_reservations",
+        "schedule": CART_RESERVATION_SWEEP_INTERVAL,
+    },
+    "reconcile-pending-payments": {
+        "task": "order.tasks.reconcile_pending_payments",
+        "schedule": PAYMENT_RECONCILE_INTERVAL,
+    },
+}
+
 
 
 
 ZARINPAL_MERCHANT_ID = config("ZARINPAL_MERCHANT_ID")
 ZARINPAL_CALLBACK_URL = config("ZARINPAL_CALLBACK_URL")
+ZARINPAL_BASE_URL = config("ZARINPAL_BASE_URL", default="https://sandbox.zarinpal.com")
+ZARINPAL_CONNECT_TIMEOUT = config("ZARINPAL_CONNECT_TIMEOUT", default=3.05, cast=float)
+ZARINPAL_READ_TIMEOUT = config("ZARINPAL_READ_TIMEOUT", default=10, cast=float)
+ZARINPAL_MAX_RETRIES = config("ZARINPAL_MAX_RETRIES", default=2, cast=int)
+ZARINPAL_BREAKER_THRESHOLD = config("ZARINPAL_BREAKER_THRESHOLD", default=5, cast=int)
+ZARINPAL_BREAKER_COOLDOWN = config("ZARINPAL_BREAKER_COOLDOWN", default=30, cast=int)
+# Verify callbacks in a Celery task instead of inside the callback request.
+PAYMENT_VERIFY_ASYNC = config("PAYMENT_VERIFY_ASYNC", default=False, cast=bool)
+
+# monitoring: share of requests measured, thresholds for warnings, and who
+# may scrape /internal/metrics/ (a bearer token, or else these addresses).
+PERF_SAMPLE_RATE = config("PERF_SAMPLE_RATE", default=0.05, cast=float)
+PERF_SLOW_REQUEST_MS = config("PERF_SLOW_REQUEST_MS", default=1000, cast=int)
+PERF_DUPLICATE_THRESHOLD = config("PERF_DUPLICATE_THRESHOLD", default=5, cast=int)
+METRICS_TOKEN = config("METRICS_TOKEN", default="")
+METRICS_ALLOWED_IPS = config("METRICS_ALLOWED_IPS", default="127.0.0.1", cast=lambda v: [s.strip() for s in v.split(",")])
+# On-demand profiling (monitoring.profiling): requests with a staff-signed
+# X-Profile header, plus a PROFILE_SAMPLE_RATE share, run under cProfile.
+PROFILE_SAMPLE_RATE = config("PROFILE_SAMPLE_RATE", default=0.0, cast=float)
+# Outside the source tree (and MEDIA_ROOT, which nginx serves): dumps hold request internals.
+PROFILE_DIR = config("PROFILE_DIR", default=str(Path(tempfile.gettempdir()) / "django-profiles"))
+PROFILE_MAX_RECORDS = config("PROFILE_MAX_RECORDS", default=200, cast=int)
+PROFILE_TOKEN_MAX_AGE = config("PROFILE_TOKEN_MAX_AGE", default=60 * 60, cast=int)
+# SQL parameters hold user data; keep them out of stored traces unless debugging locally.
+PROFILE_SQL_PARAMS = config("PROFILE_SQL_PARAMS", default=False, cast=bool)
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "json": {"()": "monitoring.logging.JsonFormatter"},
+    },
+    "handlers": {
+        "console": {"class": "logging.StreamHandler", "formatter": "json"},
+    },
+    "root": {
+        "handlers": ["console"],
+        "level": config("LOG_LEVEL", default="INFO"),
+    },
+}
 
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",
@@ -215,10 +320,26 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_CREDENTIALS = True
 
+CORS_ALLOW_HEADERS = (*default_headers, "idempotency-key")
+
+IDEMPOTENCY_KEY_TTL = config("IDEMPOTENCY_KEY_TTL", default=60 * 60 * 24, cast=int)
+
 
 
 
 KAVENEGAR_API_KEY = config("KAVENEGAR_API_KEY")
+
+OTP_TTL = config("OTP_TTL", default=300, cast=int)
+# Lock a user out of OTP login after this many wrong codes.
+OTP_MAX_ATTEMPTS = config("OTP_MAX_ATTEMPTS", default=5, cast=int)
+OTP_LOCKOUT = config("OTP_LOCKOUT", default=900, cast=int)
+# OTP requests allowed per username and per IP in OTP_RATE_WINDOW seconds,
+# and across all users in OTP_RATE_GLOBAL_WINDOW seconds.
+OTP_RATE_WINDOW = config("OTP_RATE_WINDOW", default=600, cast=int)
+OTP_RATE_PER_USERNAME = config("OTP_RATE_PER_USERNAME", default=3, cast=int)
+OTP_RATE_PER_IP = config("OTP_RATE_PER_IP", default=10, cast=int)
+OTP_RATE_GLOBAL_WINDOW = config("OTP_RATE_GLOBAL_WINDOW", default=60, cast=int)
+OTP_RATE_GLOBAL = config("OTP_RATE_GLOBAL", default=300, cast=int)
 EMAIL_HOST_USER = config("EMAIL_HOST_USER")
 
 REDIS_LOCATION = config("REDIS_LOCATION")
\ No newline at end of file
@@ -47,6 +47,8 @@ urlpatterns = [
 
     path('api/', include('order.urls')),
 
+    path('internal/', include('monitoring.urls')),
+
     path('swagger/', schema_view.with_ui(), name='schema-swagger-ui'),
 ]
 
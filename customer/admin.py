@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from .models import Customer, Address
+from .authentication import invalidate_user
 
 
 @admin.register(Customer)
@@ -17,7 +18,10 @@ class CustomerAdmin(UserAdmin):
 
     @admin.action(description="Restore selected customers")
     def restore_customer(self, request, queryset):
+        user_ids = list(queryset.values_list('id', flat=True))
         queryset.update(is_deleted=False, is_active=True)
+        for user_id in user_ids:
+            invalidate_user(user_id)
 
 
 @admin.register(Address)
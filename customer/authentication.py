@@ -0,0 +1,98 @@
+"""JWT authentication that resolves the user from a cache instead of the database.
+
+The fields views read from request.user are cached for AUTH_USER_CACHE_TTL
+seconds in Redis and AUTH_USER_LOCAL_TTL seconds in process memory. The user
+is rebuilt from them as a Customer whose other fields are deferred: reading
+one of those fields loads it from the database on demand.
+
+Saving or deleting a Customer invalidates both layers through
+customer.signals. Other processes keep their in-memory copy for at most
+AUTH_USER_LOCAL_TTL seconds.
+"""
+import threading
+import time
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+USER_CACHE_VERSION = 1
+USER_CACHE_FIELDS = (
+    "id", "username", "email", "phone", "is_seller", "is_staff", "is_superuser", "is_active", "is_deleted",
+)
+LOCAL_CACHE_MAX_SIZE = 10000
+
+_local = {}
+_local_lock = threading.Lock()
+
+
+def _cache_key(user_id):
+    return f"authuser:v{USER_CACHE_VERSION}:{user_id}"
+
+
+def _get_local(user_id):
+    entry = _local.get(user_id)
+    if entry is None or entry[0] < time.monotonic():
+        return None
+    return entry[1]
+
+
+def _set_local(user_id, values):
+    with _local_lock:
+        if len(_local) >= LOCAL_CACHE_MAX_SIZE:
+            _local.clear()
+        _local[user_id] = (time.monotonic() + settings.AUTH_USER_LOCAL_TTL, values)
+
+
+def get_user_values(user_id):
+    """Return the cached field values for a user, or None if there is no such user."""
+    values = _get_local(user_id)
+    if values is not None:
+        return values
+
+    values = cache.get(_cache_key(user_id))
+    if values is None:
+        values = (
+            get_user_model().objects.filter(pk=user_id).values_list(*USER_CACHE_FIELDS).first()
+        )
+        if values is None:
+            return None
+        cache.set(_cache_key(user_id), values, settings.AUTH_USER_CACHE_TTL)
+    _set_local(user_id, values)
+    return values
+
+
+def _forget(user_id):
+    cache.delete(_cache_key(user_id))
+    with _local_lock:
+        _local.pop(user_id, None)
+
+
+def invalidate_user(user_id):
+    # Again after commit, so a request racing the transaction cannot re-cache the old row.
+    _forget(user_id)
+    transaction.on_commit(lambda: _forget(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        User = get_user_model()
+        try:
+            user_id = User._meta.pk.to_python(validated_token[api_settings.USER_ID_CLAIM])
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+
+        values = get_user_values(user_id)
+        if values is None:
+            raise AuthenticationFailed("User not found", code="user_not_found")
+
+        # from_db takes values in model field order.
+        loaded = dict(zip(USER_CACHE_FIELDS, values))
+        names = [field.attname for field in User._meta.concrete_fields if field.attname in loaded]
+        user = User.from_db("default", names, [loaded[name] for name in names])
+        if not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        return user
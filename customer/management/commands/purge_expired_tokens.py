@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from customer.tokens import PURGE_BATCH_SIZE, purge_expired_tokens
+
+
+class Command(BaseCommand):
+    help = "Delete expired outstanding and blacklisted refresh tokens in small batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=PURGE_BATCH_SIZE)
+        parser.add_argument("--pause", type=float, default=0.0, help="Seconds to sleep between batches.")
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_tokens(options["batch_size"], options["pause"])
+        self.stdout.write(self.style.SUCCESS(f"Purged {deleted} expired refresh tokens."))
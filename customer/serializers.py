@@ -1,5 +1,7 @@
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
 from customer.models import Customer, Address
+from customer.tokens import RefreshToken
 
 
 class AddressCreateSerializer(serializers.ModelSerializer): 
@@ -30,12 +32,12 @@ class CustomerSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'username', 'email' , 'is_staff', 'is_superuser']
 
     def get_addresses(self, obj):
+        # Filtered in Python so a prefetched `addresses` is used as is.
+        addresses = obj.addresses.all()
         user = self.context['request'].user
-        if user.is_staff or user.is_superuser:
-            active_addresses = obj.addresses.all()
-        else:
-            active_addresses = obj.addresses.filter(is_deleted=False)
-        return AddressSerializer(active_addresses, many=True).data
+        if not (user.is_staff or user.is_superuser):
+            addresses = [address for address in addresses if not address.is_deleted]
+        return AddressSerializer(addresses, many=True).data
 
 
 
@@ -60,3 +62,8 @@ class CustomerCreateSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         return Customer.objects.create_user(**validated_data)
+
+
+
+class CachedBlacklistTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = RefreshToken
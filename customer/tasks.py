@@ -0,0 +1,40 @@
+from celery import shared_task
+from django.contrib.auth import get_user_model
+import logging
+import traceback
+from customer.tokens import purge_expired_tokens
+from customer.utils import get_otp, send_otp_email, send_otp_sms
+
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def send_otp_sms_task(user_id):
+    otp = get_otp(user_id)
+    if otp is None:
+        return "expired"
+    user = get_user_model().objects.get(pk=user_id)
+    if user.phone and send_otp_sms(user.phone, otp) is not None:
+        return "sms"
+    logger.info("SMS unavailable for user %s, falling back to email", user_id)
+    send_otp_email_task.delay(user_id)
+    return "email"
+
+@shared_task(bind=True, max_retries=3)
+def send_otp_email_task(self, user_id):
+    # Read the code again: it may have been used or expired while queued.
+    otp = get_otp(user_id)
+    if otp is None:
+        return "expired"
+    user = get_user_model().objects.get(pk=user_id)
+    try:
+        send_otp_email(user.email, otp)
+    except Exception as exc:
+        logger.error("Email send error (OTP): %s", traceback.format_exc())
+        raise self.retry(exc=exc, countdown=10)
+    return "email"
+
+@shared_task
+def purge_expired_tokens_task():
+    return purge_expired_tokens()
@@ -0,0 +1,139 @@
+"""Query budgets: no customer endpoint may run more queries as its data grows.
+
+Every router-registered list and detail endpoint, and every admin
+changelist, is fetched after seeding N rows and again after 10N. See the
+assert_constant_queries fixture in the root conftest.
+"""
+from types import SimpleNamespace
+import pytest
+from django.contrib.admin.sites import site
+from django.contrib.auth import get_user_model
+from django.test import Client
+from django.urls import reverse
+from rest_framework.test import APIClient
+from customer.models import Address
+from customer.urls import admin_router, router
+
+User = get_user_model()
+
+
+@pytest.fixture
+def world(db):
+    user = User.objects.create_user(username="budget-user", password="pass")
+    admin = User.objects.create_superuser(username="budget-admin", password="pass")
+    client = APIClient()
+    client.force_authenticate(user=user)
+    staff_client = APIClient()
+    staff_client.force_authenticate(user=admin)
+    return SimpleNamespace(user=user, admin=admin, client=client, staff_client=staff_client, rows=0)
+
+
+def next_id(world):
+    world.rows += 1
+    return world.rows
+
+
+def add_address(user, i, **extra):
+    return Address.objects.create(
+        user=user, label=f"Address {i}", address_line_1="Valiasr", city="Tehran",
+        state="Tehran", postal_code="1234567890", country="Iran", **extra
+    )
+
+
+def seed_customers(world, count):
+    customers = []
+    for _ in range(count):
+        i = next_id(world)
+        customer = User.objects.create(username=f"customer-{i}")
+        add_address(customer, i)
+        add_address(customer, i, is_deleted=True)
+        customers.append(customer)
+    return customers
+
+
+def seed_addresses(world, count):
+    return [add_address(world.user, next_id(world)) for _ in range(count)]
+
+
+def seed_any_addresses(world, count):
+    return [customer.addresses.get(is_deleted=False) for customer in seed_customers(world, count)]
+
+
+def grow_customer(world, customer, count):
+    for _ in range(count):
+        i = next_id(world)
+        add_address(customer, i)
+        add_address(customer, i, is_deleted=True)
+
+
+# Router basename -> seed(world, count) returning the rows it created.
+SEEDS = {
+    "customer": seed_customers,
+    "address": seed_addresses,
+    "admin-customer": seed_customers,
+    "admin-address": seed_any_addresses,
+}
+
+# Detail endpoints that nest a collection grow that collection instead.
+GROW = {
+    "customer": grow_customer,
+    "admin-customer": grow_customer,
+}
+
+STAFF_ENDPOINTS = {"admin-customer", "admin-address"}
+
+ADMIN_SEEDS = {
+    User: seed_customers,
+    Address: seed_any_addresses,
+}
+
+
+def client_for(world, basename):
+    return world.staff_client if basename in STAFF_ENDPOINTS else world.client
+
+
+def test_every_endpoint_has_a_budget():
+    basenames = {basename for _, _, basename in router.registry + admin_router.registry}
+    assert basenames == set(SEEDS)
+    assert {model for model in site._registry if model._meta.app_label == "customer"} == set(ADMIN_SEEDS)
+
+
+@pytest.mark.parametrize("basename", sorted(SEEDS))
+def test_list_query_budget(basename, world, assert_constant_queries):
+    client = client_for(world, basename)
+    url = reverse(f"{basename}-list")
+    before = client.get(url).data["count"]
+    response = assert_constant_queries(lambda count: SEEDS[basename](world, count), lambda: client.get(url))
+    assert response.data["count"] == before + 10
+
+
+@pytest.mark.parametrize("basename", sorted(SEEDS))
+def test_detail_query_budget(basename, world, assert_constant_queries):
+    client = client_for(world, basename)
+    instance = SEEDS[basename](world, 1)[0]
+    grow = GROW.get(basename)
+
+    def seed(count):
+        if grow:
+            grow(world, instance, count)
+        else:
+            SEEDS[basename](world, count)
+
+    url = reverse(f"{basename}-detail", args=[instance.pk])
+    assert_constant_queries(seed, lambda: client.get(url))
+
+
+def test_customer_addresses_hide_deleted_from_non_staff(world):
+    customer = seed_customers(world, 1)[0]
+    url = reverse("customer-detail", args=[customer.pk])
+
+    assert len(world.client.get(url).data["addresses"]) == 1
+    assert len(world.staff_client.get(url).data["addresses"]) == 2
+
+
+@pytest.mark.parametrize("model", sorted(ADMIN_SEEDS, key=lambda model: model.__name__))
+def test_admin_changelist_query_budget(model, world, assert_constant_queries):
+    client = Client()
+    client.force_login(world.admin)
+    url = reverse(f"admin:customer_{model._meta.model_name}_changelist")
+    assert_constant_queries(lambda count: ADMIN_SEEDS[model](world, count), lambda: client.get(url))
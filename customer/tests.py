@@ -163,4 +163,201 @@ def test_admin_delete_address(db):
     client = APIClient()
     client.force_authenticate(user=admin)
     res = client.delete(f"/api/admin-addresses/{address.id}/")
-    assert res.status_code == 204
\ No newline at end of file
+    assert res.status_code == 204
+
+@pytest.fixture
+def otp_user(db):
+    from customer.utils import redis_client
+
+    for key in redis_client.scan_iter("otp:*"):
+        redis_client.delete(key)
+    yield User.objects.create_user(username="otpuser", email="otp@example.com", password="otp123", phone="09120000000")
+    for key in redis_client.scan_iter("otp:*"):
+        redis_client.delete(key)
+
+def test_otp_falls_back_to_email_and_dedups(otp_user, run_tasks_inline, monkeypatch):
+    from django.core import mail
+    from customer.utils import get_otp
+
+    sms = []
+    monkeypatch.setattr("customer.tasks.send_otp_sms", lambda phone, otp: sms.append(phone))
+    res = APIClient().post("/api/accounts/request-otp/", {"username": "otpuser"}, format="json")
+    assert res.data["message"] == "OTP sent."
+    otp = get_otp(otp_user.id)
+    assert sms == ["09120000000"]
+    assert mail.outbox[0].to == ["otp@example.com"] and otp in mail.outbox[0].body
+
+    res = APIClient().post("/api/accounts/request-otp/", {"username": "otpuser"}, format="json")
+    assert res.data["message"] == "OTP already sent."
+    assert get_otp(otp_user.id) == otp
+    assert len(sms) == 1 and len(mail.outbox) == 1
+
+def test_otp_requests_are_rate_limited(otp_user, settings, monkeypatch):
+    monkeypatch.setattr("customer.tasks.send_otp_sms", lambda phone, otp: "sent")
+    settings.OTP_RATE_PER_USERNAME = 2
+    settings.OTP_RATE_PER_IP = 3
+    client = APIClient()
+    for _ in range(2):
+        assert client.post("/api/accounts/request-otp/", {"username": "otpuser"}, format="json").status_code == 200
+    res = client.post("/api/accounts/request-otp/", {"username": "otpuser"}, format="json")
+    assert res.status_code == 429
+    assert int(res["Retry-After"]) > 0
+
+    # The rejected request did not use up the IP budget; the next one exhausts it.
+    assert client.post("/api/accounts/request-otp/", {"username": "someone"}, format="json").status_code == 404
+    assert client.post("/api/accounts/request-otp/", {"username": "other"}, format="json").status_code == 429
+
+def test_otp_ip_limit_uses_client_address_behind_trusted_proxy(otp_user, settings, monkeypatch):
+    monkeypatch.setattr("customer.tasks.send_otp_sms", lambda phone, otp: "sent")
+    settings.OTP_RATE_PER_USERNAME = 10
+    settings.OTP_RATE_PER_IP = 1
+    settings.TRUSTED_PROXY_IPS = ["172.18.0.0/16"]
+    proxy = APIClient(REMOTE_ADDR="172.18.0.5")
+
+    def request_otp(client, real_ip):
+        return client.post("/api/accounts/request-otp/", {"username": "otpuser"}, format="json", HTTP_X_REAL_IP=real_ip)
+
+    # Clients behind the proxy get buckets of their own.
+    assert request_otp(proxy, "198.51.100.1").status_code == 200
+    assert request_otp(proxy, "198.51.100.2").status_code == 200
+    assert request_otp(proxy, "198.51.100.1").status_code == 429
+
+    # An untrusted peer cannot pick its bucket by setting the header.
+    direct = APIClient(REMOTE_ADDR="203.0.113.9")
+    assert request_otp(direct, "198.51.100.3").status_code == 200
+    assert request_otp(direct, "198.51.100.4").status_code == 429
+
+def test_verify_otp_locks_out_after_failed_attempts(otp_user, settings):
+    from customer.utils import store_otp
+
+    settings.OTP_MAX_ATTEMPTS = 3
+    store_otp(otp_user.id, "111111")
+    client = APIClient()
+    for _ in range(3):
+        res = client.post("/api/accounts/verify-otp/", {"username": "otpuser", "otp": "000000"}, format="json")
+        assert res.status_code == 400
+    res = client.post("/api/accounts/verify-otp/", {"username": "otpuser", "otp": "111111"}, format="json")
+    assert res.status_code == 429
+    assert client.post("/api/accounts/request-otp/", {"username": "otpuser"}, format="json").status_code == 429
+
+def test_verify_otp_issues_tokens(otp_user):
+    from customer.utils import store_otp
+
+    store_otp(otp_user.id, "222222")
+    res = APIClient().post("/api/accounts/verify-otp/", {"username": "otpuser", "otp": "222222"}, format="json")
+    assert res.status_code == 200 and "access" in res.data
+    res = APIClient().post("/api/accounts/verify-otp/", {"username": "otpuser", "otp": "222222"}, format="json")
+    assert res.status_code == 400
+
+
+@pytest.fixture
+def token_client(user):
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from customer.authentication import invalidate_user
+
+    invalidate_user(user.pk)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(user).access_token}")
+    return client
+
+def test_jwt_user_is_resolved_from_cache(token_client, user):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    assert token_client.get("/api/addresses/").status_code == 200
+    with CaptureQueriesContext(connection) as queries:
+        assert token_client.get("/api/addresses/").status_code == 200
+    assert not [q["sql"] for q in queries if 'FROM "customer_customer"' in q["sql"]]
+
+def test_profile_edit_invalidates_cached_user(token_client, user):
+    from customer.authentication import get_user_values, USER_CACHE_FIELDS
+
+    token_client.get("/api/addresses/")
+    res = token_client.put("/api/myuser/", {"phone": "09350000000"}, format="json")
+    assert res.status_code == 200 and res.data["first_name"] == "Soheil"
+    values = dict(zip(USER_CACHE_FIELDS, get_user_values(user.pk)))
+    assert values["phone"] == "09350000000"
+
+def test_soft_deleted_user_cannot_reuse_token(token_client):
+    token_client.get("/api/addresses/")
+    assert token_client.delete("/api/myuser/").status_code == 204
+    assert token_client.get("/api/addresses/").status_code == 401
+
+
+@pytest.fixture
+def jwt_blacklist(db):
+    from customer import tokens
+
+    client = tokens.get_client()
+    for key in client.scan_iter("jwt:blacklist:*"):
+        client.delete(key)
+    tokens.warm_blacklist()
+    yield tokens
+    for key in client.scan_iter("jwt:blacklist:*"):
+        client.delete(key)
+
+def test_rotated_refresh_token_is_rejected_from_redis(jwt_blacklist, user):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    old = str(jwt_blacklist.RefreshToken.for_user(user))
+    res = APIClient().post("/api/accounts/token/refresh/", {"refresh": old}, format="json")
+    assert res.status_code == 200 and res.data["refresh"] != old
+
+    with CaptureQueriesContext(connection) as queries:
+        res = APIClient().post("/api/accounts/token/refresh/", {"refresh": old}, format="json")
+    assert res.status_code == 401
+    assert not [q["sql"] for q in queries if "token_blacklist" in q["sql"]]
+
+def test_blacklist_check_falls_back_to_database(jwt_blacklist, user):
+    refresh = jwt_blacklist.RefreshToken.for_user(user)
+    refresh.blacklist()
+    client = jwt_blacklist.get_client()
+    for key in client.scan_iter("jwt:blacklist:*"):
+        client.delete(key)
+
+    res = APIClient().post("/api/accounts/token/refresh/", {"refresh": str(refresh)}, format="json")
+    assert res.status_code == 401
+    assert client.exists(jwt_blacklist.WARM_KEY)
+    assert jwt_blacklist.is_blacklisted(refresh["jti"])
+
+def test_blacklist_write_failure_drops_warm_marker(jwt_blacklist, user, monkeypatch):
+    from redis.exceptions import ConnectionError
+
+    def unavailable(entries, pipe=None):
+        raise ConnectionError("Redis went away")
+
+    client = jwt_blacklist.get_client()
+    assert 0 < client.ttl(jwt_blacklist.WARM_KEY) <= 24 * 3600
+    refresh = jwt_blacklist.RefreshToken.for_user(user)
+    monkeypatch.setattr(jwt_blacklist, "remember_blacklisted", unavailable)
+    refresh.blacklist()
+    assert not client.exists(jwt_blacklist.WARM_KEY)
+    monkeypatch.undo()
+
+    # While another process holds the warm lock, misses answer from the database without reloading.
+    with client.lock(jwt_blacklist.WARM_LOCK_KEY, timeout=60):
+        assert jwt_blacklist.is_blacklisted(refresh["jti"])
+        assert not client.exists(jwt_blacklist.WARM_KEY)
+    assert jwt_blacklist.is_blacklisted(refresh["jti"])
+    assert client.exists(jwt_blacklist.WARM_KEY)
+
+def test_purge_expired_tokens(jwt_blacklist, user):
+    from datetime import timedelta
+    from io import StringIO
+    from django.core.management import call_command
+    from django.utils import timezone
+    from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+    expired = [jwt_blacklist.RefreshToken.for_user(user) for _ in range(5)]
+    for refresh in expired[:3]:
+        refresh.blacklist()
+    live = jwt_blacklist.RefreshToken.for_user(user)
+    live.blacklist()
+    OutstandingToken.objects.filter(jti__in=[t["jti"] for t in expired]).update(expires_at=timezone.now() - timedelta(days=1))
+
+    assert jwt_blacklist.purge_expired_tokens(batch_size=2) == 5
+    assert list(OutstandingToken.objects.values_list("jti", flat=True)) == [live["jti"]]
+    assert BlacklistedToken.objects.count() == 1
+    call_command("purge_expired_tokens", stdout=StringIO())
+    assert OutstandingToken.objects.count() == 1
@@ -0,0 +1,131 @@
+"""Refresh tokens whose blacklist check is answered by Redis.
+
+simplejwt keeps OutstandingToken/BlacklistedToken rows as the durable
+record. Each blacklisted JTI is also written to its own Redis key, which
+expires when the token does, so refresh and logout answer "is this token
+blacklisted?" without a query. If Redis has lost that state (the warm
+marker is missing), the check falls back to the database and reloads the
+live blacklist; a lock lets only one of several concurrent misses reload it.
+
+The warm marker lives no longer than a refresh token, so a JTI key evicted
+from Redis is restored by the next reload at the latest. A JTI that cannot
+be written to Redis drops the marker instead, sending checks to the database.
+
+purge_expired_tokens keeps both tables bounded. It deletes expired rows in
+short primary-key batches, so no single statement holds locks for long.
+"""
+import logging
+import time
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+logger = logging.getLogger(__name__)
+
+WARM_KEY = "jwt:blacklist:warm"
+WARM_LOCK_KEY = "jwt:blacklist:warm:lock"
+WARM_LOCK_TIMEOUT = 300
+WARM_BATCH_SIZE = 1000
+PURGE_BATCH_SIZE = 1000
+
+
+def blacklist_key(jti):
+    return f"jwt:blacklist:{jti}"
+
+
+def get_client():
+    return get_redis_connection("default")
+
+
+def remember_blacklisted(entries, pipe=None):
+    """Add [(jti, expires_at epoch seconds), ...] to the Redis blacklist."""
+    now = timezone.now().timestamp()
+    own_pipe = pipe is None
+    pipe = pipe or get_client().pipeline(transaction=False)
+    for jti, expires_at in entries:
+        ttl = int(expires_at - now) + 1
+        if ttl > 0:
+            pipe.set(blacklist_key(jti), 1, ex=ttl)
+    if own_pipe:
+        pipe.execute()
+
+
+def warm_blacklist(batch_size=WARM_BATCH_SIZE):
+    """Load every unexpired blacklisted JTI into Redis. Returns how many were loaded."""
+    rows = (
+        BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now())
+        .values_list("token__jti", "token__expires_at")
+        .iterator(chunk_size=batch_size)
+    )
+    loaded = 0
+    pipe = get_client().pipeline(transaction=False)
+    for jti, expires_at in rows:
+        remember_blacklisted([(jti, expires_at.timestamp())], pipe)
+        loaded += 1
+        if loaded % batch_size == 0:
+            pipe.execute()
+    pipe.set(WARM_KEY, 1, ex=int(api_settings.REFRESH_TOKEN_LIFETIME.total_seconds()))
+    pipe.execute()
+    return loaded
+
+
+def warm_once():
+    """Warm the blacklist unless another process is already doing it."""
+    lock = get_client().lock(WARM_LOCK_KEY, timeout=WARM_LOCK_TIMEOUT)
+    if not lock.acquire(blocking=False):
+        return
+    try:
+        warm_blacklist()
+    finally:
+        lock.release()
+
+
+def is_blacklisted(jti):
+    pipe = get_client().pipeline(transaction=False)
+    pipe.exists(blacklist_key(jti))
+    pipe.exists(WARM_KEY)
+    listed, warm = pipe.execute()
+    if listed:
+        return True
+    if warm:
+        return False
+    warm_once()
+    return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+
+def purge_expired_tokens(batch_size=PURGE_BATCH_SIZE, pause=0.0):
+    """Delete expired tokens batch by batch. Returns the outstanding tokens deleted."""
+    now = timezone.now()
+    deleted = 0
+    while True:
+        ids = list(
+            OutstandingToken.objects.filter(expires_at__lte=now).order_by("id").values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            return deleted
+        # Cascades to the batch's BlacklistedToken rows in one extra DELETE.
+        OutstandingToken.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
+        if pause:
+            time.sleep(pause)
+
+
+class RefreshToken(tokens.RefreshToken):
+    def check_blacklist(self):
+        if is_blacklisted(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        result = super().blacklist()
+        try:
+            remember_blacklisted([(self.payload[api_settings.JTI_CLAIM], self.payload["exp"])])
+        except RedisError:
+            # A warm marker without this JTI would let the token through; go to the database instead.
+            logger.warning("Could not cache blacklisted token; dropping the warm marker", exc_info=True)
+            get_client().delete(WARM_KEY)
+        return result
@@ -1,5 +1,5 @@
+import logging
 import random
-import traceback
 import redis
 from django.conf import settings
 from django.core.mail import send_mail
@@ -8,39 +8,116 @@ from kavenegar import KavenegarAPI
 
 redis_client = redis.StrictRedis.from_url(settings.REDIS_LOCATION, decode_responses=True)
 
+logger = logging.getLogger(__name__)
+
 KAVENEGAR_API_KEY = settings.KAVENEGAR_API_KEY
 EMAIL_HOST_USER = settings.EMAIL_HOST_USER
 
+# Fixed-window counters. KEYS are the counters, ARGV holds (limit, window)
+# for each. Nothing is counted unless every counter has room. Returns 0, or
+# the seconds until the first full counter resets.
+RATE_LIMIT_SCRIPT = """
+for i = 1, #KEYS do
+    local used = tonumber(redis.call('GET', KEYS[i]) or '0')
+    if used >= tonumber(ARGV[2 * i - 1]) then
+        return math.max(redis.call('TTL', KEYS[i]), 1)
+    end
+end
+for i = 1, #KEYS do
+    if redis.call('INCR', KEYS[i]) == 1 then
+        redis.call('EXPIRE', KEYS[i], ARGV[2 * i])
+    end
+end
+return 0
+"""
+
+# KEYS: otp, failed attempts, lock. ARGV: input, max attempts, lockout seconds.
+# Returns 1 on a match, 0 on a miss, -1 while locked out.
+VERIFY_SCRIPT = """
+if redis.call('EXISTS', KEYS[3]) == 1 then
+    return -1
+end
+local stored = redis.call('GET', KEYS[1])
+if stored and stored == ARGV[1] then
+    redis.call('DEL', KEYS[1], KEYS[2])
+    return 1
+end
+local attempts = redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+if attempts >= tonumber(ARGV[2]) then
+    redis.call('SET', KEYS[3], 1, 'EX', ARGV[3])
+    redis.call('DEL', KEYS[1], KEYS[2])
+end
+return 0
+"""
+
+def otp_key(user_id):
+    return f"otp:{user_id}"
+
+def attempts_key(user_id):
+    return f"otp:attempts:{user_id}"
+
+def lock_key(user_id):
+    return f"otp:lock:{user_id}"
+
 def generate_otp():
     return str(random.randint(100000, 999999))
 
-def store_otp(user_id, otp, ttl=300):
-    redis_client.setex(f"otp:{user_id}", ttl, otp)
+def store_otp(user_id, otp, ttl=None):
+    """Store a new OTP unless one is still pending. Returns False if one is."""
+    return bool(redis_client.set(otp_key(user_id), otp, ex=ttl or settings.OTP_TTL, nx=True))
 
 def get_otp(user_id):
-    return redis_client.get(f"otp:{user_id}")
+    return redis_client.get(otp_key(user_id))
 
 def delete_otp(user_id):
-    redis_client.delete(f"otp:{user_id}")
+    redis_client.delete(otp_key(user_id))
+
+def is_locked_out(user_id):
+    return redis_client.exists(lock_key(user_id)) > 0
+
+def check_otp_rate_limit(username, ip):
+    """Count one OTP request against the username, IP and global budgets.
+
+    Returns 0 if allowed, otherwise the seconds to wait.
+    """
+    limits = [
+        (f"otp:rl:user:{username}", settings.OTP_RATE_PER_USERNAME, settings.OTP_RATE_WINDOW),
+        (f"otp:rl:ip:{ip}", settings.OTP_RATE_PER_IP, settings.OTP_RATE_WINDOW),
+        ("otp:rl:global", settings.OTP_RATE_GLOBAL, settings.OTP_RATE_GLOBAL_WINDOW),
+    ]
+    args = []
+    for _, limit, window in limits:
+        args += [limit, window]
+    return redis_client.eval(RATE_LIMIT_SCRIPT, len(limits), *[key for key, _, _ in limits], *args)
+
+def request_otp(user):
+    """Create an OTP and queue its delivery. Returns False if a pending OTP was reused."""
+    from customer.tasks import send_otp_sms_task
 
-def send_otp(user):
     otp = generate_otp()
-    store_otp(user.id, otp)
-    print(f"[DEV] OTP for {user.username}: {otp}")
-    return otp
+    if not store_otp(user.id, otp):
+        return False
+    if settings.DEBUG:
+        logger.debug("Generated OTP", extra={"username": user.username, "otp": otp})
+    send_otp_sms_task.delay(user.id)
+    return True
 
 def verify_otp(user, input_otp):
-    stored = get_otp(user.id)
-    if stored and stored == input_otp:
-        delete_otp(user.id)
-        return True
-    return False
+    """Returns True on a match, False on a miss, None while locked out."""
+    result = redis_client.eval(
+        VERIFY_SCRIPT, 3, otp_key(user.id), attempts_key(user.id), lock_key(user.id),
+        str(input_otp), settings.OTP_MAX_ATTEMPTS, settings.OTP_LOCKOUT,
+    )
+    if result == -1:
+        return None
+    return result == 1
 
 def send_otp_email(email, otp):
     subject = 'Your Login OTP'
     message = f'Hi! Your one-time login code is: {otp}'
     send_mail(subject, message, EMAIL_HOST_USER, [email])
-    print(f"[DEV] OTP sent via email to {email}")
+    logger.info("OTP sent by email", extra={"email": email})
 
 def send_otp_sms(phone, otp):
     try:
@@ -51,16 +128,8 @@ def send_otp_sms(phone, otp):
             'message': f'Your login code is: {otp}'
         }
         response = api.sms_send(params)
-        print("[DEV] SMS sent:", response)
+        logger.info("OTP sent by SMS", extra={"phone": phone})
         return response
     except Exception:
-        print("[DEV] SMS Error:\n", traceback.format_exc())
+        logger.warning("OTP SMS failed", extra={"phone": phone}, exc_info=True)
         return None
-
-def send_otp_with_fallback(user):
-    otp = generate_otp()
-    store_otp(user.id, otp)
-    print(f"[DEV] Generated OTP for {user.username}: {otp}")
-    if send_otp_sms(user.phone, otp) is None:
-        print(f"[DEV] SMS failed for {user.phone}. Fallback to email: {user.email}")
-        send_otp_email(user.email, otp)
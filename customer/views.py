@@ -3,14 +3,15 @@ from rest_framework import viewsets, generics
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
-from rest_framework_simplejwt.tokens import RefreshToken
 
+from core.http import client_ip
 from customer.models import Customer, Address
 from customer.serializers import (
     CustomerSerializer, CustomerCreateSerializer,
     AddressSerializer, AddressCreateSerializer
 )
-from customer.utils import send_otp_with_fallback, verify_otp
+from customer.tokens import RefreshToken
+from customer.utils import check_otp_rate_limit, is_locked_out, request_otp, verify_otp
 
 User = get_user_model()
 
@@ -18,19 +19,23 @@ User = get_user_model()
 class MeView(APIView):
     permission_classes = [IsAuthenticated]
 
+    def get_object(self):
+        # request.user only carries the cached auth fields; load the full row.
+        return User.objects.get(pk=self.request.user.pk)
+
     def get(self, request):
-        serializer = CustomerSerializer(request.user, context={'request': request})
+        serializer = CustomerSerializer(self.get_object(), context={'request': request})
         return Response(serializer.data)
 
     def put(self, request):
-        serializer = CustomerSerializer(request.user, data=request.data, context={'request': request}, partial=True)
+        serializer = CustomerSerializer(self.get_object(), data=request.data, context={'request': request}, partial=True)
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data)
         return Response(serializer.errors, status=400)
 
     def delete(self, request):
-        request.user.delete()
+        self.get_object().delete()
         return Response({"message": "Account deactivated."}, status=204)
 
 
@@ -59,13 +64,25 @@ class RequestOTPView(APIView):
         if not username:
             return Response({"error": "Username is required."}, status=400)
 
+        retry_after = check_otp_rate_limit(username, client_ip(request))
+        if retry_after:
+            return Response(
+                {"error": "Too many OTP requests. Try again later."},
+                status=429,
+                headers={"Retry-After": str(retry_after)},
+            )
+
         try:
             user = User.objects.get(username=username, is_deleted=False)
-            send_otp_with_fallback(user)
-            return Response({"message": "OTP sent."}, status=200)
         except User.DoesNotExist:
             return Response({"error": "User not found."}, status=404)
 
+        if is_locked_out(user.id):
+            return Response({"error": "Too many failed attempts. Try again later."}, status=429)
+        if not request_otp(user):
+            return Response({"message": "OTP already sent."}, status=200)
+        return Response({"message": "OTP sent."}, status=200)
+
 
 class VerifyOTPView(APIView):
     permission_classes = [AllowAny]
@@ -79,7 +96,10 @@ class VerifyOTPView(APIView):
 
         try:
             user = User.objects.get(username=username, is_deleted=False)
-            if verify_otp(user, otp_input):
+            verified = verify_otp(user, otp_input)
+            if verified is None:
+                return Response({"error": "Too many failed attempts. Try again later."}, status=429)
+            if verified:
                 refresh = RefreshToken.for_user(user)
                 return Response({
                     "message": "OTP verified.",
@@ -92,7 +112,7 @@ class VerifyOTPView(APIView):
 
 
 class CustomerViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Customer.objects.filter(is_deleted=False).order_by("id")  # Added order_by
+    queryset = Customer.objects.filter(is_deleted=False).prefetch_related("addresses").order_by("id")  # Added order_by
     serializer_class = CustomerSerializer
     permission_classes = [IsAuthenticated]
 
@@ -116,7 +136,7 @@ class AddressViewSet(viewsets.ModelViewSet):
 
 
 class AdminCustomerViewSet(viewsets.ModelViewSet):
-    queryset = Customer.objects.filter(is_deleted=False).order_by("id")
+    queryset = Customer.objects.filter(is_deleted=False).prefetch_related("addresses").order_by("id")
     serializer_class = CustomerSerializer
     permission_classes = [IsAdminUser]
 
@@ -0,0 +1,77 @@
+import io
+import pstats
+from django.contrib import admin
+from django.http import FileResponse, Http404
+from django.urls import path, reverse
+from django.utils.html import format_html
+from monitoring import profiling
+from monitoring.models import ProfileRecord
+
+DOWNLOADS = {
+    "stats": (profiling.stats_path, "prof"),
+    "sql": (profiling.sql_path, "sql.json"),
+}
+
+
+@admin.register(ProfileRecord)
+class ProfileRecordAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'method', 'path', 'view', 'status', 'duration_ms', 'query_count', 'sql_ms', 'trigger', 'downloads']
+    list_filter = ['trigger', 'view', 'status']
+    search_fields = ['path', 'view']
+    readonly_fields = [
+        'created_at', 'method', 'path', 'view', 'status', 'duration_ms', 'query_count', 'sql_ms',
+        'trigger', 'user_id', 'downloads', 'top_functions',
+    ]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path(
+                '<int:pk>/download/<str:kind>/',
+                self.admin_site.admin_view(self.download),
+                name='monitoring_profilerecord_download',
+            ),
+        ] + super().get_urls()
+
+    def download(self, request, pk, kind):
+        if kind not in DOWNLOADS or not self.has_view_permission(request):
+            raise Http404
+        record = self.get_object(request, pk)
+        if record is None:
+            raise Http404
+        path_for, extension = DOWNLOADS[kind]
+        try:
+            return FileResponse(open(path_for(record), 'rb'), as_attachment=True, filename=f"profile-{record.pk}.{extension}")
+        except FileNotFoundError:
+            raise Http404
+
+    @admin.display(description='Files')
+    def downloads(self, obj):
+        return format_html(
+            '<a href="{}">pstats</a> | <a href="{}">SQL</a>',
+            reverse('admin:monitoring_profilerecord_download', args=[obj.pk, 'stats']),
+            reverse('admin:monitoring_profilerecord_download', args=[obj.pk, 'sql']),
+        )
+
+    @admin.display(description='Top functions by cumulative time')
+    def top_functions(self, obj):
+        out = io.StringIO()
+        try:
+            pstats.Stats(str(profiling.stats_path(obj)), stream=out).sort_stats('cumulative').print_stats(30)
+        except OSError:
+            return "Profile file is missing."
+        return format_html('<pre>{}</pre>', out.getvalue())
+
+    def delete_model(self, request, obj):
+        profiling.delete_files(obj)
+        super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        for record in queryset:
+            profiling.delete_files(record)
+        super().delete_queryset(request, queryset)
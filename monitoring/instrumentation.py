@@ -0,0 +1,100 @@
+"""Per-request measurement of SQL and serializer time.
+
+PerformanceMiddleware opens a RequestStats for each sampled request. While
+one is open, every query on every database connection is counted and timed
+and its normalized SQL signature is recorded. The outermost call to a DRF
+serializer's ``.data`` is timed as well.
+
+A signature that runs more than once in one request is reported as a
+duplicate: usually an N+1 that needs select_related/prefetch_related.
+"""
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from django.db import connections
+
+_current = ContextVar("request_stats", default=None)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r"\(\s*%s(?:\s*,\s*%s)*\s*\)")
+
+
+def sql_signature(sql):
+    """SQL with literals and parameter lists collapsed, so repeats compare equal."""
+    return _IN_LISTS.sub("(...)", _LITERALS.sub("%s", sql))
+
+
+class RequestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.query_count = 0
+        self.sql_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.signatures = Counter()
+        self.serializer_depth = 0
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def duplicates(self):
+        """[(signature, count), ...] for statements that ran more than once, worst first."""
+        return [(sql, count) for sql, count in self.signatures.most_common() if count > 1]
+
+    def duplicate_count(self):
+        return sum(count - 1 for _, count in self.duplicates())
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_seconds += time.perf_counter() - start
+            self.query_count += 1
+            self.signatures[sql_signature(sql)] += 1
+
+
+def current_stats():
+    return _current.get()
+
+
+@contextmanager
+def collect():
+    stats = RequestStats()
+    token = _current.set(stats)
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+            yield stats
+    finally:
+        _current.reset(token)
+
+
+def _timed_data(prop):
+    def data(self):
+        stats = _current.get()
+        if stats is None or stats.serializer_depth:
+            return prop.fget(self)
+        stats.serializer_depth += 1
+        start = time.perf_counter()
+        try:
+            return prop.fget(self)
+        finally:
+            stats.serializer_seconds += time.perf_counter() - start
+            stats.serializer_depth -= 1
+
+    data.instrumented = True
+    return property(data)
+
+
+def instrument_serializers():
+    """Time serializer.data for sampled requests. Safe to call more than once."""
+    from rest_framework import serializers
+
+    for cls in (serializers.BaseSerializer, serializers.Serializer, serializers.ListSerializer):
+        prop = cls.__dict__["data"]
+        if not getattr(prop.fget, "instrumented", False):
+            cls.data = _timed_data(prop)
@@ -0,0 +1,96 @@
+"""Request metrics aggregated in Redis and rendered in Prometheus text format.
+
+Every worker process adds its sampled requests to one Redis hash, so a
+single scrape of metrics_view covers the whole deployment. Counts are
+sampled: divide by PERF_SAMPLE_RATE for the real request volume.
+"""
+import logging
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+METRICS_VERSION = 1
+METRICS_KEY = f"perf:metrics:v{METRICS_VERSION}"
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+SEPARATOR = "|"
+
+# (metric name, type, help) for the per-view totals, in exposition order.
+VIEW_TOTALS = (
+    ("http_request_db_queries", "counter", "SQL queries run by sampled requests."),
+    ("http_request_db_seconds", "counter", "Time spent in SQL by sampled requests."),
+    ("http_request_duplicate_queries", "counter", "Repeated SQL statements (likely N+1) in sampled requests."),
+    ("http_request_serializer_seconds", "counter", "Time spent in DRF serializers by sampled requests."),
+)
+
+
+def get_client():
+    return get_redis_connection("default")
+
+
+def _field(*parts):
+    return SEPARATOR.join(str(part) for part in parts)
+
+
+def record_request(view, method, status, stats, elapsed):
+    pipe = get_client().pipeline(transaction=False)
+    pipe.hincrby(METRICS_KEY, _field("requests", view, method, status), 1)
+    pipe.hincrbyfloat(METRICS_KEY, _field("duration_sum", view), elapsed)
+    pipe.hincrby(METRICS_KEY, _field("duration_count", view), 1)
+    for limit in DURATION_BUCKETS:
+        if elapsed <= limit:
+            pipe.hincrby(METRICS_KEY, _field("duration_bucket", view, limit), 1)
+    pipe.hincrby(METRICS_KEY, _field("http_request_db_queries", view), stats.query_count)
+    pipe.hincrbyfloat(METRICS_KEY, _field("http_request_db_seconds", view), stats.sql_seconds)
+    pipe.hincrby(METRICS_KEY, _field("http_request_duplicate_queries", view), stats.duplicate_count())
+    pipe.hincrbyfloat(METRICS_KEY, _field("http_request_serializer_seconds", view), stats.serializer_seconds)
+    try:
+        pipe.execute()
+    except RedisError:
+        logger.exception("Could not record request metrics")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def render_prometheus():
+    rows = {}
+    for field, value in get_client().hgetall(METRICS_KEY).items():
+        parts = field.decode().split(SEPARATOR)
+        rows.setdefault(parts[0], []).append((parts[1:], value.decode()))
+
+    lines = [
+        "# HELP http_requests_total Sampled HTTP requests by view, method and status.",
+        "# TYPE http_requests_total counter",
+    ]
+    for (view, method, status), value in sorted(rows.get("requests", [])):
+        lines.append(f"http_requests_total{_labels(view=view, method=method, status=status)} {value}")
+
+    lines += [
+        "# HELP http_request_duration_seconds Time to respond to sampled requests.",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    buckets = {(view, float(limit)): value for (view, limit), value in rows.get("duration_bucket", [])}
+    sums = {view: value for (view,), value in rows.get("duration_sum", [])}
+    for (view,), count in sorted(rows.get("duration_count", [])):
+        for limit in DURATION_BUCKETS:
+            label = _labels(view=view, le=limit)
+            lines.append(f"http_request_duration_seconds_bucket{label} {buckets.get((view, float(limit)), 0)}")
+        lines.append(f"http_request_duration_seconds_bucket{_labels(view=view, le='+Inf')} {count}")
+        lines.append(f"http_request_duration_seconds_sum{_labels(view=view)} {sums.get(view, '0')}")
+        lines.append(f"http_request_duration_seconds_count{_labels(view=view)} {count}")
+
+    for name, kind, description in VIEW_TOTALS:
+        lines += [f"# HELP {name}_total {description}", f"# TYPE {name}_total {kind}"]
+        for (view,), value in sorted(rows.get(name, [])):
+            lines.append(f"{name}_total{_labels(view=view)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    get_client().delete(METRICS_KEY)
@@ -0,0 +1,98 @@
+import logging
+import random
+from django.conf import settings
+from monitoring import metrics, profiling
+from monitoring.instrumentation import collect
+from monitoring.views import can_scrape
+
+logger = logging.getLogger(__name__)
+
+
+def view_label(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unmatched"
+    return match.view_name or match.route or "unnamed"
+
+
+def shows_server_timing(request):
+    """Timings reveal how a request was served, so only staff and metrics scrapers see them."""
+    user = getattr(request, "user", None)
+    return bool(user and user.is_staff) or can_scrape(request)
+
+
+def server_timing(stats, elapsed):
+    return ", ".join([
+        f'db;dur={stats.sql_seconds * 1000:.1f};desc="{stats.query_count} queries"',
+        f'dup;desc="{stats.duplicate_count()} duplicate queries"',
+        f"ser;dur={stats.serializer_seconds * 1000:.1f}",
+        f"total;dur={elapsed * 1000:.1f}",
+    ])
+
+
+class PerformanceMiddleware:
+    """Measure a PERF_SAMPLE_RATE share of requests.
+
+    A sampled response is added to the Prometheus metrics, and carries a
+    Server-Timing header when the caller is staff or an allowed scraper. Repeated SQL statements are logged as warnings.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = settings.PERF_SAMPLE_RATE
+        if rate <= 0 or (rate < 1 and random.random() >= rate):
+            return self.get_response(request)
+
+        with collect() as stats:
+            response = self.get_response(request)
+        elapsed = stats.elapsed
+
+        view = view_label(request)
+        if shows_server_timing(request):
+            response["Server-Timing"] = server_timing(stats, elapsed)
+        metrics.record_request(view, request.method, response.status_code, stats, elapsed)
+
+        duplicates = [(sql, count) for sql, count in stats.duplicates() if count >= settings.PERF_DUPLICATE_THRESHOLD]
+        if duplicates:
+            sql, count = duplicates[0]
+            logger.warning(
+                "Repeated query in %s: %s statements ran more than once",
+                view, len(duplicates),
+                extra={"view": view, "path": request.path, "repeats": count, "sql": sql[:500]},
+            )
+        if elapsed * 1000 >= settings.PERF_SLOW_REQUEST_MS:
+            logger.warning(
+                "Slow request to %s", view,
+                extra={
+                    "view": view, "path": request.path, "status": response.status_code,
+                    "duration_ms": round(elapsed * 1000, 1), "queries": stats.query_count,
+                    "db_ms": round(stats.sql_seconds * 1000, 1),
+                },
+            )
+        return response
+
+
+class ProfilerMiddleware:
+    """Run a request under cProfile when asked to; see monitoring.profiling.
+
+    Without the X-Profile header and with PROFILE_SAMPLE_RATE at 0 this is a
+    dict lookup and a comparison per request.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = request.META.get(profiling.PROFILE_HEADER)
+        if token is None:
+            rate = settings.PROFILE_SAMPLE_RATE
+            if rate <= 0 or random.random() >= rate:
+                return self.get_response(request)
+            return profiling.profile_request(self.get_response, request, "sample")
+
+        user_id = profiling.profile_token_user(token)
+        if user_id is None:
+            return self.get_response(request)
+        return profiling.profile_request(self.get_response, request, "header", user_id)
@@ -0,0 +1,22 @@
+from django.db import models
+
+
+class ProfileRecord(models.Model):
+    """One profiled request. The pstats dump and SQL trace live in PROFILE_DIR."""
+    name = models.CharField(max_length=64, unique=True, editable=False)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    view = models.CharField(max_length=200)
+    status = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    query_count = models.PositiveIntegerField()
+    sql_ms = models.FloatField()
+    trigger = models.CharField(max_length=10)  # "header" or "sample"
+    user_id = models.BigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms, {self.query_count} queries)"
@@ -0,0 +1,149 @@
+"""On-demand cProfile runs of single requests.
+
+A request is profiled when it carries an X-Profile header holding a token
+signed for a staff user (see make_profile_token and profile_token_view), or
+when it falls in the PROFILE_SAMPLE_RATE share. The pstats dump and the SQL
+trace are written to PROFILE_DIR. A ProfileRecord row per run indexes them
+for the admin. Only the newest PROFILE_MAX_RECORDS runs are kept.
+
+The SQL trace holds statement text only. Query parameters carry passwords,
+tokens and personal data, so they are written only with PROFILE_SQL_PARAMS on.
+"""
+import cProfile
+import json
+import logging
+import time
+import uuid
+from contextlib import ExitStack
+from pathlib import Path
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.db import connections, transaction
+from monitoring.models import ProfileRecord
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "HTTP_X_PROFILE"
+TOKEN_SALT = "monitoring.profile"
+MAX_TRACED_QUERIES = 2000
+
+
+def make_profile_token(user):
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign(str(user.pk))
+
+
+def profile_token_user(token):
+    """The id of the active staff user a token was signed for, or None."""
+    try:
+        user_id = signing.TimestampSigner(salt=TOKEN_SALT).unsign(token, max_age=settings.PROFILE_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return None
+    if not get_user_model().objects.filter(pk=user_id, is_staff=True, is_active=True).exists():
+        return None
+    return int(user_id)
+
+
+def profile_dir():
+    return Path(settings.PROFILE_DIR)
+
+
+def stats_path(record):
+    return profile_dir() / f"{record.name}.prof"
+
+
+def sql_path(record):
+    return profile_dir() / f"{record.name}.sql.json"
+
+
+class SQLTrace:
+    def __init__(self):
+        self.queries = []
+        self.total = 0
+        self.seconds = 0.0
+        self.with_params = settings.PROFILE_SQL_PARAMS
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.total += 1
+            self.seconds += elapsed
+            if len(self.queries) < MAX_TRACED_QUERIES:
+                query = {"sql": sql, "ms": round(elapsed * 1000, 3)}
+                if self.with_params:
+                    query["params"] = repr(params)
+                self.queries.append(query)
+
+
+def profile_request(get_response, request, trigger, user_id=None):
+    profiler = cProfile.Profile()
+    trace = SQLTrace()
+    start = time.perf_counter()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(trace))
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler (a debugger, coverage) owns the hook; run unprofiled.
+            logger.warning("Profiler unavailable for %s", request.path)
+            return get_response(request)
+        try:
+            response = get_response(request)
+        finally:
+            profiler.disable()
+    elapsed = time.perf_counter() - start
+
+    try:
+        record = save_profile(request, response, trigger, user_id, profiler, trace, elapsed)
+    except Exception:
+        # Profiling must never fail the request it observed.
+        logger.exception("Could not store profile for %s", request.path)
+        return response
+    response["X-Profile-Id"] = str(record.pk)
+    return response
+
+
+def save_profile(request, response, trigger, user_id, profiler, trace, elapsed):
+    match = getattr(request, "resolver_match", None)
+    record = ProfileRecord(
+        name=uuid.uuid4().hex,
+        method=request.method,
+        path=request.path[:500],
+        view=(match.view_name if match else "") or "unmatched",
+        status=response.status_code,
+        duration_ms=round(elapsed * 1000, 1),
+        query_count=trace.total,
+        sql_ms=round(trace.seconds * 1000, 1),
+        trigger=trigger,
+        user_id=user_id,
+    )
+    profile_dir().mkdir(parents=True, exist_ok=True)
+    profiler.dump_stats(stats_path(record))
+    try:
+        sql_path(record).write_text(json.dumps({"total": trace.total, "queries": trace.queries}, indent=1))
+        with transaction.atomic():
+            record.save()
+            prune()
+    except Exception:
+        delete_files(record)
+        raise
+    return record
+
+
+def delete_files(record):
+    for path in (stats_path(record), sql_path(record)):
+        path.unlink(missing_ok=True)
+
+
+def prune(keep=None):
+    """Drop all but the newest `keep` profiles (default PROFILE_MAX_RECORDS)."""
+    keep = settings.PROFILE_MAX_RECORDS if keep is None else keep
+    stale = list(ProfileRecord.objects.order_by("-created_at", "-id")[keep:])
+    for record in stale:
+        delete_files(record)
+    ProfileRecord.objects.filter(pk__in=[record.pk for record in stale]).delete()
+    return len(stale)
@@ -0,0 +1,171 @@
+import json
+import logging
+import pytest
+from django.contrib.auth import get_user_model
+from django.test import Client
+from rest_framework.test import APIClient
+from store.models import Product
+from store.serializers import ProductSerializer
+from monitoring.instrumentation import collect, sql_signature
+from monitoring.logging import JsonFormatter
+
+User = get_user_model()
+
+
+@pytest.fixture
+def products(db):
+    return [Product.objects.create(name=f"Phone {i}", description="Smartphone", is_active=True) for i in range(3)]
+
+@pytest.fixture
+def sampled(settings):
+    settings.PERF_SAMPLE_RATE = 1
+    return settings
+
+
+def test_sampled_request_gets_server_timing(sampled, products):
+    res = APIClient().get("/api/products/")
+    assert res.status_code == 200
+    timing = res["Server-Timing"]
+    assert timing.startswith("db;dur=") and "ser;dur=" in timing and "total;dur=" in timing
+
+def test_server_timing_is_only_shown_to_staff_and_scrapers(sampled, products):
+    public = APIClient(REMOTE_ADDR="203.0.113.7")
+    assert "Server-Timing" not in public.get("/api/products/")
+
+    sampled.METRICS_ALLOWED_IPS = ["203.0.113.7"]
+    assert "Server-Timing" in public.get("/api/products/")
+    sampled.METRICS_ALLOWED_IPS = []
+
+    staff = APIClient(REMOTE_ADDR="203.0.113.7")
+    staff.force_authenticate(User.objects.create_user(username="ops", password="x", is_staff=True))
+    assert "Server-Timing" in staff.get("/api/products/")
+
+def test_metrics_allowlist_reads_client_address_behind_trusted_proxy(settings, db):
+    settings.METRICS_ALLOWED_IPS = ["10.0.0.7"]
+    settings.TRUSTED_PROXY_IPS = ["172.18.0.5"]
+    assert APIClient(REMOTE_ADDR="172.18.0.5").get(
+        "/internal/metrics/", HTTP_X_FORWARDED_FOR="203.0.113.1, 10.0.0.7"
+    ).status_code == 200
+    assert APIClient(REMOTE_ADDR="172.18.0.5").get("/internal/metrics/", HTTP_X_REAL_IP="203.0.113.1").status_code == 403
+    assert APIClient(REMOTE_ADDR="203.0.113.1").get("/internal/metrics/", HTTP_X_REAL_IP="10.0.0.7").status_code == 403
+
+def test_unsampled_request_is_not_measured(settings, products):
+    settings.PERF_SAMPLE_RATE = 0
+    assert "Server-Timing" not in APIClient().get("/api/products/")
+
+def test_metrics_endpoint_renders_prometheus(sampled, products):
+    APIClient().get("/api/products/")
+    APIClient().get("/api/products/")
+
+    res = APIClient().get("/internal/metrics/", REMOTE_ADDR="127.0.0.1")
+    assert res.status_code == 200
+    body = res.content.decode()
+    assert 'http_requests_total{view="product-list",method="GET",status="200"} 2' in body
+    assert 'http_request_duration_seconds_count{view="product-list"} 2' in body
+    assert 'http_request_db_queries_total{view="product-list"}' in body
+
+def test_metrics_endpoint_is_internal(sampled):
+    assert APIClient().get("/internal/metrics/", REMOTE_ADDR="10.1.2.3").status_code == 403
+    sampled.METRICS_TOKEN = "s3cret"
+    assert APIClient().get("/internal/metrics/", REMOTE_ADDR="127.0.0.1").status_code == 403
+    res = APIClient().get("/internal/metrics/", REMOTE_ADDR="10.1.2.3", HTTP_AUTHORIZATION="Bearer s3cret")
+    assert res.status_code == 200
+
+def test_repeated_queries_are_reported(products):
+    with collect() as stats:
+        for product in products:
+            Product.objects.get(pk=product.pk)
+        ProductSerializer(products, many=True).data
+    sql, count = stats.duplicates()[0]
+    assert count == 3 and '"store_product"' in sql
+    assert "%s" in sql and str(products[0].pk) not in sql.split("WHERE")[1]
+    assert stats.duplicate_count() >= 2
+    assert stats.serializer_seconds > 0
+
+def test_sql_signature_collapses_literals():
+    assert sql_signature("SELECT 1 FROM t WHERE id IN (%s, %s, %s) AND name = 'x'") == (
+        "SELECT %s FROM t WHERE id IN (...) AND name = %s"
+    )
+
+def test_json_log_format_includes_extra_fields():
+    record = logging.LogRecord("order.views", logging.INFO, __file__, 1, "Payment %s", ("ok",), None)
+    record.authority = "A123"
+    event = json.loads(JsonFormatter().format(record))
+    assert event["level"] == "INFO" and event["message"] == "Payment ok" and event["authority"] == "A123"
+
+
+@pytest.fixture
+def staff(db):
+    return User.objects.create_user(username="ops", password="ops12345", is_staff=True, is_superuser=True)
+
+@pytest.fixture
+def profile_dir(settings, tmp_path):
+    settings.PROFILE_DIR = str(tmp_path)
+    return tmp_path
+
+def test_signed_header_profiles_request(staff, profile_dir, products):
+    from monitoring.models import ProfileRecord
+
+    admin = APIClient()
+    admin.force_authenticate(staff)
+    token = admin.post("/internal/profile-token/").data["token"]
+
+    res = APIClient().get(f"/api/products/{products[0].pk}/", HTTP_X_PROFILE=token)
+    assert res.status_code == 200
+    record = ProfileRecord.objects.get(pk=res["X-Profile-Id"])
+    assert (record.view, record.trigger, record.user_id) == ("product-detail", "header", staff.pk)
+    assert record.query_count > 0
+    assert {path.name for path in profile_dir.iterdir()} == {f"{record.name}.prof", f"{record.name}.sql.json"}
+
+    site = Client()
+    site.force_login(staff)
+    download = site.get(f"/admin/monitoring/profilerecord/{record.pk}/download/sql/")
+    trace = json.loads(b"".join(download.streaming_content))
+    assert trace["total"] == record.query_count
+    assert all(set(query) == {"sql", "ms"} for query in trace["queries"])
+    assert site.get(f"/admin/monitoring/profilerecord/{record.pk}/change/").status_code == 200
+
+def test_sql_trace_records_params_only_when_enabled(settings, products):
+    from django.db import connection
+    from monitoring.profiling import SQLTrace
+
+    for enabled in (False, True):
+        settings.PROFILE_SQL_PARAMS = enabled
+        trace = SQLTrace()
+        with connection.execute_wrapper(trace):
+            Product.objects.filter(name="secret-name").exists()
+        assert ("secret-name" in repr(trace.queries)) is enabled
+
+def test_failing_profile_store_does_not_fail_the_request(settings, profile_dir, products, monkeypatch):
+    from django.db import DatabaseError
+    from monitoring import profiling
+    from monitoring.models import ProfileRecord
+
+    def broken_prune(keep=None):
+        raise DatabaseError("profile table is locked")
+
+    settings.PROFILE_SAMPLE_RATE = 1
+    monkeypatch.setattr(profiling, "prune", broken_prune)
+    res = APIClient().get("/api/products/")
+    assert res.status_code == 200 and "X-Profile-Id" not in res
+    assert not ProfileRecord.objects.exists()
+    assert list(profile_dir.iterdir()) == []
+
+def test_invalid_profile_header_is_ignored(profile_dir, products, db):
+    from monitoring.models import ProfileRecord
+    from monitoring.profiling import make_profile_token
+
+    customer = User.objects.create_user(username="buyer", password="buyer123")
+    for token in ("forged:token", make_profile_token(customer)):
+        res = APIClient().get("/api/products/", HTTP_X_PROFILE=token)
+        assert res.status_code == 200 and "X-Profile-Id" not in res
+    assert not ProfileRecord.objects.exists()
+
+def test_sampled_profiles_are_kept_in_a_ring_buffer(settings, profile_dir, products):
+    from monitoring.models import ProfileRecord
+
+    settings.PROFILE_SAMPLE_RATE = 1
+    settings.PROFILE_MAX_RECORDS = 2
+    ids = [int(APIClient().get("/api/products/")["X-Profile-Id"]) for _ in range(3)]
+    assert sorted(ProfileRecord.objects.values_list("pk", flat=True)) == ids[1:]
+    assert len(list(profile_dir.iterdir())) == 4
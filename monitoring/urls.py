@@ -0,0 +1,8 @@
+from django.urls import path
+from monitoring.views import metrics_view, profile_token_view
+
+
+urlpatterns = [
+    path('metrics/', metrics_view, name='metrics'),
+    path('profile-token/', profile_token_view, name='profile-token'),
+]
@@ -0,0 +1,35 @@
+import hmac
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from core.http import client_ip
+from monitoring.metrics import render_prometheus
+from monitoring.profiling import make_profile_token
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def can_scrape(request):
+    token = settings.METRICS_TOKEN
+    if token:
+        return hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}")
+    return client_ip(request) in settings.METRICS_ALLOWED_IPS
+
+
+def metrics_view(request):
+    if not can_scrape(request):
+        return HttpResponseForbidden()
+    return HttpResponse(render_prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def profile_token_view(request):
+    """A token for the X-Profile header; requests carrying it are profiled."""
+    return Response({
+        "header": "X-Profile",
+        "token": make_profile_token(request.user),
+        "expires_in": settings.PROFILE_TOKEN_MAX_AGE,
+    })
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from rest_framework.exceptions import ValidationError
-from .models import Cart, CartItem, Order, OrderItem, Payment
+from .models import Cart, CartItem, Order, OrderItem, OutboxMessage, Payment
 
 # 🛒 Inline CartItems in Cart
 class CartItemInline(admin.TabularInline):
@@ -60,6 +60,8 @@ class OrderItemInline(admin.TabularInline):
 class OrderAdmin(admin.ModelAdmin):
     list_display = ['id', 'user', 'status', 'total_price', 'created_at']
     list_filter = ['status', 'created_at']
+    # Order.__str__ (the action checkbox label) shows the user and the address.
+    list_select_related = ['user', 'address__user']
     search_fields = ['user__username']
     autocomplete_fields = ['user', 'address']
     readonly_fields = ['created_at', 'updated_at']
@@ -68,6 +70,7 @@ class OrderAdmin(admin.ModelAdmin):
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
     list_display = ['order', 'store_item', 'quantity', 'price', 'total_price']
+    list_select_related = ['order__user', 'order__address__user', 'store_item__product', 'store_item__store']
     search_fields = ['store_item__product__name']
     autocomplete_fields = ['order', 'store_item']
     readonly_fields = ['price', 'total_price']
@@ -75,10 +78,17 @@ class OrderItemAdmin(admin.ModelAdmin):
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
     list_display = ['order', 'transaction_id', 'amount', 'fee', 'status', 'created_at']
+    list_select_related = ['order__user', 'order__address__user']
     search_fields = ['transaction_id', 'reference_id']
     autocomplete_fields = ['order']
     readonly_fields = ['created_at', 'updated_at', 'transaction_id', 'reference_id', 'card_pan']
 
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ['id', 'task', 'attempts', 'available_at', 'created_at']
+    list_filter = ['task']
+    readonly_fields = ['task', 'args', 'attempts', 'created_at']
+
 
 
 
@@ -0,0 +1,125 @@
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from customer.models import Address
+from order import flash_sale, outbox
+from order.models import Cart, CartItem, Order, OrderItem
+from order.tasks import send_order_received_email
+from store.cache import invalidate_products
+from store.models import StoreItem
+from store.utils import by_store_item
+
+CHECKOUT_BATCH_SIZE = 500
+
+
+def reserve_stock(quantities, batch_size=CHECKOUT_BATCH_SIZE, held=None):
+    """Decrement stock for {store_item_id: quantity} with one conditional UPDATE per batch.
+
+    `held` maps store items to quantity this cart already holds in
+    StoreItem.reserved; it is consumed, while other carts' holds must stay covered.
+    Returns False as soon as a batch updates fewer rows than it holds; earlier
+    batches are already applied, so the caller must roll back.
+    """
+    held = held or {}
+    now = timezone.now()
+    ids = sorted(quantities)
+    for start in range(0, len(ids), batch_size):
+        batch = {pk: quantities[pk] for pk in ids[start:start + batch_size]}
+        quantity = by_store_item(batch)
+        reserved = F("reserved")
+        if any(held.get(pk) for pk in batch):
+            reserved = F("reserved") - by_store_item({pk: held.get(pk, 0) for pk in batch})
+        updated = StoreItem.objects.filter(pk__in=batch, stock__gte=reserved + quantity).update(
+            stock=F("stock") - quantity,
+            reserved=reserved,
+            units_sold=F("units_sold") + quantity,
+            order_count=F("order_count") + 1,
+            updated_at=now,
+        )
+        if updated != len(batch):
+            return False
+    return True
+
+
+def checkout_cart(user, address_id, batch_size=CHECKOUT_BATCH_SIZE):
+    """Turn the user's cart into an order in a fixed number of queries.
+
+    Flash-sale items are reserved in Redis and reconciled to the database
+    later; everything else is decremented by reserve_stock. Only the cart
+    lines are locked: the conditional UPDATE already refuses to oversell.
+    """
+    reserved = []
+    try:
+        with transaction.atomic():
+            lines = list(
+                CartItem.objects.filter(cart__user=user)
+                .select_related("store_item__product")
+                .select_for_update(of=("self",))
+                .order_by("store_item_id")
+            )
+            if not lines:
+                if not Cart.objects.filter(user=user).exists():
+                    raise ValidationError("Cart not found for this user.")
+                raise ValidationError("Your cart is empty.")
+
+            try:
+                address = Address.objects.get(id=address_id, user=user)
+            except Address.DoesNotExist:
+                raise ValidationError("Address not found.")
+
+            items = {line.store_item_id: line.store_item for line in lines}
+            quantities = defaultdict(int)
+            held = defaultdict(int)
+            for line in lines:
+                quantities[line.store_item_id] += line.quantity
+                held[line.store_item_id] += line.reserved_quantity
+            for pk, quantity in quantities.items():
+                available = items[pk].available_stock + held[pk]
+                if not items[pk].flash_sale and quantity > available:
+                    raise ValidationError(
+                        f"Insufficient stock for {items[pk].product.name}. "
+                        f"Available: {available}"
+                    )
+
+            flash_items = [(items[pk], quantity) for pk, quantity in quantities.items() if items[pk].flash_sale]
+            try:
+                flash_sale.reserve(flash_items)
+            except flash_sale.SoldOut as exc:
+                raise ValidationError(f"{items[exc.store_item_id].product.name} is sold out.")
+            reserved = flash_items
+
+            order = Order.objects.create(
+                user=user,
+                address=address,
+                total_price=sum(line.total_item_price for line in lines),
+            )
+            OrderItem.objects.bulk_create(
+                [
+                    OrderItem(
+                        order=order,
+                        store_item=line.store_item,
+                        quantity=line.quantity,
+                        price=line.unit_price,
+                        total_price=line.total_item_price,
+                    )
+                    for line in lines
+                ],
+                batch_size=batch_size,
+            )
+
+            regular = {pk: quantity for pk, quantity in quantities.items() if not items[pk].flash_sale}
+            if not reserve_stock(regular, batch_size, held):
+                raise ValidationError("Stock changed during checkout. Please review your cart.")
+
+            invalidate_products({item.product_id for item in items.values()})
+            checked_out = CartItem.objects.filter(pk__in=[line.pk for line in lines])
+            checked_out.filter(reserved_quantity__gt=0).update(reserved_quantity=0)
+            checked_out.delete()
+            outbox.enqueue(send_order_received_email, user.email, order.id)
+    except Exception:
+        flash_sale.release(reserved)
+        raise
+
+    return order
@@ -0,0 +1,134 @@
+"""A local stand-in for the Zarinpal v4 API, for tests and load benchmarks.
+
+Implements payment/request.json, payment/verify.json and StartPay with the
+response shapes of the sandbox. `latency` (seconds) and `failure_rate`
+(share of calls answered with HTTP 503) simulate a degraded gateway.
+"""
+import itertools
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MIN_AMOUNT = 1000
+
+
+class FakeZarinpalHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this, keep-alive
+    # clients stall on delayed ACKs.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if not self.path.startswith("/pg/StartPay/"):
+            return self.send_json(404, {"errors": {"code": -404, "message": "Not found"}})
+        body = b"<html><body>Fake Zarinpal payment page</body></html>"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self.send_json(400, {"data": [], "errors": {"code": -9, "message": "Invalid JSON"}})
+
+        server = self.server
+        server.pause()
+        with server.lock:
+            server.calls[self.path] = server.calls.get(self.path, 0) + 1
+        if server.failure_rate and random.random() < server.failure_rate:
+            return self.send_json(503, {"errors": {"code": -503, "message": "Service unavailable"}})
+
+        if self.path == "/pg/v4/payment/request.json":
+            return self.send_json(200, server.request_payment(payload))
+        if self.path == "/pg/v4/payment/verify.json":
+            return self.send_json(200, server.verify(payload))
+        return self.send_json(404, {"data": [], "errors": {"code": -404, "message": "Not found"}})
+
+
+class FakeZarinpal(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, failure_rate=0.0):
+        super().__init__((host, port), FakeZarinpalHandler)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.payments = {}
+        self.calls = {}
+        self.ref_ids = itertools.count(201)
+        self.lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def pause(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def error(self, code, message):
+        return {"data": [], "errors": {"code": code, "message": message, "validations": []}}
+
+    def request_payment(self, payload):
+        if not payload.get("merchant_id"):
+            return self.error(-9, "The merchant id is required.")
+        if int(payload.get("amount") or 0) < MIN_AMOUNT:
+            return self.error(-9, "The amount must be at least 1000.")
+        authority = "A" + uuid.uuid4().hex[:35].upper()
+        with self.lock:
+            self.payments[authority] = {"amount": int(payload["amount"]), "verified": False}
+        return {
+            "data": {"code": 100, "message": "Success", "authority": authority, "fee_type": "Merchant", "fee": 0},
+            "errors": [],
+        }
+
+    def verify(self, payload):
+        with self.lock:
+            payment = self.payments.get(payload.get("authority"))
+            if payment is None:
+                return self.error(-51, "Session is not valid, session is not active paid try.")
+            if int(payload.get("amount") or 0) != payment["amount"]:
+                return self.error(-50, "Session is not valid, amounts values is not the same.")
+            code = 101 if payment["verified"] else 100
+            payment["verified"] = True
+            payment.setdefault("ref_id", next(self.ref_ids))
+        return {
+            "data": {
+                "code": code,
+                "message": "Verified" if code == 100 else "Already verified",
+                "card_hash": uuid.uuid4().hex.upper(),
+                "card_pan": "502229******5995",
+                "ref_id": payment["ref_id"],
+                "fee_type": "Merchant",
+                "fee": 0,
+            },
+            "errors": [],
+        }
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,221 @@
+"""Flash-sale stock held in Redis.
+
+For StoreItems with ``flash_sale=True`` checkout reserves stock against an
+atomic Redis counter instead of the database row, so concurrent buyers never
+wait on a row lock. Each reservation also records the units and orders still
+owed to the database in a pending hash; ``reconcile_flash_sales`` (a Celery
+beat task) moves them into StoreItem.stock/units_sold/order_count.
+
+Draining moves the pending totals into an in-flight hash tagged with a run
+id, so a counter primed before they reach the database still subtracts them.
+The UPDATE and a FlashSaleRun row for that run id commit together. If a run
+dies before committing, or before clearing the in-flight hash, the next run
+finds the batch and checks the marker: an unapplied batch is applied, an
+applied one is cleared and its counters are primed again from the database.
+
+All keys share the ``{flash}`` hash tag so the scripts stay on one cluster slot.
+"""
+import logging
+import uuid
+from datetime import timedelta
+from django.db import IntegrityError, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from django_redis import get_redis_connection
+from order.models import FlashSaleRun
+from store.cache import invalidate_products
+from store.models import StoreItem
+from store.utils import by_store_item
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = "flash:{flash}:pending"
+INFLIGHT_KEY = "flash:{flash}:inflight"
+RUN_FIELD = "run"
+# Markers only need to outlive the in-flight batch they vouch for.
+RUN_MARKER_TTL = timedelta(days=1)
+
+# KEYS: stock key per item, then the pending and in-flight hashes.
+# ARGV: (quantity, database stock, store item id) per item.
+# A missing counter is primed from the database stock minus units that are
+# sold but not yet reconciled. Returns 0, or the 1-based index of the first
+# item that cannot be covered (nothing is reserved in that case).
+RESERVE_SCRIPT = """
+local n = #KEYS - 2
+local pending = KEYS[n + 1]
+local inflight = KEYS[n + 2]
+for i = 1, n do
+    if redis.call('EXISTS', KEYS[i]) == 0 then
+        local field = ARGV[3 * i] .. ':units'
+        local owed = tonumber(redis.call('HGET', pending, field) or '0')
+            + tonumber(redis.call('HGET', inflight, field) or '0')
+        redis.call('SET', KEYS[i], math.max(tonumber(ARGV[3 * i - 1]) - owed, 0))
+    end
+    if tonumber(redis.call('GET', KEYS[i])) < tonumber(ARGV[3 * i - 2]) then
+        return i
+    end
+end
+for i = 1, n do
+    redis.call('DECRBY', KEYS[i], ARGV[3 * i - 2])
+    redis.call('HINCRBY', pending, ARGV[3 * i] .. ':units', ARGV[3 * i - 2])
+    redis.call('HINCRBY', pending, ARGV[3 * i] .. ':orders', 1)
+end
+return 0
+"""
+
+RELEASE_SCRIPT = """
+local n = #KEYS - 1
+local pending = KEYS[#KEYS]
+for i = 1, n do
+    redis.call('INCRBY', KEYS[i], ARGV[2 * i - 1])
+    redis.call('HINCRBY', pending, ARGV[2 * i] .. ':units', -tonumber(ARGV[2 * i - 1]))
+    redis.call('HINCRBY', pending, ARGV[2 * i] .. ':orders', -1)
+end
+return n
+"""
+
+# KEYS: pending, in-flight. ARGV: a new run id. Returns the in-flight batch,
+# with its run id in the "run" field: one left behind by an earlier run if
+# there is one, else everything pending, moved in flight under the new id.
+DRAIN_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    redis.call('HSETNX', KEYS[2], 'run', ARGV[1])
+    return redis.call('HGETALL', KEYS[2])
+end
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return {}
+end
+redis.call('RENAME', KEYS[1], KEYS[2])
+redis.call('HSET', KEYS[2], 'run', ARGV[1])
+return redis.call('HGETALL', KEYS[2])
+"""
+
+# KEYS: in-flight. ARGV: run id. Delete the in-flight batch only if it is
+# still that run's, never a newer batch drained after it was cleared.
+CLEAR_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'run') == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class SoldOut(Exception):
+    def __init__(self, store_item_id):
+        super().__init__(store_item_id)
+        self.store_item_id = store_item_id
+
+
+def stock_key(store_item_id):
+    return f"flash:{{flash}}:stock:{store_item_id}"
+
+
+def get_client():
+    return get_redis_connection("default")
+
+
+def reserve(items):
+    """Reserve [(store_item, quantity), ...] atomically or raise SoldOut."""
+    if not items:
+        return
+    keys = [stock_key(item.pk) for item, _ in items] + [PENDING_KEY, INFLIGHT_KEY]
+    args = []
+    for item, quantity in items:
+        args += [quantity, item.stock, item.pk]
+    failed = get_client().eval(RESERVE_SCRIPT, len(keys), *keys, *args)
+    if failed:
+        raise SoldOut(items[failed - 1][0].pk)
+
+
+def release(items):
+    """Undo a reservation whose order was not committed."""
+    if not items:
+        return
+    keys = [stock_key(item.pk) for item, _ in items] + [PENDING_KEY]
+    args = []
+    for item, quantity in items:
+        args += [quantity, item.pk]
+    get_client().eval(RELEASE_SCRIPT, len(keys), *keys, *args)
+
+
+def available(store_item_id):
+    value = get_client().get(stock_key(store_item_id))
+    return None if value is None else int(value)
+
+
+def forget(store_item_id):
+    get_client().delete(stock_key(store_item_id))
+
+
+def drain_pending(run_id=None):
+    """Return the in-flight batch as (run_id, {store_item_id: (units, orders)}).
+
+    An earlier run's unfinished batch comes back first; otherwise the pending
+    totals are moved in flight under run_id. (None, {}) if nothing is owed.
+    """
+    owed = get_client().eval(DRAIN_SCRIPT, 2, PENDING_KEY, INFLIGHT_KEY, run_id or uuid.uuid4().hex)
+    batch_run_id = None
+    totals = {}
+    for field, value in zip(owed[::2], owed[1::2]):
+        field = field.decode()
+        if field == RUN_FIELD:
+            batch_run_id = value.decode()
+            continue
+        pk, kind = field.split(":")
+        units, orders = totals.get(int(pk), (0, 0))
+        if kind == "units":
+            units = int(value)
+        else:
+            orders = int(value)
+        totals[int(pk)] = (units, orders)
+    return batch_run_id, {pk: counts for pk, counts in totals.items() if counts != (0, 0)}
+
+
+def clear_inflight(run_id):
+    get_client().eval(CLEAR_SCRIPT, 1, INFLIGHT_KEY, run_id)
+
+
+def apply_batch(run_id, totals):
+    """Apply one in-flight batch unless its run id is already marked. Returns whether it was applied."""
+    now = timezone.now()
+    with transaction.atomic():
+        try:
+            # Inserted first: a concurrent run applying the same batch waits here, then fails.
+            with transaction.atomic():
+                FlashSaleRun.objects.create(run_id=run_id)
+        except IntegrityError:
+            return False
+        units = by_store_item({pk: counts[0] for pk, counts in totals.items()})
+        orders = by_store_item({pk: counts[1] for pk, counts in totals.items()})
+        StoreItem.objects.filter(pk__in=totals).update(
+            stock=Greatest(F("stock") - units, Value(0)),
+            units_sold=F("units_sold") + units,
+            order_count=F("order_count") + orders,
+            updated_at=now,
+        )
+        FlashSaleRun.objects.filter(created_at__lt=now - RUN_MARKER_TTL).delete()
+    return True
+
+
+def reconcile():
+    """Apply reserved flash-sale units to the database. Returns the items touched."""
+    run_id = uuid.uuid4().hex
+    touched = 0
+    while True:
+        batch_run_id, totals = drain_pending(run_id)
+        if batch_run_id is None:
+            return touched
+        applied = apply_batch(batch_run_id, totals) if totals else True
+        clear_inflight(batch_run_id)
+        if not applied:
+            # A crashed run committed this batch but never cleared it, so
+            # counters primed since then subtracted it twice: prime them again.
+            logger.warning("Flash-sale batch %s was already applied; cleared it", batch_run_id)
+            for pk in totals:
+                forget(pk)
+        elif totals:
+            touched += len(totals)
+            invalidate_products(set(StoreItem.objects.filter(pk__in=totals).values_list("product_id", flat=True)))
+        if batch_run_id == run_id:
+            return touched
@@ -0,0 +1,218 @@
+"""Zarinpal gateway client.
+
+Pooled keep-alive sessions per process, connect/read timeouts on every
+call, a bounded retry policy for connection failures (and, for the idempotent
+verify call only, 502/503/504), and a circuit breaker that fails fast once the gateway keeps failing. Call counts,
+failures and latency buckets are kept in a Redis hash for gateway_stats_view.
+"""
+import logging
+import threading
+import time
+import requests
+from django.conf import settings
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+GATEWAY_ENDPOINTS = ("request", "verify")
+GATEWAY_OUTCOMES = ("ok", "error", "rejected")
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000)
+STATS_VERSION = 1
+
+
+class GatewayError(Exception):
+    pass
+
+
+class GatewayUnavailable(GatewayError):
+    """The gateway could not be reached, timed out, or the breaker is open."""
+
+
+class CircuitBreaker:
+    """Open after `threshold` consecutive failures; allow one trial call after `cooldown` seconds."""
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self.lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def end_trial(self):
+        with self.lock:
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.failures >= self.threshold or self.opened_at is not None:
+                if self.opened_at is None:
+                    logger.warning("Zarinpal circuit opened after %s failures", self.failures)
+                self.opened_at = time.monotonic()
+
+
+def _stats_key(endpoint):
+    return f"gateway:stats:v{STATS_VERSION}:{endpoint}"
+
+
+def record_call(endpoint, outcome, elapsed_ms):
+    pipe = get_redis_connection("default").pipeline(transaction=False)
+    pipe.hincrby(_stats_key(endpoint), outcome, 1)
+    if outcome != "rejected":
+        bucket = next((f"le_{limit}" for limit in LATENCY_BUCKETS_MS if elapsed_ms <= limit), "le_inf")
+        pipe.hincrby(_stats_key(endpoint), "latency_ms_sum", int(elapsed_ms))
+        pipe.hincrby(_stats_key(endpoint), bucket, 1)
+    try:
+        pipe.execute()
+    except RedisError:
+        logger.exception("Could not record gateway metrics")
+
+
+def get_gateway_stats():
+    buckets = [f"le_{limit}" for limit in LATENCY_BUCKETS_MS] + ["le_inf"]
+    client = get_redis_connection("default")
+    stats = {}
+    for endpoint in GATEWAY_ENDPOINTS:
+        row = {key.decode(): int(value) for key, value in client.hgetall(_stats_key(endpoint)).items()}
+        calls = row.get("ok", 0) + row.get("error", 0)
+        stats[endpoint] = {
+            **{outcome: row.get(outcome, 0) for outcome in GATEWAY_OUTCOMES},
+            "avg_latency_ms": round(row.get("latency_ms_sum", 0) / calls, 1) if calls else None,
+            "latency_ms": {bucket: row.get(bucket, 0) for bucket in buckets},
+        }
+    stats["breaker"] = get_client().breaker.state
+    return stats
+
+
+class ZarinpalClient:
+    def __init__(self, base_url, merchant_id, timeout, retries, breaker, pool_size=10):
+        self.base_url = base_url.rstrip("/")
+        self.merchant_id = merchant_id
+        self.timeout = timeout
+        self.breaker = breaker
+        # A 5xx from a proxy may come after the gateway created an authority,
+        # so only verify is replayed on those.
+        self.sessions = {
+            "request": self.make_session(retries, (), pool_size),
+            "verify": self.make_session(retries, (502, 503, 504), pool_size),
+        }
+
+    @staticmethod
+    def make_session(retries, status_forcelist, pool_size):
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=0,  # a read timeout may have reached the gateway; do not repeat it
+            status=retries if status_forcelist else 0,
+            status_forcelist=status_forcelist,
+            allowed_methods=frozenset({"POST"}),
+            backoff_factor=0.2,
+            raise_on_status=False,
+        )
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def request_payment(self, amount, callback_url, description, metadata=None):
+        return self.post("request", "/pg/v4/payment/request.json", {
+            "merchant_id": self.merchant_id,
+            "amount": amount,
+            "callback_url": callback_url,
+            "description": description,
+            "metadata": metadata or {},
+        })
+
+    def verify(self, amount, authority):
+        return self.post("verify", "/pg/v4/payment/verify.json", {
+            "merchant_id": self.merchant_id,
+            "amount": amount,
+            "authority": authority,
+        })
+
+    def start_pay_url(self, authority):
+        return f"{self.base_url}/pg/StartPay/{authority}"
+
+    def post(self, endpoint, path, payload):
+        if not self.breaker.allow():
+            record_call(endpoint, "rejected", 0)
+            raise GatewayUnavailable("Payment gateway is temporarily unavailable.")
+
+        start = time.perf_counter()
+        try:
+            response = self.sessions[endpoint].post(f"{self.base_url}{path}", json=payload, timeout=self.timeout)
+            if response.status_code >= 500:
+                raise GatewayUnavailable(f"Payment gateway returned HTTP {response.status_code}.")
+            result = response.json()
+        except (requests.RequestException, ValueError, GatewayUnavailable) as exc:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self.breaker.record_failure()
+            record_call(endpoint, "error", elapsed_ms)
+            logger.warning("Zarinpal %s failed after %.0fms: %s", endpoint, elapsed_ms, exc)
+            if isinstance(exc, GatewayUnavailable):
+                raise
+            raise GatewayUnavailable(str(exc)) from exc
+        else:
+            self.breaker.record_success()
+            record_call(endpoint, "ok", (time.perf_counter() - start) * 1000)
+            return result
+        finally:
+            # Any other exception must not leave the half-open trial slot taken.
+            self.breaker.end_trial()
+
+
+_client = None
+_client_config = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """The process-wide client, rebuilt if the gateway settings change."""
+    global _client, _client_config
+    config = (
+        settings.ZARINPAL_BASE_URL,
+        settings.ZARINPAL_MERCHANT_ID,
+        settings.ZARINPAL_CONNECT_TIMEOUT,
+        settings.ZARINPAL_READ_TIMEOUT,
+        settings.ZARINPAL_MAX_RETRIES,
+        settings.ZARINPAL_BREAKER_THRESHOLD,
+        settings.ZARINPAL_BREAKER_COOLDOWN,
+    )
+    with _client_lock:
+        if _client is None or _client_config != config:
+            base_url, merchant_id, connect, read, retries, threshold, cooldown = config
+            _client = ZarinpalClient(
+                base_url, merchant_id, (connect, read), retries, CircuitBreaker(threshold, cooldown)
+            )
+            _client_config = config
+        return _client
@@ -0,0 +1,85 @@
+"""Idempotency-Key support for retried POSTs.
+
+The first request carrying a key runs the view under a short cache lock and
+stores its response for IDEMPOTENCY_KEY_TTL seconds. Retries with the same
+key replay that response; duplicates arriving while it is still running wait
+for it. Keys are scoped per user and per endpoint, and a key reused with a
+different body is rejected. Exceptions and 5xx responses are not stored, so
+those requests can be retried with the same key.
+"""
+import hashlib
+import json
+import time
+import uuid
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+IDEMPOTENCY_HEADER = "HTTP_IDEMPOTENCY_KEY"
+MAX_KEY_LENGTH = 255
+LOCK_TIMEOUT = 30
+WAIT_TIMEOUT = 10
+POLL_INTERVAL = 0.05
+
+
+def request_fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def replay(stored, fingerprint):
+    if stored["fingerprint"] != fingerprint:
+        return Response(
+            {"error": "Idempotency-Key was already used with a different request."},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    return Response(stored["data"], status=stored["status"], headers={"Idempotent-Replayed": "true"})
+
+
+def idempotent(scope):
+    """Make a DRF view method replay its first response for a repeated Idempotency-Key."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(self, request, *args, **kwargs):
+            key = request.META.get(IDEMPOTENCY_HEADER)
+            if not key:
+                return view(self, request, *args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return Response({"error": "Idempotency-Key is too long."}, status=status.HTTP_400_BAD_REQUEST)
+
+            digest = hashlib.sha256(key.encode()).hexdigest()
+            result_key = f"idempotency:{scope}:{request.user.pk}:{digest}"
+            lock_key = f"{result_key}:lock"
+            fingerprint = request_fingerprint(request)
+            deadline = time.monotonic() + WAIT_TIMEOUT
+
+            while True:
+                stored = cache.get(result_key)
+                if stored is not None:
+                    return replay(stored, fingerprint)
+
+                token = uuid.uuid4().hex
+                if cache.add(lock_key, token, LOCK_TIMEOUT):
+                    try:
+                        response = view(self, request, *args, **kwargs)
+                        if response.status_code < 500:
+                            cache.set(
+                                result_key,
+                                {"fingerprint": fingerprint, "status": response.status_code, "data": response.data},
+                                settings.IDEMPOTENCY_KEY_TTL,
+                            )
+                        return response
+                    finally:
+                        if cache.get(lock_key) == token:
+                            cache.delete(lock_key)
+
+                if time.monotonic() >= deadline:
+                    return Response(
+                        {"error": "A request with this Idempotency-Key is still in progress."},
+                        status=status.HTTP_409_CONFLICT,
+                    )
+                time.sleep(POLL_INTERVAL)
+        return wrapper
+    return decorator
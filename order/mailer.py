@@ -0,0 +1,188 @@
+"""Buffered transactional email.
+
+The email tasks only push a message onto a Redis list. ``flush_email_queue``
+(a Celery beat task) pops batches off that list and sends them over one
+backend connection per batch instead of one SMTP session per message.
+
+Popping a batch moves it into a processing sorted set, scored by when the
+claim goes stale, in the same script. The batch leaves that set only together
+with its retry scheduling, so a worker that dies mid-send loses nothing: the
+next flush puts stale claims back on the queue. Delivery is at least once.
+
+A message that fails is written to a retry sorted set, scored by when it is
+due, with exponential backoff. It goes back on the queue when due. After
+MAIL_MAX_ATTEMPTS it moves to a dead-letter list.
+
+Sent, failed and dead counts, plus queue and send latency, are kept in a
+Redis hash for mail_stats_view.
+"""
+import json
+import logging
+import time
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django_redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+QUEUE_KEY = "mail:{mail}:queue"
+RETRY_KEY = "mail:{mail}:retry"
+PROCESSING_KEY = "mail:{mail}:processing"
+DEAD_KEY = "mail:{mail}:dead"
+STATS_KEY = "mail:{mail}:stats"
+
+# Move retries that are due, or stale claims (score <= ARGV[1]), back onto the queue.
+PROMOTE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+for i = 1, #due do
+    redis.call('RPUSH', KEYS[2], due[i])
+end
+if #due > 0 then
+    redis.call('ZREM', KEYS[1], unpack(due))
+end
+return #due
+"""
+
+# Pop up to ARGV[1] messages and claim them until ARGV[2].
+CLAIM_SCRIPT = """
+local batch = redis.call('LRANGE', KEYS[1], 0, tonumber(ARGV[1]) - 1)
+if #batch > 0 then
+    redis.call('LTRIM', KEYS[1], #batch, -1)
+    for i = 1, #batch do
+        redis.call('ZADD', KEYS[2], ARGV[2], batch[i])
+    end
+end
+return batch
+"""
+
+
+def get_client():
+    return get_redis_connection("default")
+
+
+def enqueue(subject, body, recipients, from_email=None):
+    message = {
+        "subject": subject,
+        "body": body,
+        "from_email": from_email or settings.DEFAULT_FROM_EMAIL,
+        "to": list(recipients),
+        "attempts": 0,
+        "queued_at": time.time(),
+    }
+    get_client().rpush(QUEUE_KEY, json.dumps(message))
+
+
+def promote_due_retries(now=None):
+    return get_client().eval(PROMOTE_SCRIPT, 2, RETRY_KEY, QUEUE_KEY, now or time.time())
+
+
+def requeue_stale_claims(now=None):
+    return get_client().eval(PROMOTE_SCRIPT, 2, PROCESSING_KEY, QUEUE_KEY, now or time.time())
+
+
+def pop_batch(size):
+    """Claim up to size messages. Returns the raw entries; release them with the batch's retries."""
+    stale_at = time.time() + settings.MAIL_PROCESSING_TIMEOUT
+    return get_client().eval(CLAIM_SCRIPT, 2, QUEUE_KEY, PROCESSING_KEY, size, stale_at)
+
+
+def retry_delay(attempts):
+    return settings.MAIL_RETRY_BACKOFF * 2 ** (attempts - 1)
+
+
+def schedule_retries(pipe, messages, now):
+    for message in messages:
+        message["attempts"] += 1
+        if message["attempts"] >= settings.MAIL_MAX_ATTEMPTS:
+            logger.error("Dropping email to %s after %s attempts", message["to"], message["attempts"])
+            pipe.rpush(DEAD_KEY, json.dumps(message))
+            pipe.hincrby(STATS_KEY, "dead", 1)
+        else:
+            pipe.zadd(RETRY_KEY, {json.dumps(message): now + retry_delay(message["attempts"])})
+            pipe.hincrby(STATS_KEY, "retried", 1)
+
+
+def send_batch(messages):
+    """Send messages over one connection. Returns the messages that failed."""
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception:
+        logger.exception("Could not open email connection for %s messages", len(messages))
+        return messages
+
+    failed = []
+    try:
+        for message in messages:
+            email = EmailMessage(
+                message["subject"], message["body"], message["from_email"], message["to"], connection=connection
+            )
+            try:
+                # One message per call so a refused recipient fails only its own message.
+                if not connection.send_messages([email]):
+                    failed.append(message)
+            except Exception:
+                logger.warning("Email to %s failed", message["to"], exc_info=True)
+                failed.append(message)
+    finally:
+        connection.close()
+    return failed
+
+
+def flush(batch_size=None, max_batches=None):
+    """Send queued email in batches. Returns {"sent": n, "failed": n}."""
+    batch_size = batch_size or settings.MAIL_BATCH_SIZE
+    totals = {"sent": 0, "failed": 0}
+    promote_due_retries()
+    requeue_stale_claims()
+
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        claimed = pop_batch(batch_size)
+        if not claimed:
+            break
+        batches += 1
+        messages = [json.loads(item) for item in claimed]
+
+        start = time.time()
+        failed = send_batch(messages)
+        now = time.time()
+        sent = [message for message in messages if message not in failed]
+
+        pipe = get_client().pipeline(transaction=True)
+        schedule_retries(pipe, failed, now)
+        pipe.zrem(PROCESSING_KEY, *claimed)
+        pipe.hincrby(STATS_KEY, "batches", 1)
+        pipe.hincrby(STATS_KEY, "sent", len(sent))
+        pipe.hincrby(STATS_KEY, "failed", len(failed))
+        pipe.hincrby(STATS_KEY, "send_ms_sum", int((now - start) * 1000))
+        pipe.hincrby(STATS_KEY, "queue_ms_sum", int(sum(now - message["queued_at"] for message in sent) * 1000))
+        pipe.execute()
+
+        totals["sent"] += len(sent)
+        totals["failed"] += len(failed)
+        if len(claimed) < batch_size:
+            break
+    return totals
+
+
+def get_mail_stats():
+    client = get_client()
+    pipe = client.pipeline(transaction=False)
+    pipe.hgetall(STATS_KEY)
+    pipe.llen(QUEUE_KEY)
+    pipe.zcard(PROCESSING_KEY)
+    pipe.zcard(RETRY_KEY)
+    pipe.llen(DEAD_KEY)
+    row, queued, processing, retrying, dead_letters = pipe.execute()
+    row = {key.decode(): int(value) for key, value in row.items()}
+    sent, send_ms = row.get("sent", 0), row.get("send_ms_sum", 0)
+    return {
+        "queued": queued,
+        "processing": processing,
+        "retrying": retrying,
+        "dead_letters": dead_letters,
+        **{name: row.get(name, 0) for name in ("batches", "sent", "failed", "retried", "dead")},
+        "avg_queue_latency_ms": round(row.get("queue_ms_sum", 0) / sent, 1) if sent else None,
+        "messages_per_second": round(sent / (send_ms / 1000), 1) if send_ms else None,
+    }
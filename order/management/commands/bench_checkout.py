@@ -0,0 +1,63 @@
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from customer.models import Address
+from order.checkout import checkout_cart
+from order.models import Cart, CartItem
+from store.models import Product, Store, StoreItem
+
+
+class Command(BaseCommand):
+    help = "Benchmark checkout across cart sizes. All rows are rolled back."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 30, 100, 500])
+        parser.add_argument("--rounds", type=int, default=5)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            User = get_user_model()
+            seller = User.objects.create(username="checkout-bench-seller", is_seller=True)
+            buyer = User.objects.create(username="checkout-bench-buyer")
+            address = Address.objects.create(
+                user=buyer, label="Bench", address_line_1="Bench", city="Bench",
+                state="Bench", postal_code="0000000000", country="Bench",
+            )
+            store = Store.objects.create(name="Checkout bench", seller=seller)
+            products = Product.objects.bulk_create(
+                Product(name=f"Bench product {i}", description="Generated for the checkout benchmark")
+                for i in range(max(options["sizes"]))
+            )
+            items = StoreItem.objects.bulk_create(
+                StoreItem(product=product, store=store, price=10_000, stock=10**6) for product in products
+            )
+            cart = Cart.objects.create(user=buyer)
+
+            for size in options["sizes"]:
+                queries, elapsed = 0, 0.0
+                for _ in range(options["rounds"]):
+                    CartItem.objects.bulk_create(
+                        CartItem(cart=cart, store_item=item, quantity=2, unit_price=10_000, total_item_price=20_000)
+                        for item in items[:size]
+                    )
+                    count, duration = self.measure(lambda: checkout_cart(buyer, address.pk))
+                    queries, elapsed = count, elapsed + duration
+                self.stdout.write(
+                    f"lines={size:<5} queries={queries:<4} time={elapsed / options['rounds']:.1f}ms"
+                )
+
+            transaction.set_rollback(True)
+
+    def measure(self, func):
+        queries = []
+
+        def count_query(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_query):
+            start = time.perf_counter()
+            func()
+            elapsed = (time.perf_counter() - start) * 1000
+        return len(queries), elapsed
@@ -0,0 +1,101 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.exceptions import ValidationError
+from customer.models import Address
+from order import flash_sale
+from order.checkout import checkout_cart
+from order.models import Cart, CartItem, OutboxMessage
+from store.models import Product, Store, StoreItem
+
+
+class Command(BaseCommand):
+    help = (
+        "Run concurrent checkouts of one flash-sale item against the configured database "
+        "and Redis, reconcile, and report orders per second and oversell. Checkouts commit "
+        "from their own threads, so the generated rows are deleted afterwards instead of rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--stock", type=int, default=1000)
+        parser.add_argument("--buyers", type=int, default=2000)
+        parser.add_argument("--threads", type=int, default=32)
+        parser.add_argument("--quantity", type=int, default=1)
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        seller = User.objects.create(username="flash-bench-seller", is_seller=True)
+        buyers = User.objects.bulk_create(
+            User(username=f"flash-bench-buyer-{i}") for i in range(options["buyers"])
+        )
+        product = Product.objects.create(name="Flash bench product", description="Generated")
+        store = Store.objects.create(name="Flash bench", seller=seller)
+        item = StoreItem.objects.create(
+            product=product, store=store, price=1000, stock=options["stock"], flash_sale=True
+        )
+        order_ids = []
+        try:
+            carts = Cart.objects.bulk_create(Cart(user=buyer) for buyer in buyers)
+            CartItem.objects.bulk_create(
+                CartItem(
+                    cart=cart, store_item=item, quantity=options["quantity"],
+                    unit_price=1000, total_item_price=1000 * options["quantity"],
+                )
+                for cart in carts
+            )
+            addresses = Address.objects.bulk_create(
+                Address(
+                    user=buyer, label="Bench", address_line_1="Bench", city="Bench",
+                    state="Bench", postal_code="0000000000", country="Bench",
+                )
+                for buyer in buyers
+            )
+
+            elapsed = self.run_checkouts(list(zip(buyers, [address.pk for address in addresses])), order_ids, options)
+            flash_sale.reconcile()
+            item.refresh_from_db()
+        finally:
+            flash_sale.forget(item.pk)
+            OutboxMessage.objects.filter(task="order.tasks.send_order_received_email", args__1__in=order_ids).delete()
+            User.objects.filter(pk__in=[seller.pk] + [buyer.pk for buyer in buyers]).delete()
+            Product.objects.filter(pk=product.pk).delete()
+
+        sold = len(order_ids)
+        oversold = item.units_sold - options["stock"]
+        self.stdout.write(
+            f"buyers={options['buyers']} threads={options['threads']} stock={options['stock']} "
+            f"orders={sold} orders/s={sold / elapsed:.0f} time={elapsed * 1000:.1f}ms "
+            f"db_stock={item.stock} units_sold={item.units_sold} oversold={max(oversold, 0)}"
+        )
+        if oversold > 0:
+            raise CommandError("Flash-sale stock was oversold.")
+        if item.units_sold != sold * options["quantity"] or item.stock != options["stock"] - item.units_sold:
+            raise CommandError(
+                f"Database drifted: {sold} orders but units_sold={item.units_sold}, stock={item.stock}."
+            )
+
+    def run_checkouts(self, buyers, order_ids, options):
+        """Check out every (buyer, address_id) from options["threads"] threads. Returns the seconds taken."""
+        lock = threading.Lock()
+        threads = options["threads"]
+
+        def buy_all(share):
+            try:
+                for buyer, address_id in share:
+                    try:
+                        order = checkout_cart(buyer, address_id)
+                    except ValidationError:
+                        continue
+                    with lock:
+                        order_ids.append(order.pk)
+            finally:
+                # Each thread opened a connection of its own.
+                connection.close()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(buy_all, [buyers[i::threads] for i in range(threads)]))
+        return time.perf_counter() - start
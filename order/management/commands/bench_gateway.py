@@ -0,0 +1,69 @@
+import logging
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from django.core.management.base import BaseCommand
+from order.fake_zarinpal import FakeZarinpal
+from order.gateway import CircuitBreaker, GatewayUnavailable, ZarinpalClient
+
+
+class Command(BaseCommand):
+    help = "Compare per-call requests.post with the pooled gateway client against the local fake Zarinpal."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--calls", type=int, default=500)
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--latency", type=float, default=0.01)
+        parser.add_argument("--failure-rate", type=float, default=0.0)
+        parser.add_argument("--url", help="Benchmark an already running gateway instead of an in-process fake.")
+
+    def handle(self, *args, **options):
+        logging.getLogger("order.gateway").setLevel(logging.ERROR)
+        server = None
+        url = options["url"]
+        if not url:
+            server = FakeZarinpal(latency=options["latency"], failure_rate=options["failure_rate"]).start()
+            url = server.url
+        try:
+            client = ZarinpalClient(url, "bench-merchant", (3.05, 10), 2, CircuitBreaker(5, 30), options["threads"])
+            payload = {"merchant_id": "bench-merchant", "amount": 10_000, "callback_url": "http://localhost/", "description": "bench"}
+
+            def unpooled(_):
+                response = requests.post(f"{url}/pg/v4/payment/request.json", json=payload)
+                response.raise_for_status()
+                return response.json()
+
+            def pooled(_):
+                return client.request_payment(10_000, "http://localhost/", "bench")
+
+            self.measure("requests.post per call", unpooled, options)
+            self.measure("pooled gateway client", pooled, options)
+        finally:
+            if server:
+                server.stop()
+
+    def measure(self, label, call, options):
+        latencies = []
+        failures = 0
+
+        def timed(i):
+            start = time.perf_counter()
+            try:
+                call(i)
+                ok = True
+            except (requests.RequestException, GatewayUnavailable):
+                ok = False
+            return ok, (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["threads"]) as pool:
+            for ok, elapsed in pool.map(timed, range(options["calls"])):
+                latencies.append(elapsed)
+                failures += not ok
+        total = time.perf_counter() - start
+
+        p50, p95 = statistics.quantiles(latencies, n=20)[9], statistics.quantiles(latencies, n=20)[18]
+        self.stdout.write(
+            f"{label:<24} calls/s={options['calls'] / total:<7.0f} p50={p50:.1f}ms p95={p95:.1f}ms failures={failures}"
+        )
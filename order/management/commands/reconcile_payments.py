@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from order.reconciliation import (
+    RECONCILE_CHUNK_SIZE, RECONCILE_WORKERS, reconcile_pending_payments, set_watermark,
+)
+
+
+class Command(BaseCommand):
+    help = "Verify stale pending payments with the gateway and settle them in bulk."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=RECONCILE_CHUNK_SIZE)
+        parser.add_argument("--workers", type=int, default=RECONCILE_WORKERS)
+        parser.add_argument("--max-chunks", type=int, default=None)
+        parser.add_argument("--reset", action="store_true", help="Start from the first pending payment.")
+
+    def handle(self, *args, **options):
+        if options["reset"]:
+            set_watermark(0)
+        stats = reconcile_pending_payments(options["chunk_size"], options["workers"], options["max_chunks"])
+        self.stdout.write(self.style.SUCCESS(
+            "Checked {checked} payments: {verified} verified, {failed} failed, "
+            "{unavailable} unavailable. Watermark {watermark}.".format(**stats)
+        ))
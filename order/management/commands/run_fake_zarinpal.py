@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from order.fake_zarinpal import FakeZarinpal
+
+
+class Command(BaseCommand):
+    help = "Serve a local fake Zarinpal API. Point ZARINPAL_BASE_URL at it."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every API call.")
+        parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of calls answered with 503.")
+
+    def handle(self, *args, **options):
+        server = FakeZarinpal(options["host"], options["port"], options["latency"], options["failure_rate"])
+        self.stdout.write(f"Fake Zarinpal listening on {server.url}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,24 @@
+import time
+from django.core.management.base import BaseCommand
+from order.outbox import OUTBOX_BATCH_SIZE, relay, relay_all
+
+
+class Command(BaseCommand):
+    help = "Publish outbox messages to Celery until interrupted."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=OUTBOX_BATCH_SIZE)
+        parser.add_argument("--interval", type=float, default=0.5, help="Seconds to sleep when the outbox is empty.")
+        parser.add_argument("--once", action="store_true", help="Drain the outbox once and exit.")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if options["once"]:
+            self.stdout.write(f"Published {relay_all(batch_size)} outbox messages.")
+            return
+        try:
+            while True:
+                if relay(batch_size) < batch_size:
+                    time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
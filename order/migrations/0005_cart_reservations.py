@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0004_order_order_user_created_idx'),
+        ('store', '0009_storeitem_reserved'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cartitem',
+            name='reserved_quantity',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='cartitem',
+            name='reserved_until',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='cartitem',
+            index=models.Index(condition=models.Q(('reserved_quantity__gt', 0)), fields=['reserved_until'], name='cartitem_active_hold_idx'),
+        ),
+    ]
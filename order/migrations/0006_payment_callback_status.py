@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0005_cart_reservations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='callback_status',
+            field=models.CharField(blank=True, editable=False, max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='transaction_id',
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+    ]
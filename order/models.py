@@ -19,6 +19,18 @@ class CartItem(models.Model):
     total_item_price = models.DecimalField(max_digits=10, decimal_places=2)
     total_discount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    # Stock held against store_item until reserved_until (order.reservations).
+    reserved_quantity = models.PositiveIntegerField(default=0, editable=False)
+    reserved_until = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['reserved_until'],
+                condition=models.Q(reserved_quantity__gt=0),
+                name='cartitem_active_hold_idx',
+            ),
+        ]
 
     def __str__(self):
         return (
@@ -43,6 +55,11 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_created_idx'),
+        ]
+
     def __str__(self):
         status_display = dict(self.STATUS_CHOICES).get(self.status, "Unknown")
         return (
@@ -74,17 +91,50 @@ class Payment(models.Model):
 ]
 
     order = models.ForeignKey(Order, on_delete=models.CASCADE)
-    transaction_id = models.CharField(max_length=100)
+    transaction_id = models.CharField(max_length=100, db_index=True)
     reference_id = models.CharField(max_length=100)
     card_pan = models.CharField(max_length=20)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     fee = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.PositiveSmallIntegerField(choices=PAYMENT_STATUS_CHOICES,default=1)
+    # Status query parameter of the gateway callback ("OK" / "NOK"), recorded
+    # before verification runs in order.verification.
+    callback_status = models.CharField(max_length=10, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return (
-            f"Payment for Order #{self.order.id}, TxID: {self.transaction_id}, "
+            f"Payment for Order #{self.order_id}, TxID: {self.transaction_id}, "
             f"Amount: {self.amount}, Fee: {self.fee}, Status: {self.status}"
         )
+
+
+class OutboxMessage(models.Model):
+    """A Celery task call written in the same transaction as the change that caused it.
+
+    order.outbox.relay sends these to the broker after commit; rows are
+    deleted once the broker has accepted them.
+    """
+    task = models.CharField(max_length=200)
+    args = models.JSONField(default=list)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    available_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.task}{tuple(self.args)}"
+
+
+class FlashSaleRun(models.Model):
+    """Marks a flash-sale reconcile batch as applied to StoreItem.
+
+    Written in the same transaction as the stock UPDATE, so order.flash_sale
+    can tell whether an in-flight batch left behind by a crashed run already
+    reached the database.
+    """
+    run_id = models.CharField(max_length=32, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return self.run_id
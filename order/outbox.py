@@ -0,0 +1,70 @@
+"""Transactional outbox for Celery tasks.
+
+Request code calls ``enqueue`` inside the transaction that creates the Order
+or Payment, so the task is recorded only if that transaction commits and the
+request never waits on the broker. ``relay`` (the run_outbox_relay command,
+with the relay_outbox beat task as a fallback) sends pending rows to Celery
+in batches and deletes them once the broker has accepted them.
+
+Delivery is at least once: a relay that dies between publishing and
+deleting sends those rows again, so the tasks behind it must tolerate
+repeats.
+"""
+import logging
+from datetime import timedelta
+from celery import current_app
+from django.db import transaction
+from django.utils import timezone
+from order.models import OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = 100
+MAX_RETRY_DELAY = 300
+
+
+def enqueue(task, *args):
+    return OutboxMessage.objects.create(task=task.name, args=list(args), available_at=timezone.now())
+
+
+def enqueue_many(task, calls):
+    """Record one call of `task` per args tuple in `calls` with a single INSERT."""
+    now = timezone.now()
+    return OutboxMessage.objects.bulk_create(
+        [OutboxMessage(task=task.name, args=list(args), available_at=now) for args in calls]
+    )
+
+
+def relay(batch_size=OUTBOX_BATCH_SIZE):
+    """Publish one batch of due messages. Returns the number published."""
+    now = timezone.now()
+    with transaction.atomic():
+        messages = list(
+            OutboxMessage.objects.select_for_update(skip_locked=True)
+            .filter(available_at__lte=now)
+            .order_by("id")[:batch_size]
+        )
+        sent, failed = [], []
+        for message in messages:
+            try:
+                current_app.tasks[message.task].apply_async(args=message.args)
+            except Exception:
+                logger.exception("Could not publish outbox message %s (%s)", message.pk, message.task)
+                message.attempts += 1
+                message.available_at = now + timedelta(seconds=min(2 ** message.attempts, MAX_RETRY_DELAY))
+                failed.append(message)
+            else:
+                sent.append(message.pk)
+        OutboxMessage.objects.filter(pk__in=sent).delete()
+        OutboxMessage.objects.bulk_update(failed, ["attempts", "available_at"])
+    return len(sent)
+
+
+def relay_all(batch_size=OUTBOX_BATCH_SIZE):
+    """Publish batches until no due message is left. Returns the number published."""
+    total = 0
+    while True:
+        sent = relay(batch_size)
+        total += sent
+        if sent < batch_size:
+            return total
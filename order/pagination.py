@@ -0,0 +1,5 @@
+from core.pagination import OptInCursorPagination
+
+
+class OrderPagination(OptInCursorPagination):
+    cursor_ordering = ('-created_at', '-id')
@@ -0,0 +1,135 @@
+"""Reconcile payments whose buyer never came back through the callback.
+
+Pending payments older than PAYMENT_RECONCILE_AFTER seconds are streamed in
+primary-key chunks, verified concurrently on a bounded thread pool through the
+pooled gateway client, and settled with one bulk_update per chunk; the
+confirmation emails go through the outbox in the same transaction. A watermark
+in the cache records the last settled id, so a run that stops early (gateway
+down, max_chunks reached) resumes there; a run that reaches the end starts
+over from the beginning next time.
+
+A payment the gateway answers with a code that is neither verified nor a
+definitive failure is left pending and passed over, so the watermark moves on
+and it is asked again next cycle. Once it is PAYMENT_RECONCILE_GIVE_UP_AFTER
+seconds old it is marked failed and logged as an error for an operator.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from order import gateway, outbox
+from order.models import Order, Payment
+from order.tasks import send_payment_confirmed_email
+from order.verification import (
+    FAILED_CODES, ORDER_PROCESSING, PAYMENT_FAILED, PAYMENT_PENDING, PAYMENT_VERIFIED, VERIFIED_CODES, result_code,
+)
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_KEY = "payments:reconcile:watermark"
+RECONCILE_CHUNK_SIZE = 200
+RECONCILE_WORKERS = 8
+
+
+def get_watermark():
+    return cache.get(WATERMARK_KEY, 0)
+
+
+def set_watermark(value):
+    cache.set(WATERMARK_KEY, value, None)
+
+
+def check_with_gateway(row):
+    client = gateway.get_client()
+    try:
+        result = client.verify(int(row["amount"]), row["transaction_id"])
+    except gateway.GatewayUnavailable:
+        return row["id"], None
+    return row["id"], result
+
+
+def settle(outcomes):
+    """Apply {payment_id: gateway result} to payments that are still pending."""
+    counts = {"verified": 0, "failed": 0, "undecided": 0}
+    now = timezone.now()
+    give_up_before = now - timedelta(seconds=settings.PAYMENT_RECONCILE_GIVE_UP_AFTER)
+    with transaction.atomic():
+        payments = list(
+            Payment.objects.select_for_update(skip_locked=True)
+            .filter(pk__in=outcomes, status=PAYMENT_PENDING)
+            .select_related("order__user")
+        )
+        settled = []
+        verified_orders = []
+        for payment in payments:
+            result = outcomes[payment.pk]
+            data = result.get("data") or {}
+            code = result_code(result)
+            if code in VERIFIED_CODES:
+                payment.status = PAYMENT_VERIFIED
+                payment.reference_id = str(data.get("ref_id", ""))
+                payment.card_pan = data.get("card_pan") or ""
+                payment.fee = data.get("fee", 0)
+                verified_orders.append(payment.order)
+                counts["verified"] += 1
+            elif code in FAILED_CODES or payment.created_at < give_up_before:
+                if code not in FAILED_CODES:
+                    logger.error(
+                        "Payment %s marked failed after the gateway kept answering code %s",
+                        payment.pk, code, extra={"authority": payment.transaction_id, "code": code},
+                    )
+                payment.status = PAYMENT_FAILED
+                counts["failed"] += 1
+            else:
+                logger.warning("Gateway answered code %s for payment %s; left pending", code, payment.pk)
+                counts["undecided"] += 1
+                continue
+            payment.updated_at = now
+            settled.append(payment)
+        Payment.objects.bulk_update(settled, ["status", "reference_id", "card_pan", "fee", "updated_at"])
+        Order.objects.filter(pk__in=[order.pk for order in verified_orders]).update(
+            status=ORDER_PROCESSING, updated_at=now
+        )
+        outbox.enqueue_many(send_payment_confirmed_email, [(order.user.email, order.pk) for order in verified_orders])
+    return counts
+
+
+def reconcile_pending_payments(chunk_size=RECONCILE_CHUNK_SIZE, workers=RECONCILE_WORKERS, max_chunks=None):
+    cutoff = timezone.now() - timedelta(seconds=settings.PAYMENT_RECONCILE_AFTER)
+    watermark = get_watermark()
+    stats = {"checked": 0, "verified": 0, "failed": 0, "undecided": 0, "unavailable": 0, "watermark": watermark}
+    chunks = 0
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while max_chunks is None or chunks < max_chunks:
+            rows = list(
+                Payment.objects.filter(status=PAYMENT_PENDING, created_at__lt=cutoff, pk__gt=watermark)
+                .order_by("pk")
+                .values("id", "transaction_id", "amount")[:chunk_size]
+            )
+            if not rows:
+                watermark = 0
+                break
+            chunks += 1
+
+            results = dict(pool.map(check_with_gateway, rows))
+            answered = {pk: result for pk, result in results.items() if result is not None}
+            unavailable = sorted(pk for pk, result in results.items() if result is None)
+            for key, value in settle(answered).items():
+                stats[key] += value
+            stats["checked"] += len(answered)
+
+            if unavailable:
+                # Resume at the first payment the gateway could not answer.
+                stats["unavailable"] += len(unavailable)
+                watermark = unavailable[0] - 1
+                logger.warning("Payment reconciliation stopped at %s: gateway unavailable", unavailable[0])
+                break
+            watermark = rows[-1]["id"]
+
+    set_watermark(watermark)
+    stats["watermark"] = watermark
+    return stats
@@ -0,0 +1,106 @@
+"""Time-limited stock holds for cart lines.
+
+With CART_RESERVATION_ENABLED, adding to the cart moves quantity into
+StoreItem.reserved, so other buyers see it as unavailable until the line is
+checked out, removed, or its hold expires. Expired holds are released in
+batches by the release_expired_reservations beat task. Flash-sale items are
+never held here; their stock lives in Redis (order.flash_sale).
+"""
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from order.models import CartItem
+from store.cache import invalidate_products
+from store.models import StoreItem
+from store.utils import by_store_item
+
+SWEEP_BATCH_SIZE = 500
+
+
+def enabled():
+    return settings.CART_RESERVATION_ENABLED
+
+
+def holds_stock(store_item):
+    return enabled() and not store_item.flash_sale
+
+
+def hold_expiry():
+    return timezone.now() + timedelta(seconds=settings.CART_RESERVATION_TTL)
+
+
+def stock_changed(store_item_ids):
+    # .update() fires no signal; refresh cached product payloads and ETags.
+    invalidate_products(set(StoreItem.objects.filter(pk__in=store_item_ids).values_list("product_id", flat=True)))
+
+
+def hold(store_item_id, quantity):
+    """Add quantity to StoreItem.reserved if enough unreserved stock is left."""
+    held = StoreItem.objects.filter(pk=store_item_id, stock__gte=F("reserved") + quantity).update(
+        reserved=F("reserved") + quantity, updated_at=timezone.now()
+    ) == 1
+    if held:
+        stock_changed([store_item_id])
+    return held
+
+
+def release(quantities):
+    """Give back {store_item_id: quantity} held by carts."""
+    quantities = {pk: quantity for pk, quantity in quantities.items() if quantity}
+    if quantities:
+        StoreItem.objects.filter(pk__in=quantities).update(
+            reserved=Greatest(F("reserved") - by_store_item(quantities), Value(0)),
+            updated_at=timezone.now(),
+        )
+        stock_changed(quantities)
+
+
+def resize(cart_item, quantity):
+    """Hold exactly `quantity` for a cart line. Returns False when stock is short."""
+    if not holds_stock(cart_item.store_item):
+        return True
+    with transaction.atomic():
+        # The expiry sweep may have released this line since it was fetched.
+        locked = CartItem.objects.select_for_update().only("reserved_quantity").get(pk=cart_item.pk)
+        delta = quantity - locked.reserved_quantity
+        if delta > 0 and not hold(cart_item.store_item_id, delta):
+            return False
+        if delta < 0:
+            release({cart_item.store_item_id: -delta})
+        cart_item.reserved_quantity = quantity
+        cart_item.reserved_until = hold_expiry()
+        CartItem.objects.filter(pk=cart_item.pk).update(
+            reserved_quantity=cart_item.reserved_quantity, reserved_until=cart_item.reserved_until
+        )
+    return True
+
+
+def release_items(cart_items):
+    """Release the holds of already-fetched cart lines and clear them."""
+    quantities = defaultdict(int)
+    held = [item for item in cart_items if item.reserved_quantity]
+    for item in held:
+        quantities[item.store_item_id] += item.reserved_quantity
+    if held:
+        release(quantities)
+        CartItem.objects.filter(pk__in=[item.pk for item in held]).update(reserved_quantity=0, reserved_until=None)
+    return len(held)
+
+
+def release_expired(batch_size=SWEEP_BATCH_SIZE):
+    """Release holds past reserved_until, one locked batch at a time."""
+    released = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                CartItem.objects.filter(reserved_quantity__gt=0, reserved_until__lt=timezone.now())
+                .select_for_update(skip_locked=True)
+                .only("pk", "store_item_id", "reserved_quantity")[:batch_size]
+            )
+            released += release_items(batch)
+        if len(batch) < batch_size:
+            return released
@@ -1,5 +1,7 @@
 from rest_framework import serializers
+from django.db import transaction
 from .models import Cart, CartItem, Order, OrderItem, Payment
+from order import reservations
 from store.serializers import StoreItemSerializer
 from django.db.models import Sum
 from customer.serializers import AddressSerializer
@@ -30,6 +32,10 @@ class CartItemSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 f"Total requested ({total_requested}) exceeds stock ({store_item.stock})"
             )
+        if reservations.holds_stock(store_item) and quantity > store_item.available_stock:
+            raise serializers.ValidationError(
+                f"Requested ({quantity}) exceeds available stock ({store_item.available_stock})"
+            )
 
         return data
 
@@ -45,14 +51,22 @@ class CartItemSerializer(serializers.ModelSerializer):
         )
         total_discount = discount_per_unit * quantity
 
-        return CartItem.objects.create(
-            cart=cart,
-            store_item=store_item,
-            quantity=quantity,
-            unit_price=unit_price,
-            total_item_price=total_price,
-            total_discount=total_discount
-        )
+        with transaction.atomic():
+            held = {}
+            if reservations.holds_stock(store_item):
+                if not reservations.hold(store_item.pk, quantity):
+                    raise serializers.ValidationError("Not enough stock left to reserve this item.")
+                held = {'reserved_quantity': quantity, 'reserved_until': reservations.hold_expiry()}
+
+            return CartItem.objects.create(
+                cart=cart,
+                store_item=store_item,
+                quantity=quantity,
+                unit_price=unit_price,
+                total_item_price=total_price,
+                total_discount=total_discount,
+                **held
+            )
 
 
 
@@ -84,7 +98,8 @@ class OrderItemSerializer(serializers.ModelSerializer):
         
 
 class OrderSerializer(serializers.ModelSerializer):
-    order_items = OrderItemSerializer(many=True, read_only=True)
+    """An order with its lines in `order_items`; `total_price` covers every line."""
+    order_items = OrderItemSerializer(source='items', many=True, read_only=True)
     address = AddressSerializer(read_only=True)
     user = serializers.SerializerMethodField()
     status_display = serializers.SerializerMethodField()
@@ -108,6 +123,23 @@ class OrderSerializer(serializers.ModelSerializer):
         }
 
 
+class SellerOrderSerializer(OrderSerializer):
+    """An order as a seller sees it.
+
+    The views prefetch only the seller's own lines into `order_items`;
+    `seller_subtotal` is their sum, while `total_price` stays the whole order's.
+    """
+    seller_subtotal = serializers.SerializerMethodField(help_text="Sum of this seller's lines in the order.")
+
+    class Meta(OrderSerializer.Meta):
+        fields = OrderSerializer.Meta.fields + ['seller_subtotal']
+
+    def get_seller_subtotal(self, obj):
+        # Reads the filtered prefetch, so it costs no query.
+        subtotal = sum(item.total_price for item in obj.items.all())
+        return self.fields['total_price'].to_representation(subtotal)
+
+
 class PaymentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Payment
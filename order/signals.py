@@ -0,0 +1,23 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from store.models import StoreItem
+from order import flash_sale, reservations
+from order.models import CartItem
+
+
+@receiver([post_save, post_delete], sender=StoreItem)
+def store_item_stock_changed(sender, instance, created=False, **kwargs):
+    if created:
+        return
+    # A seller edit replaces the stock figure; let the next reservation re-prime
+    # the Redis counter from it (minus units still owed by reconciliation).
+    transaction.on_commit(lambda: flash_sale.forget(instance.pk))
+
+
+@receiver(post_delete, sender=CartItem)
+def cart_item_deleted(sender, instance, **kwargs):
+    # Covers the API, the admin and cascades from Cart or Customer deletes.
+    # Checkout clears reserved_quantity first, since it consumes the hold.
+    if instance.reserved_quantity:
+        reservations.release({instance.store_item_id: instance.reserved_quantity})
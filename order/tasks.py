@@ -1,8 +1,8 @@
 from celery import shared_task
-from django.core.mail import send_mail
 from decouple import config
 import logging
 import traceback
+from order import flash_sale, mailer, outbox, reservations
 
 
 logger = logging.getLogger(__name__)
@@ -15,8 +15,8 @@ def send_order_received_email(self, user_email, order_id):
     subject = "We've received your order"
     message = f"Thanks! Your order #{order_id} has been received and is being processed."
     try:
-        send_mail(subject, message, DEFAULT_FROM_EMAIL, [user_email])
-        logger.info(f"Order confirmation sent to {user_email}")
+        mailer.enqueue(subject, message, [user_email], DEFAULT_FROM_EMAIL)
+        logger.info(f"Order confirmation queued for {user_email}")
     except Exception as exc:
         logger.error("Email send error (order received): %s", traceback.format_exc())
         raise self.retry(exc=exc, countdown=60)
@@ -26,8 +26,47 @@ def send_payment_confirmed_email(self, user_email, order_id):
     subject = "Payment confirmed"
     message = f"Your payment for order #{order_id} has been successfully processed. We’ll ship it soon!"
     try:
-        send_mail(subject, message, DEFAULT_FROM_EMAIL, [user_email])
-        logger.info(f"Payment confirmation sent to {user_email}")
+        mailer.enqueue(subject, message, [user_email], DEFAULT_FROM_EMAIL)
+        logger.info(f"Payment confirmation queued for {user_email}")
     except Exception as exc:
         logger.error("Email send error (payment confirmed): %s", traceback.format_exc())
         raise self.retry(exc=exc, countdown=60)
+
+
+@shared_task
+def relay_outbox():
+    return outbox.relay_all()
+
+
+@shared_task
+def flush_email_queue():
+    return mailer.flush()
+
+
+@shared_task
+def reconcile_flash_sales():
+    return flash_sale.reconcile()
+
+
+@shared_task
+def release_expired_reservations():
+    return reservations.release_expired()
+
+
+@shared_task(bind=True, max_retries=6)
+def verify_payment_task(self, authority):
+    from order import gateway
+    from order.verification import PAYMENT_STATUS_NAMES, verify_payment
+
+    try:
+        payment, _ = verify_payment(authority)
+    except gateway.GatewayUnavailable as exc:
+        logger.warning("Payment %s verification deferred: %s", authority, exc)
+        raise self.retry(exc=exc, countdown=min(5 * 2 ** self.request.retries, 300))
+    return PAYMENT_STATUS_NAMES[payment.status]
+
+
+@shared_task
+def reconcile_pending_payments():
+    from order.reconciliation import reconcile_pending_payments as reconcile
+    return reconcile()
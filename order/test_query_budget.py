@@ -0,0 +1,232 @@
+"""Query budgets: no order endpoint may run more queries as its data grows.
+
+Every router-registered list and detail endpoint, and every admin
+changelist, is fetched after seeding N rows and again after 10N. See the
+assert_constant_queries fixture in the root conftest.
+"""
+from types import SimpleNamespace
+import pytest
+from django.contrib.admin.sites import site
+from django.contrib.auth import get_user_model
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from customer.models import Address
+from order.models import Cart, CartItem, Order, OrderItem, OutboxMessage, Payment
+from order.urls import router
+from store.models import Product, Store, StoreItem
+
+User = get_user_model()
+
+
+@pytest.fixture
+def world(db):
+    buyer = User.objects.create_user(username="budget-buyer", password="pass", first_name="Budget")
+    seller = User.objects.create_user(username="budget-seller", password="pass", is_seller=True)
+    client = APIClient()
+    client.force_authenticate(user=buyer)
+    seller_client = APIClient()
+    seller_client.force_authenticate(user=seller)
+    address = Address.objects.create(
+        user=buyer, label="Home", address_line_1="Valiasr", city="Tehran",
+        state="Tehran", postal_code="1234567890", country="Iran"
+    )
+    return SimpleNamespace(
+        buyer=buyer,
+        seller=seller,
+        client=client,
+        seller_client=seller_client,
+        address=address,
+        store=Store.objects.create(name="Budget Store", seller=seller),
+        cart=Cart.objects.create(user=buyer),
+        rows=0,
+    )
+
+
+def next_id(world):
+    world.rows += 1
+    return world.rows
+
+
+def add_store_item(world):
+    i = next_id(world)
+    product = Product.objects.create(name=f"Product {i}", description="Budget product")
+    product.categories.create(name=f"Category {i}", image="categories/c.jpg")
+    return StoreItem.objects.create(product=product, store=world.store, price=1000 + i, stock=10)
+
+
+def add_cart_item(world, cart):
+    store_item = add_store_item(world)
+    return CartItem.objects.create(
+        cart=cart, store_item=store_item, quantity=1,
+        unit_price=store_item.price, total_item_price=store_item.price
+    )
+
+
+def add_order_item(world, order):
+    store_item = add_store_item(world)
+    return OrderItem.objects.create(
+        order=order, store_item=store_item, quantity=1,
+        price=store_item.price, total_price=store_item.price
+    )
+
+
+def new_order(world):
+    return Order.objects.create(user=world.buyer, address=world.address, total_price=1000)
+
+
+def add_order(world):
+    order = new_order(world)
+    add_order_item(world, order)
+    return order
+
+
+def seed_carts(world, count):
+    carts = []
+    for _ in range(count):
+        cart = Cart.objects.create(user=world.buyer)
+        add_cart_item(world, cart)
+        carts.append(cart)
+    return carts
+
+
+def seed_cart_items(world, count):
+    return [add_cart_item(world, world.cart) for _ in range(count)]
+
+
+def seed_orders(world, count):
+    return [add_order(world) for _ in range(count)]
+
+
+def seed_order_items(world, count):
+    order = new_order(world)
+    return [add_order_item(world, order) for _ in range(count)]
+
+
+def seed_payments(world, count):
+    return [
+        Payment.objects.create(order=add_order(world), transaction_id=f"A{next_id(world)}", amount=1000, fee=0)
+        for _ in range(count)
+    ]
+
+
+def seed_store_items(world, count):
+    return [add_store_item(world) for _ in range(count)]
+
+
+def seed_outbox(world, count):
+    now = timezone.now()
+    return [
+        OutboxMessage.objects.create(task="order.tasks.relay_outbox", args=[next_id(world)], available_at=now)
+        for _ in range(count)
+    ]
+
+
+def grow_cart(world, cart, count):
+    for _ in range(count):
+        add_cart_item(world, cart)
+
+
+def grow_order(world, order, count):
+    for _ in range(count):
+        add_order_item(world, order)
+
+
+# Router basename -> seed(world, count) returning the rows it created.
+SEEDS = {
+    "cart": seed_carts,
+    "cart-item": seed_cart_items,
+    "order": seed_orders,
+    "orderitem": seed_order_items,
+    "payment": seed_payments,
+    "seller-items": seed_store_items,
+    "seller-orders": seed_orders,
+}
+
+# Detail endpoints that nest a collection grow that collection instead.
+GROW = {
+    "cart": grow_cart,
+    "order": grow_order,
+    "seller-orders": grow_order,
+}
+
+SELLER_ENDPOINTS = {"seller-items", "seller-orders"}
+
+ADMIN_SEEDS = {
+    Cart: seed_carts,
+    CartItem: seed_cart_items,
+    Order: seed_orders,
+    OrderItem: seed_order_items,
+    OutboxMessage: seed_outbox,
+    Payment: seed_payments,
+}
+
+
+def client_for(world, basename):
+    return world.seller_client if basename in SELLER_ENDPOINTS else world.client
+
+
+def test_every_endpoint_has_a_budget():
+    assert {basename for _, _, basename in router.registry} == set(SEEDS)
+    assert {model for model in site._registry if model._meta.app_label == "order"} == set(ADMIN_SEEDS)
+
+
+@pytest.mark.parametrize("basename", sorted(SEEDS))
+def test_list_query_budget(basename, world, assert_constant_queries):
+    client = client_for(world, basename)
+    url = reverse(f"{basename}-list")
+    before = client.get(url).data["count"]
+    response = assert_constant_queries(lambda count: SEEDS[basename](world, count), lambda: client.get(url))
+    assert response.data["count"] == before + 10
+
+
+@pytest.mark.parametrize("basename", sorted(SEEDS))
+def test_detail_query_budget(basename, world, assert_constant_queries):
+    client = client_for(world, basename)
+    instance = SEEDS[basename](world, 1)[0]
+    grow = GROW.get(basename)
+
+    def seed(count):
+        if grow:
+            grow(world, instance, count)
+        else:
+            SEEDS[basename](world, count)
+
+    url = reverse(f"{basename}-detail", args=[instance.pk])
+    assert_constant_queries(seed, lambda: client.get(url))
+
+
+def test_order_lists_its_items(world):
+    order = seed_orders(world, 1)[0]
+    add_order_item(world, order)
+
+    response = world.client.get(reverse("order-detail", args=[order.pk]))
+    assert response.data["user"] == {"id": world.buyer.pk, "name": "Budget"}
+    assert len(response.data["order_items"]) == 2
+
+
+def test_sellers_see_only_their_own_lines(world):
+    order = seed_orders(world, 1)[0]
+    rival = User.objects.create_user(username="budget-rival", password="pass", is_seller=True)
+    rival_product = Product.objects.create(name="Rival product", description="Budget product")
+    rival_item = StoreItem.objects.create(
+        product=rival_product, store=Store.objects.create(name="Rival Store", seller=rival), price=999, stock=10
+    )
+    OrderItem.objects.create(order=order, store_item=rival_item, quantity=1, price=999, total_price=999)
+
+    for basename in ("order", "seller-orders"):
+        data = world.seller_client.get(reverse(f"{basename}-detail", args=[order.pk])).data
+        assert [line["price"] for line in data["order_items"]] == ["1001.00"]
+        assert (data["seller_subtotal"], data["total_price"]) == ("1001.00", "1000.00")
+    data = world.client.get(reverse("order-detail", args=[order.pk])).data
+    assert len(data["order_items"]) == 2 and "seller_subtotal" not in data
+
+
+@pytest.mark.parametrize("model", sorted(ADMIN_SEEDS, key=lambda model: model.__name__))
+def test_admin_changelist_query_budget(model, world, assert_constant_queries):
+    admin = User.objects.create_superuser(username="budget-admin", password="pass")
+    client = Client()
+    client.force_login(admin)
+    url = reverse(f"admin:order_{model._meta.model_name}_changelist")
+    assert_constant_queries(lambda count: ADMIN_SEEDS[model](world, count), lambda: client.get(url))
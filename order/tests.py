@@ -1,4 +1,7 @@
+import smtplib
 import pytest
+from django.core import mail
+from django.core.mail.backends import locmem
 from django.test import Client
 from django.urls import reverse
 from django.contrib.admin.sites import site
@@ -6,7 +9,7 @@ from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 from store.models import Store, Product, StoreItem
 from customer.models import Address
-from order.models import Cart, CartItem, Order, Payment
+from order.models import Cart, CartItem, Order, OutboxMessage, Payment
 from order.tasks import send_order_received_email, send_payment_confirmed_email
 
 User = get_user_model()
@@ -90,6 +93,16 @@ def store_item(store, product):
         is_active=True
     )
 
+@pytest.fixture
+def zarinpal(settings):
+    from order.fake_zarinpal import FakeZarinpal
+
+    server = FakeZarinpal().start()
+    settings.ZARINPAL_BASE_URL = server.url
+    settings.ZARINPAL_MERCHANT_ID = settings.ZARINPAL_MERCHANT_ID or "test-merchant"
+    yield server
+    server.stop()
+
 @pytest.fixture
 def cart(user):
     return Cart.objects.create(user=user)
@@ -134,7 +147,7 @@ def test_seller_order_list(seller_client):
     assert res.status_code == 200
 
 
-def test_payment_initiation(client, address, cart_item):
+def test_payment_initiation(client, address, cart_item, zarinpal):
     order_res = client.post("/api/orders/", {"address_id": address.id}, format="json")
     order_id = order_res.data["id"]
 
@@ -142,7 +155,7 @@ def test_payment_initiation(client, address, cart_item):
     assert res.status_code == 200
     assert "authority" in res.data
 
-def test_payment_verification(client, address, cart_item):
+def test_payment_verification(client, address, cart_item, zarinpal):
     order_res = client.post("/api/orders/", {"address_id": address.id}, format="json")
     order_id = order_res.data["id"]
 
@@ -196,3 +209,603 @@ def test_model_strs(user, address, store_item, cart_item):
 
 
 
+def test_checkout_updates_sales_counters(client, address, cart_item, store_item):
+    res = client.post("/api/orders/", {"address_id": address.id}, format="json")
+    assert res.status_code == 201
+    store_item.refresh_from_db()
+    assert store_item.stock == 8
+    assert store_item.units_sold == 2
+    assert store_item.order_count == 1
+
+def test_rebuild_sales_counters(user, store_item):
+    from django.core.management import call_command
+    from order.models import OrderItem
+
+    for quantity in (1, 4):
+        order = Order.objects.create(user=user, total_price=0)
+        OrderItem.objects.create(order=order, store_item=store_item, quantity=quantity, price=1, total_price=quantity)
+    StoreItem.objects.filter(pk=store_item.pk).update(units_sold=99, order_count=99)
+
+    call_command("rebuild_sales_counters")
+    store_item.refresh_from_db()
+    assert (store_item.units_sold, store_item.order_count) == (5, 2)
+
+def test_best_seller_and_popularity_ordering(client, store, store_item):
+    other = Product.objects.create(name="Other Product", description="Less popular")
+    StoreItem.objects.create(store=store, product=other, price=1000, stock=3, units_sold=1, order_count=1)
+    StoreItem.objects.filter(pk=store_item.pk).update(units_sold=7, order_count=3)
+
+    res = client.get(f"/api/products/{store_item.product_id}/")
+    assert res.data["best_seller"]["id"] == store_item.id
+
+    res = client.get("/api/products/", {"ordering": "-popularity"})
+    assert [p["id"] for p in res.data["results"]] == [store_item.product_id, other.id]
+
+
+
+def test_order_list_cursor_pagination(client, user):
+    for _ in range(12):
+        Order.objects.create(user=user, total_price=1000)
+    res = client.get("/api/orders/", {"pagination": "cursor"})
+    assert res.status_code == 200
+    assert "count" not in res.data
+    ids = [o["id"] for o in res.data["results"]]
+    ids += [o["id"] for o in client.get(res.data["next"]).data["results"]]
+    assert ids == sorted(ids, reverse=True)
+    assert len(set(ids)) == 12
+
+
+
+
+def test_checkout_query_count_is_constant(user, address, cart, store):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from order.checkout import checkout_cart
+    from order.models import OrderItem
+
+    items = [
+        StoreItem.objects.create(store=store, product=Product.objects.create(name=f"P{i}", description="x"), price=1000, stock=5)
+        for i in range(20)
+    ]
+    counts = []
+    for size in (1, 20):
+        for item in items[:size]:
+            CartItem.objects.create(cart=cart, store_item=item, quantity=2, unit_price=1000, total_item_price=2000)
+        with CaptureQueriesContext(connection) as queries:
+            order = checkout_cart(user, address.id)
+        counts.append(len(queries))
+        assert order.items.count() == size
+    assert counts[0] == counts[1]
+    assert not cart.items.exists()
+    assert StoreItem.objects.get(pk=items[0].pk).stock == 1
+    assert StoreItem.objects.get(pk=items[19].pk).stock == 3
+
+def test_checkout_insufficient_stock_rolls_back(client, address, cart, cart_item, store_item):
+    from order.checkout import reserve_stock
+
+    StoreItem.objects.filter(pk=store_item.pk).update(stock=1)
+    res = client.post("/api/orders/", {"address_id": address.id}, format="json")
+    assert res.status_code == 400
+    assert "Insufficient stock" in str(res.data)
+    assert not Order.objects.exists()
+    assert cart.items.count() == 1
+
+    assert reserve_stock({store_item.pk: 2}) is False
+    store_item.refresh_from_db()
+    assert (store_item.stock, store_item.units_sold) == (1, 0)
+
+def test_flash_sale_reservations_never_oversell(store, product):
+    from concurrent.futures import ThreadPoolExecutor
+    from order import flash_sale
+
+    item = StoreItem.objects.create(store=store, product=product, price=1000, stock=25, flash_sale=True)
+
+    def buy(_):
+        try:
+            flash_sale.reserve([(item, 1)])
+            return True
+        except flash_sale.SoldOut:
+            return False
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        sold = sum(pool.map(buy, range(100)))
+    assert sold == 25
+    assert flash_sale.available(item.pk) == 0
+
+def test_flash_sale_checkout_reconciles_to_database(client, address, cart, store_item):
+    from order import flash_sale
+    from order.tasks import reconcile_flash_sales
+
+    StoreItem.objects.filter(pk=store_item.pk).update(flash_sale=True, stock=3)
+    CartItem.objects.create(cart=cart, store_item=store_item, quantity=2, unit_price=100000, total_item_price=200000)
+    assert client.post("/api/orders/", {"address_id": address.id}, format="json").status_code == 201
+    store_item.refresh_from_db()
+    assert (store_item.stock, store_item.units_sold) == (3, 0)
+    assert flash_sale.available(store_item.pk) == 1
+
+    CartItem.objects.create(cart=cart, store_item=store_item, quantity=2, unit_price=100000, total_item_price=200000)
+    res = client.post("/api/orders/", {"address_id": address.id}, format="json")
+    assert res.status_code == 400
+    assert "sold out" in str(res.data)
+
+    assert reconcile_flash_sales() == 1
+    store_item.refresh_from_db()
+    assert (store_item.stock, store_item.units_sold, store_item.order_count) == (1, 2, 1)
+    assert flash_sale.available(store_item.pk) == 1
+
+def test_flash_sale_reconcile_reapplies_a_batch_that_never_committed(store, product):
+    from order import flash_sale
+
+    item = StoreItem.objects.create(store=store, product=product, price=1000, stock=10, flash_sale=True)
+    flash_sale.reserve([(item, 4)])
+
+    # A reconcile drained its batch, then died before its UPDATE committed.
+    assert flash_sale.drain_pending("crashed") == ("crashed", {item.pk: (4, 1)})
+    flash_sale.forget(item.pk)
+    flash_sale.reserve([(item, 1)])
+    assert flash_sale.available(item.pk) == 5
+
+    assert flash_sale.reconcile() == 2
+    item.refresh_from_db()
+    assert (item.stock, item.units_sold, item.order_count) == (5, 5, 2)
+    assert flash_sale.available(item.pk) == 5
+    assert flash_sale.drain_pending() == (None, {})
+
+def test_flash_sale_reconcile_clears_a_batch_that_committed(store, product):
+    from order import flash_sale
+
+    item = StoreItem.objects.create(store=store, product=product, price=1000, stock=10, flash_sale=True)
+    flash_sale.reserve([(item, 4)])
+
+    # A reconcile committed its batch, then died before clearing it.
+    run_id, totals = flash_sale.drain_pending("crashed")
+    assert flash_sale.apply_batch(run_id, totals)
+    item.refresh_from_db()
+    flash_sale.forget(item.pk)
+    flash_sale.reserve([(item, 1)])
+    assert flash_sale.available(item.pk) == 1
+
+    assert flash_sale.reconcile() == 1
+    item.refresh_from_db()
+    assert (item.stock, item.units_sold, item.order_count) == (5, 5, 2)
+    # The counter that subtracted the batch twice is primed again from the database.
+    assert flash_sale.available(item.pk) is None
+    flash_sale.reserve([(item, 1)])
+    assert flash_sale.available(item.pk) == 4
+
+def test_cart_reservations_hold_and_expire(settings, client, address, store_item):
+    from datetime import timedelta
+    from django.utils import timezone
+    from order.tasks import release_expired_reservations
+
+    settings.CART_RESERVATION_ENABLED = True
+    res = client.post("/api/cart-items/", {"store_item": store_item.id, "quantity": 7}, format="json")
+    assert res.status_code == 201
+    store_item.refresh_from_db()
+    assert (store_item.reserved, store_item.available_stock) == (7, 3)
+
+    other = User.objects.create_user(username="other", password="x")
+    other_client = APIClient()
+    other_client.force_authenticate(other)
+    assert other_client.post("/api/cart-items/", {"store_item": store_item.id, "quantity": 4}, format="json").status_code == 400
+    assert other_client.post("/api/cart-items/", {"store_item": store_item.id, "quantity": 3}, format="json").status_code == 201
+
+    # Fully held stock is not offered.
+    product = client.get(f"/api/products/{store_item.product_id}/").data
+    assert (product["sellers"], product["in_stock_sellers"]) == ([], 0)
+
+    item = CartItem.objects.get(cart__user=other)
+    CartItem.objects.filter(pk=item.pk).update(reserved_until=timezone.now() - timedelta(seconds=1))
+    assert release_expired_reservations() == 1
+    store_item.refresh_from_db()
+    assert store_item.reserved == 7
+
+    res = client.post("/api/orders/", {"address_id": address.id}, format="json")
+    assert res.status_code == 201
+    store_item.refresh_from_db()
+    assert (store_item.stock, store_item.reserved) == (3, 0)
+
+    # The lapsed line can still check out while stock lasts.
+    res = other_client.post("/api/orders/", {"address_id": Address.objects.create(
+        user=other, label="W", address_line_1="x", city="x", state="x", postal_code="1", country="x"
+    ).id}, format="json")
+    assert res.status_code == 201
+    store_item.refresh_from_db()
+    assert (store_item.stock, store_item.reserved) == (0, 0)
+
+def test_cart_reservations_refresh_cached_product_detail(settings, client, store_item):
+    from order import reservations
+
+    settings.CART_RESERVATION_ENABLED = True
+    anonymous = APIClient()
+    url = f"/api/products/{store_item.product_id}/"
+    etag = anonymous.get(url)["ETag"]
+
+    assert client.post("/api/cart-items/", {"store_item": store_item.id, "quantity": 7}, format="json").status_code == 201
+    response = anonymous.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response.data["sellers"][0]["available_stock"] == 3
+
+    etag = response["ETag"]
+    reservations.release({store_item.pk: 7})
+    response = anonymous.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response.data["sellers"][0]["available_stock"] == 10
+
+def test_resizing_a_line_the_sweep_released_holds_from_the_database_row(settings, client, store_item):
+    from order import reservations
+
+    settings.CART_RESERVATION_ENABLED = True
+    assert client.post("/api/cart-items/", {"store_item": store_item.id, "quantity": 4}, format="json").status_code == 201
+    fetched = CartItem.objects.select_related("store_item").get()
+
+    # The expiry sweep releases the hold after the view fetched the line.
+    reservations.release_items([CartItem.objects.get(pk=fetched.pk)])
+    assert reservations.resize(fetched, 2)
+    store_item.refresh_from_db()
+    assert store_item.reserved == 2
+    assert CartItem.objects.get(pk=fetched.pk).reserved_quantity == 2
+
+def test_deleting_held_cart_lines_releases_stock(settings, client, user, store_item):
+    settings.CART_RESERVATION_ENABLED = True
+    assert client.post("/api/cart-items/", {"store_item": store_item.id, "quantity": 3}, format="json").status_code == 201
+    assert client.post("/api/cart-items/", {"store_item": store_item.id, "quantity": 2}, format="json").status_code == 201
+    store_item.refresh_from_db()
+    assert store_item.reserved == 5
+
+    CartItem.objects.filter(quantity=2).delete()
+    store_item.refresh_from_db()
+    assert store_item.reserved == 3
+
+    Cart.objects.filter(user=user).delete()
+    store_item.refresh_from_db()
+    assert store_item.reserved == 0
+
+def test_order_create_idempotency_key(client, address, cart_item):
+    res = client.post("/api/orders/", {"address_id": address.id}, format="json", HTTP_IDEMPOTENCY_KEY="k1")
+    assert res.status_code == 201
+    replayed = client.post("/api/orders/", {"address_id": address.id}, format="json", HTTP_IDEMPOTENCY_KEY="k1")
+    assert replayed.status_code == 201
+    assert replayed["Idempotent-Replayed"] == "true"
+    assert replayed.data["id"] == res.data["id"]
+    assert Order.objects.count() == 1
+
+    res = client.post("/api/orders/", {"address_id": 0}, format="json", HTTP_IDEMPOTENCY_KEY="k1")
+    assert res.status_code == 422
+
+def test_idempotency_waits_for_in_flight_request(client, user):
+    import hashlib
+    import threading
+    from django.core.cache import cache
+
+    result_key = f"idempotency:payments:{user.pk}:{hashlib.sha256(b'pay-1').hexdigest()}"
+    cache.add(f"{result_key}:lock", "in-flight", 30)
+    fingerprint = hashlib.sha256(b'{"order_id": 1}').hexdigest()
+
+    def finish():
+        cache.set(result_key, {"fingerprint": fingerprint, "status": 200, "data": {"authority": "A1"}}, 60)
+        cache.delete(f"{result_key}:lock")
+
+    threading.Timer(0.2, finish).start()
+    res = client.post("/api/payments/", {"order_id": 1}, format="json", HTTP_IDEMPOTENCY_KEY="pay-1")
+    assert res.status_code == 200
+    assert res.data == {"authority": "A1"}
+
+def test_payment_round_trip_through_gateway(client, admin_user, address, cart_item, zarinpal):
+    order_id = client.post("/api/orders/", {"address_id": address.id}, format="json").data["id"]
+    authority = client.post("/api/payments/", {"order_id": order_id}, format="json").data["authority"]
+
+    res = client.get("/api/payments/verify/", {"Authority": authority, "Status": "OK"})
+    assert res.status_code == 200
+    payment = Payment.objects.get(transaction_id=authority)
+    assert (payment.status, payment.reference_id, payment.card_pan) == (2, "201", "502229******5995")
+    assert zarinpal.calls == {"/pg/v4/payment/request.json": 1, "/pg/v4/payment/verify.json": 1}
+
+    admin = APIClient()
+    admin.force_authenticate(admin_user)
+    stats = admin.get("/api/gateway-stats/").data
+    assert (stats["request"]["ok"], stats["verify"]["ok"], stats["breaker"]) == (1, 1, "closed")
+
+def test_gateway_breaker_fails_fast(settings, client, address, cart_item, zarinpal):
+    settings.ZARINPAL_MAX_RETRIES = 0
+    settings.ZARINPAL_BREAKER_THRESHOLD = 2
+    zarinpal.failure_rate = 1.0
+    order_id = client.post("/api/orders/", {"address_id": address.id}, format="json").data["id"]
+
+    for _ in range(3):
+        res = client.post("/api/payments/", {"order_id": order_id}, format="json")
+        assert res.status_code == 503
+    assert zarinpal.calls["/pg/v4/payment/request.json"] == 2
+
+def test_gateway_replays_only_verify_on_5xx(settings, zarinpal):
+    from order import gateway
+
+    settings.ZARINPAL_MAX_RETRIES = 2
+    settings.ZARINPAL_BREAKER_THRESHOLD = 10
+    zarinpal.failure_rate = 1.0
+    client = gateway.get_client()
+    with pytest.raises(gateway.GatewayUnavailable):
+        client.request_payment(5000, "http://testserver/callback", "Order")
+    with pytest.raises(gateway.GatewayUnavailable):
+        client.verify(5000, "A1")
+    assert zarinpal.calls["/pg/v4/payment/request.json"] == 1
+    assert zarinpal.calls["/pg/v4/payment/verify.json"] == 3
+
+def test_gateway_breaker_frees_trial_after_unexpected_error(monkeypatch):
+    from order import gateway
+
+    breaker = gateway.CircuitBreaker(threshold=1, cooldown=0)
+    breaker.record_failure()
+    client = gateway.ZarinpalClient("http://gateway.invalid", "merchant", (1, 1), 0, breaker)
+
+    def explode(*args, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(client.sessions["verify"], "post", explode)
+    with pytest.raises(RuntimeError):
+        client.verify(5000, "A1")
+    assert breaker.allow()
+
+def test_async_payment_verification(settings, client, address, cart_item, zarinpal, run_tasks_inline):
+    from order.outbox import relay_all
+
+    settings.PAYMENT_VERIFY_ASYNC = True
+    order_id = client.post("/api/orders/", {"address_id": address.id}, format="json").data["id"]
+    authority = client.post("/api/payments/", {"order_id": order_id}, format="json").data["authority"]
+    anonymous = APIClient()
+    OutboxMessage.objects.all().delete()
+
+    res = anonymous.get("/api/payments/verify/", {"Authority": authority, "Status": "OK"})
+    assert res.status_code == 202
+    assert res.json()["status"] == "pending"
+    assert "/api/payments/status/?authority=" in res.json()["status_url"]
+    assert zarinpal.calls.get("/pg/v4/payment/verify.json") is None
+    assert anonymous.get("/api/payments/status/", {"authority": authority}).data["status"] == "pending"
+
+    assert list(OutboxMessage.objects.values_list("task", "args")) == [("order.tasks.verify_payment_task", [authority])]
+    relay_all()
+    status = anonymous.get("/api/payments/status/", {"authority": authority}).data
+    assert (status["status"], status["callback_status"], status["ref_id"]) == ("verified", "OK", "201")
+    assert Order.objects.get(pk=order_id).status == 2
+
+    # A repeated callback reports the settled state without calling the gateway again.
+    assert anonymous.get("/api/payments/verify/", {"Authority": authority, "Status": "OK"}).json()["status"] == "verified"
+    assert zarinpal.calls["/pg/v4/payment/verify.json"] == 1
+
+
+def pending_payments(user, address, zarinpal, count):
+    payments = []
+    for _ in range(count):
+        order = Order.objects.create(user=user, address=address, total_price=5000)
+        authority = zarinpal.request_payment({"merchant_id": "test-merchant", "amount": 5000})["data"]["authority"]
+        payments.append(Payment.objects.create(
+            order=order, transaction_id=authority, reference_id="", card_pan="", amount=5000, fee=0
+        ))
+    return payments
+
+
+def test_reconcile_pending_payments(settings, user, address, zarinpal):
+    from datetime import timedelta
+    from django.utils import timezone
+    from order.reconciliation import get_watermark, reconcile_pending_payments, set_watermark
+
+    set_watermark(0)
+    stale = pending_payments(user, address, zarinpal, 5)
+    Payment.objects.filter(pk__in=[p.pk for p in stale]).update(created_at=timezone.now() - timedelta(hours=1))
+    Payment.objects.filter(pk=stale[0].pk).update(transaction_id="A-UNKNOWN")
+    fresh = pending_payments(user, address, zarinpal, 1)[0]
+
+    stats = reconcile_pending_payments(chunk_size=2, workers=4)
+    assert (stats["checked"], stats["verified"], stats["failed"], stats["watermark"]) == (5, 4, 1, 0)
+    assert OutboxMessage.objects.filter(task="order.tasks.send_payment_confirmed_email").count() == 4
+    assert Payment.objects.get(pk=stale[0].pk).status == 3
+    assert set(Payment.objects.filter(pk__in=[p.pk for p in stale[1:]]).values_list("status", flat=True)) == {2}
+    assert set(Order.objects.filter(payment__in=stale[1:]).values_list("status", flat=True)) == {2}
+    assert Payment.objects.get(pk=fresh.pk).status == 1
+
+    # Settled payments are not sent to the gateway again.
+    calls = zarinpal.calls["/pg/v4/payment/verify.json"]
+    assert reconcile_pending_payments(chunk_size=2)["checked"] == 0
+    assert zarinpal.calls["/pg/v4/payment/verify.json"] == calls
+    assert get_watermark() == 0
+
+
+def test_reconcile_stops_when_gateway_is_down(settings, user, address, zarinpal):
+    from datetime import timedelta
+    from django.utils import timezone
+    from order.reconciliation import get_watermark, reconcile_pending_payments, set_watermark
+
+    settings.ZARINPAL_MAX_RETRIES = 0
+    settings.ZARINPAL_BREAKER_THRESHOLD = 100
+    set_watermark(0)
+    stale = pending_payments(user, address, zarinpal, 3)
+    Payment.objects.filter(pk__in=[p.pk for p in stale]).update(created_at=timezone.now() - timedelta(hours=1))
+    zarinpal.failure_rate = 1
+
+    stats = reconcile_pending_payments(chunk_size=2)
+    assert (stats["checked"], stats["unavailable"]) == (0, 2)
+    assert get_watermark() == stale[0].pk - 1
+    assert set(Payment.objects.filter(pk__in=[p.pk for p in stale]).values_list("status", flat=True)) == {1}
+
+    zarinpal.failure_rate = 0
+    assert reconcile_pending_payments(chunk_size=2)["verified"] == 3
+
+
+def test_undecided_gateway_codes_are_passed_over_then_given_up(settings, user, address, zarinpal):
+    from datetime import timedelta
+    from django.utils import timezone
+    from order import gateway
+    from order.reconciliation import get_watermark, reconcile_pending_payments, set_watermark
+    from order.verification import verify_payment
+
+    set_watermark(0)
+    stale = pending_payments(user, address, zarinpal, 3)
+    Payment.objects.filter(pk__in=[p.pk for p in stale]).update(created_at=timezone.now() - timedelta(hours=1))
+    # The gateway answers -50 (amount mismatch) for the second payment.
+    Payment.objects.filter(pk=stale[1].pk).update(amount=4000)
+
+    # The undecided payment stays pending but does not hold back the payments after it.
+    stats = reconcile_pending_payments(chunk_size=1)
+    assert (stats["verified"], stats["failed"], stats["undecided"], stats["unavailable"]) == (2, 0, 1, 0)
+    assert get_watermark() == 0
+    assert Payment.objects.get(pk=stale[1].pk).status == 1
+
+    with pytest.raises(gateway.GatewayUnavailable):
+        verify_payment(stale[1].transaction_id)
+    assert Payment.objects.get(pk=stale[1].pk).status == 1
+
+    # Past PAYMENT_RECONCILE_GIVE_UP_AFTER it is failed for an operator to follow up.
+    Payment.objects.filter(pk=stale[1].pk).update(
+        created_at=timezone.now() - timedelta(seconds=settings.PAYMENT_RECONCILE_GIVE_UP_AFTER + 1)
+    )
+    stats = reconcile_pending_payments(chunk_size=1)
+    assert (stats["checked"], stats["failed"], stats["undecided"]) == (1, 1, 0)
+    assert Payment.objects.get(pk=stale[1].pk).status == 3
+
+
+def test_verify_payment_yields_to_a_concurrent_settlement(user, address, zarinpal, monkeypatch):
+    from order import gateway
+    from order.verification import verify_payment
+
+    payment = pending_payments(user, address, zarinpal, 1)[0]
+    client = gateway.get_client()
+    answer = client.verify
+
+    def verify_while_reconcile_settles(amount, authority):
+        # The row is not locked while the gateway answers, so another worker can settle it.
+        Payment.objects.filter(pk=payment.pk).update(status=2, reference_id="other-worker")
+        return answer(amount, authority)
+
+    monkeypatch.setattr(client, "verify", verify_while_reconcile_settles)
+    settled, result = verify_payment(payment.transaction_id)
+    assert result is None
+    assert (settled.status, settled.reference_id) == (2, "other-worker")
+    assert not OutboxMessage.objects.filter(task="order.tasks.send_payment_confirmed_email").exists()
+
+
+class BatchRecordingBackend(locmem.EmailBackend):
+    """locmem backend that counts connections and refuses some recipients."""
+    opened = 0
+    refused = set()
+
+    def open(self):
+        BatchRecordingBackend.opened += 1
+        return True
+
+    def send_messages(self, messages):
+        for message in messages:
+            if self.refused.intersection(message.to):
+                raise smtplib.SMTPRecipientsRefused({address: (550, b"No such user") for address in message.to})
+        return super().send_messages(messages)
+
+
+@pytest.fixture
+def mail_queue(settings):
+    from order import mailer
+
+    settings.EMAIL_BACKEND = "order.tests.BatchRecordingBackend"
+    settings.MAIL_MAX_ATTEMPTS = 2
+    BatchRecordingBackend.opened = 0
+    BatchRecordingBackend.refused = set()
+    keys = (mailer.QUEUE_KEY, mailer.PROCESSING_KEY, mailer.RETRY_KEY, mailer.DEAD_KEY, mailer.STATS_KEY)
+    mailer.get_client().delete(*keys)
+    yield mailer
+    mailer.get_client().delete(*keys)
+
+
+def test_email_is_sent_in_batches(mail_queue):
+    for order_id in range(5):
+        send_order_received_email(f"buyer{order_id}@example.com", order_id)
+    assert mail.outbox == []
+    assert mail_queue.get_mail_stats()["queued"] == 5
+
+    assert mail_queue.flush(batch_size=2) == {"sent": 5, "failed": 0}
+    assert [message.to for message in mail.outbox] == [[f"buyer{i}@example.com"] for i in range(5)]
+    assert BatchRecordingBackend.opened == 3
+
+    stats = mail_queue.get_mail_stats()
+    assert (stats["queued"], stats["batches"], stats["sent"]) == (0, 3, 5)
+    assert stats["avg_queue_latency_ms"] is not None
+
+
+def test_failed_email_is_retried_then_dead_lettered(mail_queue):
+    import time
+
+    BatchRecordingBackend.refused = {"gone@example.com"}
+    send_payment_confirmed_email("gone@example.com", 1)
+    send_payment_confirmed_email("buyer@example.com", 2)
+
+    assert mail_queue.flush() == {"sent": 1, "failed": 1}
+    assert [message.to for message in mail.outbox] == [["buyer@example.com"]]
+    assert mail_queue.get_mail_stats()["retrying"] == 1
+
+    # Not due yet: nothing is sent.
+    assert mail_queue.flush() == {"sent": 0, "failed": 0}
+    assert mail_queue.promote_due_retries(now=time.time() + 3600) == 1
+    assert mail_queue.flush() == {"sent": 0, "failed": 1}
+
+    stats = mail_queue.get_mail_stats()
+    assert (stats["retrying"], stats["dead_letters"], stats["retried"], stats["dead"]) == (0, 1, 1, 1)
+
+
+def test_email_claimed_by_a_crashed_flush_is_requeued(mail_queue, monkeypatch):
+    import time
+
+    def crash(messages):
+        raise SystemExit("worker killed mid-send")
+
+    send_payment_confirmed_email("buyer@example.com", 1)
+    monkeypatch.setattr(mail_queue, "send_batch", crash)
+    with pytest.raises(SystemExit):
+        mail_queue.flush()
+    monkeypatch.undo()
+
+    stats = mail_queue.get_mail_stats()
+    assert (stats["queued"], stats["processing"]) == (0, 1)
+    # The claim is not stale yet, so a concurrent flush leaves it alone.
+    assert mail_queue.flush() == {"sent": 0, "failed": 0}
+
+    assert mail_queue.requeue_stale_claims(now=time.time() + 3600) == 1
+    assert mail_queue.flush() == {"sent": 1, "failed": 0}
+    assert [message.to for message in mail.outbox] == [["buyer@example.com"]]
+    assert mail_queue.get_mail_stats()["processing"] == 0
+
+
+def test_checkout_writes_outbox_instead_of_calling_broker(client, address, cart_item, monkeypatch):
+    from order.outbox import relay_all
+
+    published = []
+    monkeypatch.setattr(send_order_received_email, "apply_async", lambda args: published.append(args))
+    monkeypatch.setattr(send_order_received_email, "delay", lambda *args: pytest.fail("broker called in request"))
+
+    order_id = client.post("/api/orders/", {"address_id": address.id}, format="json").data["id"]
+    assert published == []
+    message = OutboxMessage.objects.get()
+    assert (message.task, message.args) == ("order.tasks.send_order_received_email", ["buyer@example.com", order_id])
+
+    assert relay_all() == 1
+    assert published == [["buyer@example.com", order_id]]
+    assert not OutboxMessage.objects.exists()
+
+
+def test_failed_checkout_leaves_no_outbox_message(client, address, cart_item, store_item):
+    StoreItem.objects.filter(pk=store_item.pk).update(stock=0)
+    res = client.post("/api/orders/", {"address_id": address.id}, format="json")
+    assert res.status_code == 400
+    assert not OutboxMessage.objects.exists()
+
+
+def test_outbox_relay_backs_off_when_broker_fails(user, monkeypatch):
+    from order import outbox
+
+    def broker_down(args):
+        raise OSError("broker unreachable")
+
+    outbox.enqueue(send_payment_confirmed_email, user.email, 1)
+    monkeypatch.setattr(send_payment_confirmed_email, "apply_async", broker_down)
+    assert outbox.relay() == 0
+    message = OutboxMessage.objects.get()
+    assert message.attempts == 1
+    # Not due again until the backoff has passed.
+    assert outbox.relay() == 0
+    assert OutboxMessage.objects.get().attempts == 1
@@ -3,7 +3,7 @@ from rest_framework.routers import DefaultRouter
 from .views import (
     CartViewSet, CartItemViewSet,
     OrderViewSet, OrderItemViewSet,
-    PaymentViewSet, verify_payment,
+    PaymentViewSet, verify_payment, gateway_stats_view, mail_stats_view,
     SellerStoreItemViewSet, SellerOrderViewSet
 )
 
@@ -25,6 +25,8 @@ router.register(r'seller/orders', SellerOrderViewSet, basename='seller-orders')
 urlpatterns = [
     path('', include(router.urls)),
     path('payments/verify/', verify_payment, name='verify-payment'),
+    path('gateway-stats/', gateway_stats_view, name='gateway-stats'),
+    path('mail-stats/', mail_stats_view, name='mail-stats'),
 ]
 
 
@@ -0,0 +1,84 @@
+"""Gateway verification of payments, shared by the callback view and verify_payment_task."""
+from django.db import transaction
+from django.utils import timezone
+from order import gateway, outbox
+from order.models import Order, Payment
+from order.tasks import send_payment_confirmed_email
+
+PAYMENT_PENDING = 1
+PAYMENT_VERIFIED = 2
+PAYMENT_FAILED = 3
+ORDER_PROCESSING = 2
+
+# 101 means the gateway already verified this authority on an earlier attempt.
+VERIFIED_CODES = (100, 101)
+# Only these prove the buyer did not pay (-51) or the authority is dead (-54).
+# Any other code may clear on a later attempt, so it is treated like an outage.
+FAILED_CODES = (-51, -54)
+
+PAYMENT_STATUS_NAMES = {
+    PAYMENT_PENDING: "pending",
+    PAYMENT_VERIFIED: "verified",
+    PAYMENT_FAILED: "failed",
+    4: "refunded",
+}
+
+
+def record_callback(authority, callback_status):
+    """Store the callback outcome in one UPDATE. Returns False if no pending payment matches."""
+    updates = {"callback_status": callback_status[:10], "updated_at": timezone.now()}
+    if callback_status != "OK":
+        updates["status"] = PAYMENT_FAILED
+    return Payment.objects.filter(transaction_id=authority, status=PAYMENT_PENDING).update(**updates) > 0
+
+
+def result_code(result):
+    """The code of a gateway answer; error answers carry it in "errors" with empty "data"."""
+    data = result.get("data") or {}
+    errors = result.get("errors") or {}
+    return data.get("code", errors.get("code") if isinstance(errors, dict) else None)
+
+
+def verify_payment(authority):
+    """Verify a pending payment with the gateway and apply the outcome.
+
+    The gateway is called outside any transaction, so no row lock or pinned
+    connection waits on it; the outcome is applied with a conditional UPDATE,
+    which a concurrent callback or reconciliation run may win instead.
+
+    Returns (payment, gateway_result); gateway_result is None when the payment
+    was no longer pending. Raises gateway.GatewayUnavailable, leaving the payment
+    pending, when the gateway is down or gives no definitive answer, so callers can retry.
+    """
+    payment = Payment.objects.select_related("order__user").get(transaction_id=authority)
+    if payment.status != PAYMENT_PENDING:
+        return payment, None
+
+    result = gateway.get_client().verify(int(payment.amount), payment.transaction_id)
+    data = result.get("data") or {}
+    code = result_code(result)
+    if code in VERIFIED_CODES:
+        updates = {
+            "status": PAYMENT_VERIFIED,
+            "reference_id": str(data.get("ref_id", "")),
+            "card_pan": data.get("card_pan") or "",
+            "fee": data.get("fee", 0),
+        }
+    elif code in FAILED_CODES:
+        updates = {"status": PAYMENT_FAILED}
+    else:
+        raise gateway.GatewayUnavailable(f"Payment gateway answered code {code}.")
+
+    now = timezone.now()
+    with transaction.atomic():
+        settled = Payment.objects.filter(pk=payment.pk, status=PAYMENT_PENDING).update(**updates, updated_at=now)
+        if settled and updates["status"] == PAYMENT_VERIFIED:
+            Order.objects.filter(pk=payment.order_id).update(status=ORDER_PROCESSING, updated_at=now)
+            outbox.enqueue(send_payment_confirmed_email, payment.order.user.email, payment.order_id)
+    if not settled:
+        # Settled elsewhere while the gateway was answering.
+        payment.refresh_from_db()
+        return payment, None
+    for field, value in {**updates, "updated_at": now}.items():
+        setattr(payment, field, value)
+    return payment, result
@@ -1,18 +1,26 @@
+import logging
 from rest_framework import viewsets , status
-from django.db import transaction
-import requests
 from django.http import JsonResponse
 from django.conf import settings
-from customer.models import Address
 from rest_framework.exceptions import ValidationError
 from order.models import Cart, CartItem, Order, OrderItem, Payment
-from order.serializers import CartSerializer, CartItemSerializer, OrderSerializer, OrderItemSerializer, PaymentSerializer , StoreItemSerializer , StoreItem
+from order.serializers import CartSerializer, CartItemSerializer, OrderSerializer, OrderItemSerializer, PaymentSerializer , SellerOrderSerializer, StoreItemSerializer , StoreItem
 from rest_framework.permissions import IsAuthenticated
-from order.tasks import send_order_received_email , send_payment_confirmed_email
+from order.tasks import send_payment_confirmed_email, verify_payment_task
+from order.pagination import OrderPagination
+from order.checkout import checkout_cart
+from order import reservations
+from order.idempotency import idempotent
+from order import gateway, mailer, outbox, verification
+from django.db import transaction
+from django.db.models import Prefetch
+from django.urls import reverse
 from rest_framework.decorators import api_view, permission_classes , action
 from rest_framework.response import Response
 from rest_framework.viewsets import ReadOnlyModelViewSet
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAdminUser
+
+logger = logging.getLogger(__name__)
 
 
 
@@ -20,15 +28,23 @@ from rest_framework.permissions import AllowAny
 
 
 
+def seller_order_items(seller):
+    """Prefetch only the seller's own lines; the rest of a shared order belongs to other stores."""
+    return Prefetch(
+        'items',
+        queryset=OrderItem.objects.filter(store_item__store__seller=seller).select_related('store_item__product'),
+    )
+
+
 class SellerOrderViewSet(ReadOnlyModelViewSet):
-    serializer_class = OrderSerializer
+    serializer_class = SellerOrderSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         user = self.request.user
         return Order.objects.filter(
             items__store_item__store__seller=user
-        ).distinct()
+        ).distinct().select_related('user', 'address').prefetch_related(seller_order_items(user))
 
 
 
@@ -74,6 +90,9 @@ class CartItemViewSet(viewsets.ModelViewSet):
             if int(new_quantity) > cart_item.store_item.stock:
                 return Response({'error': 'Insufficient stock'}, status=status.HTTP_400_BAD_REQUEST)
 
+            if not reservations.resize(cart_item, int(new_quantity)):
+                return Response({'error': 'Insufficient stock'}, status=status.HTTP_400_BAD_REQUEST)
+
             cart_item.quantity = int(new_quantity)
             cart_item.save()
             serializer = self.get_serializer(cart_item)
@@ -103,77 +122,38 @@ class CartItemViewSet(viewsets.ModelViewSet):
 class OrderViewSet(viewsets.ModelViewSet):
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = OrderPagination
 
     def get_queryset(self):
         user = self.request.user
-        print(f"Request made by: {user}, is_seller: {user.is_seller}")
+        logger.debug("Listing orders", extra={"user_id": user.pk, "is_seller": user.is_seller})
 
         if user.is_seller:
             return Order.objects.filter(
                 items__store_item__store__seller=user
-            ).distinct().prefetch_related('items__store_item__product')
+            ).distinct().select_related('user', 'address').prefetch_related(seller_order_items(user))
 
         return Order.objects.filter(
             user=user
-        ).prefetch_related('items__store_item__product').order_by('-created_at')
+        ).select_related('user', 'address').prefetch_related('items__store_item__product').order_by('-created_at')
 
+    def get_serializer_class(self):
+        if self.action in ('list', 'retrieve') and self.request.user.is_seller:
+            return SellerOrderSerializer
+        return super().get_serializer_class()
+
+    @idempotent("orders")
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         self.perform_create(serializer)
-        order = serializer.instance
-        send_order_received_email.delay(order.user.email, order.id)
-        return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
+        return Response(OrderSerializer(serializer.instance).data, status=status.HTTP_201_CREATED)
 
     def perform_create(self, serializer):
-        user = self.request.user
-
-        try:
-            cart = Cart.objects.prefetch_related('items__store_item').get(user=user)
-        except Cart.DoesNotExist:
-            raise ValidationError("Cart not found for this user.")
-
-        if not cart.items.exists():
-            raise ValidationError("Your cart is empty.")
-
         address_id = self.request.data.get("address_id")
         if not address_id:
             raise ValidationError("Missing address_id. Please select one during checkout.")
-        try:
-            address = Address.objects.get(id=address_id, user=user)
-        except Address.DoesNotExist:
-            raise ValidationError("Address not found.")
-
-        for item in cart.items.all():
-            if item.quantity > item.store_item.stock:
-                raise ValidationError(
-                    f"Insufficient stock for {item.store_item.product.name}. "
-                    f"Available: {item.store_item.stock}"
-                )
-
-        with transaction.atomic():
-            total_price = sum(item.total_item_price for item in cart.items.all())
-
-            order = Order.objects.create(
-                user=user,
-                address=address,
-                total_price=total_price
-            )
-
-            for item in cart.items.all():
-                OrderItem.objects.create(
-                    order=order,
-                    store_item=item.store_item,
-                    quantity=item.quantity,
-                    price=item.unit_price,
-                    total_price=item.total_item_price
-                )
-                item.store_item.stock = max(item.store_item.stock - item.quantity, 0)
-                item.store_item.save(update_fields=["stock"])
-
-            cart.items.all().delete()
-
-            serializer.instance = order
+        serializer.instance = checkout_cart(self.request.user, address_id)
 
     @action(detail=True, methods=['patch'])
     def update_status(self, request, pk=None):
@@ -233,18 +213,17 @@ def verify_payment(request):
         return Response({'detail': 'Order not found.'}, status=status.HTTP_404_NOT_FOUND)
 
 
-    payment = Payment.objects.create(
-        order=order,
-        transaction_id=transaction_id,
-        reference_id=reference_id,
-        card_pan=card_pan,
-        amount=amount,
-        fee=fee,
-        status=2  
-    )
-
-
-    send_payment_confirmed_email.delay(user.email, order.id)
+    with transaction.atomic():
+        Payment.objects.create(
+            order=order,
+            transaction_id=transaction_id,
+            reference_id=reference_id,
+            card_pan=card_pan,
+            amount=amount,
+            fee=fee,
+            status=2
+        )
+        outbox.enqueue(send_payment_confirmed_email, user.email, order.id)
 
     return Response({'detail': 'Payment verified and saved successfully.'}, status=status.HTTP_200_OK)
 
@@ -260,6 +239,7 @@ class PaymentViewSet(viewsets.ModelViewSet):
     serializer_class = PaymentSerializer
     permission_classes = [IsAuthenticated]
 
+    @idempotent("payments")
     def create(self, request, *args, **kwargs):
         order_id = request.data.get("order_id")
         try:
@@ -272,28 +252,19 @@ class PaymentViewSet(viewsets.ModelViewSet):
             return Response({"error": "Amount must be at least 100 Toman"}, status=status.HTTP_400_BAD_REQUEST)
     
 
-        payload = {
-            "merchant_id": settings.ZARINPAL_MERCHANT_ID,
-            "amount": amount,
-            "callback_url": settings.ZARINPAL_CALLBACK_URL,
-            "description": "پرداخت سفارش",
-            "metadata": {
-                "email": request.user.email,
-                "mobile": request.user.phone
-            }
-        }
-
         try:
-            response = requests.post(
-                "https://sandbox.zarinpal.com/pg/v4/payment/request.json",
-                json=payload
+            result = gateway.get_client().request_payment(
+                amount,
+                settings.ZARINPAL_CALLBACK_URL,
+                "پرداخت سفارش",
+                {"email": request.user.email, "mobile": request.user.phone},
             )
-            result = response.json()
-            print("Zarinpal initiation response:", result)
+            logger.info("Zarinpal payment request answered", extra={"order_id": order.id, "result": result})
+            data = result.get("data") or {}
 
-            if result.get("data", {}).get("code") == 100:
-                authority = result["data"]["authority"]
-                fee = result["data"].get("fee", 0)
+            if data.get("code") == 100:
+                authority = data["authority"]
+                fee = data.get("fee", 0)
 
                 Payment.objects.create(
                     order=order,
@@ -303,15 +274,15 @@ class PaymentViewSet(viewsets.ModelViewSet):
                 )
                 return Response({
                     "authority": authority,
-                    "url": f"https://sandbox.zarinpal.com/pg/StartPay/{authority}"
+                    "url": gateway.get_client().start_pay_url(authority)
                 })
 
             return Response({
                 "error": "Payment request failed",
-                "details": result.get("errors", result.get("data", {}).get("message", "Unapproved request"))
+                "details": result.get("errors") or data.get("message", "Unapproved request")
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        except requests.RequestException as e:
+        except gateway.GatewayUnavailable as e:
             return Response({
                 "error": "Connection to Zarinpal failed",
                 "details": str(e)
@@ -319,59 +290,82 @@ class PaymentViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=["get"], url_path="verify" , permission_classes=[AllowAny])
     def verify_payment(self, request):
-        print("View reached")
-        print("Params:", request.GET)
+        logger.info("Payment callback received", extra={"params": request.GET.dict()})
         authority = request.GET.get("Authority")
         status_code = request.GET.get("Status")
 
         if not authority or not status_code:
             return JsonResponse({"error": "Missing parameters"}, status=400)
 
-        try:
-            payment = Payment.objects.get(transaction_id=authority)
-            order = payment.order
-            if status_code == "OK":
-                payload = {
-                    "merchant_id": settings.ZARINPAL_MERCHANT_ID,
-                    "amount": int(payment.amount),
-                    "authority": authority
-                }
-                response = requests.post(
-                    "https://sandbox.zarinpal.com/pg/v4/payment/verify.json",
-                    json=payload
-                )
-                result = response.json()
-                print("Zarinpal verify response:", result)
-
-                if result.get("data", {}).get("code") == 100:
-                    data = result["data"]
-                    payment.verified = True
-                    payment.ref_id = data.get("ref_id")
-                    payment.card_pan = data.get("card_pan")
-                    payment.fee = data.get("fee", 0)
-                    payment.save()
-
-
-                    order.status = 2  # PROCESSING or DELIVERED depending on flow
-                    order.save(update_fields=["status"])
+        with transaction.atomic():
+            recorded = verification.record_callback(authority, status_code)
+            if recorded and status_code == "OK" and settings.PAYMENT_VERIFY_ASYNC:
+                outbox.enqueue(verify_payment_task, authority)
+
+        if not recorded:
+            # Unknown authority, or a repeated callback for a settled payment.
+            data = self.payment_status_data(authority)
+            if data is None:
+                return JsonResponse({"error": "Payment not found"}, status=404)
+            return JsonResponse(data)
+
+        if status_code != "OK":
+            return JsonResponse({"status": "cancelled", "message": "User canceled payment"})
 
-                    send_payment_confirmed_email.delay(
-                        payment.order.user.email,
-                        payment.order.id
-                    )
+        if settings.PAYMENT_VERIFY_ASYNC:
+            status_url = reverse("payment-status") + f"?authority={authority}"
+            return JsonResponse({
+                "status": "pending",
+                "authority": authority,
+                "status_url": request.build_absolute_uri(status_url),
+            }, status=202)
 
-                    return JsonResponse({"status": "success", "ref_id": payment.ref_id})
+        try:
+            payment, result = verification.verify_payment(authority)
+            logger.info("Zarinpal verify answered", extra={"authority": authority, "result": result})
+            if payment.status == verification.PAYMENT_VERIFIED:
+                return JsonResponse({"status": "success", "ref_id": payment.reference_id})
+
+            data = (result or {}).get("data") or {}
+            return JsonResponse({
+                "status": "failed",
+                "message": (result or {}).get("errors") or data.get("message", "Verification failed")
+            }, status=400)
+
+        except gateway.GatewayUnavailable as e:
+            return JsonResponse({"error": "Connection to Zarinpal failed", "details": str(e)}, status=503)
+        except Exception as e:
+            return JsonResponse({"error": str(e)}, status=500)
 
-                return JsonResponse({
-                    "status": "failed",
-                    "message": result.get("errors", result.get("data", {}).get("message", "Verification failed"))
-                }, status=400)
+    @action(detail=False, methods=["get"], url_path="status", url_name="status", permission_classes=[AllowAny])
+    def payment_status(self, request):
+        authority = request.GET.get("authority")
+        if not authority:
+            return Response({"error": "Missing authority"}, status=status.HTTP_400_BAD_REQUEST)
+        data = self.payment_status_data(authority)
+        if data is None:
+            return Response({"error": "Payment not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(data)
+
+    def payment_status_data(self, authority):
+        row = Payment.objects.filter(transaction_id=authority).values("status", "callback_status", "reference_id").first()
+        if row is None:
+            return None
+        return {
+            "authority": authority,
+            "status": verification.PAYMENT_STATUS_NAMES.get(row["status"], "unknown"),
+            "callback_status": row["callback_status"] or None,
+            "ref_id": row["reference_id"] or None,
+        }
 
-            return JsonResponse({"status": "cancelled", "message": "User canceled payment"})
 
-        except Payment.DoesNotExist:
-            return JsonResponse({"error": "Payment not found"}, status=404)
-        except Exception as e:
-            return JsonResponse({"error": str(e)}, status=500)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def gateway_stats_view(request):
+    return Response(gateway.get_gateway_stats())
 
 
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def mail_stats_view(request):
+    return Response(mailer.get_mail_stats())
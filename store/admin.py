@@ -1,33 +1,49 @@
 from django.contrib import admin
 from django.core.exceptions import ValidationError
+from core.admin_filters import RelatedAdminListFilter
 from .models import Category, Product, ProductImage, Store, StoreItem, Review
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ['name', 'is_active', 'parent']
     list_filter = ['is_active']
+    list_select_related = ['parent__parent']
     search_fields = ['name', 'description']
     autocomplete_fields = ['parent']
 
+    def get_queryset(self, request):
+        # Category.__str__ shows the parent's name.
+        return super().get_queryset(request).select_related('parent')
+
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ['name', 'rating', 'is_active']
-    list_filter = ['is_active', 'categories']
+    list_display = ['name', 'rating', 'review_count', 'is_active']
+    list_filter = ['is_active', ('categories', RelatedAdminListFilter)]
     search_fields = ['name', 'description']
     autocomplete_fields = ['categories']
 
+    def get_queryset(self, request):
+        # Product.__str__ lists the category names.
+        return super().get_queryset(request).prefetch_related('categories')
+
 @admin.register(ProductImage)
 class ProductImageAdmin(admin.ModelAdmin):
     list_display = ['product', 'image']
     search_fields = ['product__name']
     autocomplete_fields = ['product']
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('product__categories')
+
 @admin.register(Store)
 class StoreAdmin(admin.ModelAdmin):
     list_display = ['name', 'seller']
     search_fields = ['name', 'seller__username']
     autocomplete_fields = ['seller']
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('seller')
+
     def save_model(self, request, obj, form, change):
         if not getattr(request.user, 'is_seller', False):
             raise ValidationError("You must be a seller to create a store.")
@@ -39,15 +55,24 @@ class StoreAdmin(admin.ModelAdmin):
 
 @admin.register(StoreItem)
 class StoreItemAdmin(admin.ModelAdmin):
-    list_display = ['product', 'store', 'price', 'discount_price', 'stock', 'is_active']
-    list_filter = ['store', 'is_active']
+    list_display = ['product', 'store', 'price', 'discount_price', 'stock', 'units_sold', 'order_count', 'is_active', 'flash_sale']
+    list_filter = [('store', RelatedAdminListFilter), 'is_active', 'flash_sale']
+    list_select_related = ['product', 'store__seller']
     search_fields = ['product__name', 'store__name']
     list_editable = ['price', 'discount_price', 'stock']
+    readonly_fields = ['units_sold', 'order_count']
     autocomplete_fields = ['product', 'store']
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('product__categories')
+
 @admin.register(Review)
 class ReviewAdmin(admin.ModelAdmin):
     list_display = ['user', 'product', 'store', 'rating', 'created_at']
     list_filter = ['rating', 'created_at']
+    list_select_related = ['user', 'product', 'store__seller']
     search_fields = ['user__username', 'product__name', 'store__name']
     autocomplete_fields = ['user', 'product', 'store']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('product__categories')
@@ -0,0 +1,178 @@
+import hashlib
+import time
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+
+# Bump when serializer output changes so old payloads are never served.
+RESPONSE_CACHE_VERSION = 1
+RESPONSE_CACHE_TIMEOUT = 60 * 5
+RESPONSE_CACHE_VIEWS = ('product-list', 'product-detail', 'category-list', 'category-detail', 'category-tree')
+
+
+def _generation_key(tag):
+    return f"respcache:gen:{tag}"
+
+
+def _stats_key(name, outcome):
+    return f"respcache:stats:{name}:{outcome}"
+
+
+def get_generations(tags):
+    keys = [_generation_key(tag) for tag in tags]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            # A fresh, time-based generation never matches entries written
+            # under a generation that has since been evicted.
+            cache.add(key, time.time_ns(), None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def bump_generations(*tags):
+    for tag in tags:
+        try:
+            cache.incr(_generation_key(tag))
+        except ValueError:
+            pass
+
+
+def invalidate(*tags):
+    bump_generations(*tags)
+    transaction.on_commit(lambda: bump_generations(*tags))
+
+
+def product_tags(product_ids):
+    return ['products'] + [f'product:{pk}' for pk in product_ids]
+
+
+def invalidate_products(product_ids):
+    invalidate(*product_tags(product_ids))
+
+
+def normalized_query(request, exclude=()):
+    params = request.query_params
+    return "&".join(
+        f"{key}={','.join(sorted(params.getlist(key)))}"
+        for key in sorted(params)
+        if key not in exclude and any(params.getlist(key))
+    )
+
+
+def response_cache_key(name, tags, request):
+    generations = ":".join(str(generation) for generation in get_generations(tags))
+    digest = hashlib.sha1(f"{generations}|{normalized_query(request)}".encode()).hexdigest()
+    return f"respcache:v{RESPONSE_CACHE_VERSION}:{name}:{digest}"
+
+
+def record(name, outcome):
+    key = _stats_key(name, outcome)
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 1, None)
+
+
+def get_cache_stats():
+    keys = [_stats_key(name, outcome) for name in RESPONSE_CACHE_VIEWS for outcome in ('hits', 'misses')]
+    values = cache.get_many(keys)
+    stats = {}
+    for name in RESPONSE_CACHE_VIEWS:
+        hits = values.get(_stats_key(name, 'hits'), 0)
+        misses = values.get(_stats_key(name, 'misses'), 0)
+        total = hits + misses
+        stats[name] = {'hits': hits, 'misses': misses, 'hit_rate': round(hits / total, 4) if total else None}
+    return stats
+
+
+def cached_response(request, name, tags, render):
+    if request.method != 'GET' or request.user.is_authenticated:
+        return render()
+
+    key = response_cache_key(name, tags, request)
+    entry = cache.get(key)
+    if entry is not None:
+        record(name, 'hits')
+        return Response(entry['data'], status=entry['status'])
+
+    record(name, 'misses')
+    response = render()
+    if response.status_code == 200:
+        cache.set(key, {'data': response.data, 'status': response.status_code}, RESPONSE_CACHE_TIMEOUT)
+    return response
+
+
+class CachedResponseMixin:
+    """Serves anonymous list/retrieve payloads from the response cache."""
+
+    def get_cache_tags(self):
+        # Views whose payload depends on other models must list their tags.
+        return [self.basename]
+
+    def list(self, request, *args, **kwargs):
+        return cached_response(
+            request, f"{self.basename}-list", self.get_cache_tags(),
+            lambda: super(CachedResponseMixin, self).list(request, *args, **kwargs),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return cached_response(
+            request, f"{self.basename}-detail", self.get_cache_tags(),
+            lambda: super(CachedResponseMixin, self).retrieve(request, *args, **kwargs),
+        )
+
+
+def make_etag(*parts, weak=False):
+    digest = hashlib.sha1(":".join(str(part) for part in parts).encode()).hexdigest()
+    return f'W/"{digest}"' if weak else f'"{digest}"'
+
+
+def etag_matches(request, etag):
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    # If-None-Match uses the weak comparison function (RFC 9110, 13.1.2).
+    candidates = {candidate.removeprefix('W/') for candidate in parse_etags(header)}
+    return '*' in candidates or etag.removeprefix('W/') in candidates
+
+
+def not_modified(etag):
+    return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+
+class ConditionalGetMixin:
+    """
+    Strong ETags on retrieve, checked before the object is loaded or
+    serialized, and weak ETags over the rendered page on list. A view whose
+    get_etag returns None gets plain retrieve responses.
+    """
+
+    def get_etag(self):
+        return None
+
+    def retrieve(self, request, *args, **kwargs):
+        etag = self.get_etag()
+        if etag is None:
+            return super().retrieve(request, *args, **kwargs)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        response = super().retrieve(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            response['ETag'] = etag
+        return response
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        etag = make_etag(JSONRenderer().render(response.data).decode(), weak=True)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        response['ETag'] = etag
+        return response
@@ -0,0 +1,85 @@
+import hashlib
+from django.core.cache import cache
+from django.db.models import Count, F, Min, Q
+from django.db.models.functions import Coalesce
+from store.cache import get_generations, normalized_query
+from store.models import Product, StoreItem
+
+
+FACETS_CACHE_TIMEOUT = 60
+# Parameters that change the page but not the filtered result set.
+FACETS_IGNORED_PARAMS = ('page', 'page_size', 'cursor', 'pagination', 'ordering', 'facets')
+RATING_BUCKETS = [(0, 1), (1, 2), (2, 3), (3, 4), (4, 5)]
+PRICE_BUCKETS = [(0, 100000), (100000, 500000), (500000, 1000000), (1000000, 5000000), (5000000, None)]
+
+
+def _bucket_filter(field, low, high, inclusive_high=False):
+    condition = Q(**{f"{field}__gte": low})
+    if high is not None:
+        condition &= Q(**{f"{field}__lte" if inclusive_high else f"{field}__lt": high})
+    return condition
+
+
+def compute_facets(queryset):
+    """
+    Facet counts for a filtered product queryset in three grouped queries:
+    ratings over the products, price and stock over their store items
+    grouped per product, and a GROUP BY over the category links.
+    """
+    queryset = queryset.order_by()
+    product_ids = queryset.values('pk')
+
+    rating_aggregates = {'total': Count('pk'), 'unrated': Count('pk', filter=Q(rating__isnull=True))}
+    for index, (low, high) in enumerate(RATING_BUCKETS):
+        rating_aggregates[f'rating_{index}'] = Count(
+            'pk', filter=_bucket_filter('rating', low, high, inclusive_high=high == RATING_BUCKETS[-1][1])
+        )
+    ratings = queryset.aggregate(**rating_aggregates)
+
+    per_product = (
+        StoreItem.objects.filter(product_id__in=product_ids, is_active=True)
+        .values('product_id')
+        .annotate(
+            best_price=Min(Coalesce('discount_price', 'price')),
+            in_stock_sellers=Count('pk', filter=Q(stock__gt=F('reserved'))),
+        )
+    )
+    stock_aggregates = {'in_stock': Count('product_id', filter=Q(in_stock_sellers__gt=0))}
+    for index, (low, high) in enumerate(PRICE_BUCKETS):
+        stock_aggregates[f'price_{index}'] = Count('product_id', filter=_bucket_filter('best_price', low, high))
+    prices = per_product.aggregate(**stock_aggregates)
+
+    categories = (
+        Product.categories.through.objects
+        .filter(product_id__in=product_ids, category__is_active=True)
+        .values('category_id', 'category__name')
+        .annotate(count=Count('product_id'))
+        .order_by('-count', 'category__name')
+    )
+
+    return {
+        'categories': [
+            {'id': row['category_id'], 'name': row['category__name'], 'count': row['count']}
+            for row in categories
+        ],
+        'rating': [
+            {'min': low, 'max': high, 'count': ratings[f'rating_{index}']}
+            for index, (low, high) in enumerate(RATING_BUCKETS)
+        ] + [{'min': None, 'max': None, 'count': ratings['unrated']}],
+        'price': [
+            {'min': low, 'max': high, 'count': prices[f'price_{index}']}
+            for index, (low, high) in enumerate(PRICE_BUCKETS)
+        ],
+        'in_stock': {'true': prices['in_stock'], 'false': ratings['total'] - prices['in_stock']},
+    }
+
+
+def get_facets(request, queryset):
+    generations = ":".join(str(generation) for generation in get_generations(['products', 'categories']))
+    query = normalized_query(request, exclude=FACETS_IGNORED_PARAMS)
+    key = "facets:" + hashlib.sha1(f"{generations}|{query}".encode()).hexdigest()
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(queryset)
+        cache.set(key, facets, FACETS_CACHE_TIMEOUT)
+    return facets
@@ -1,12 +1,34 @@
 import django_filters
-from store.models import Product
+from store.models import Category, Product
+from store.search import search_products
 
 class ProductFilter(django_filters.FilterSet):
     name = django_filters.CharFilter(lookup_expr='icontains')
+    q = django_filters.CharFilter(method='filter_search')
     is_active = django_filters.BooleanFilter()
     rating_min = django_filters.NumberFilter(field_name='rating', lookup_expr='gte')
     rating_max = django_filters.NumberFilter(field_name='rating', lookup_expr='lte')
+    min_price = django_filters.NumberFilter(field_name='best_price', lookup_expr='gte')
+    max_price = django_filters.NumberFilter(field_name='best_price', lookup_expr='lte')
+    in_stock = django_filters.BooleanFilter(method='filter_in_stock')
+    category = django_filters.ModelChoiceFilter(queryset=Category.objects.all(), method='filter_category')
+    ordering = django_filters.OrderingFilter(fields=(
+        ('best_price', 'best_price'),
+        ('popularity', 'popularity'),
+    ))
 
     class Meta:
         model = Product
         fields = ['name', 'is_active']
+
+    def filter_in_stock(self, queryset, name, value):
+        if value:
+            return queryset.filter(in_stock_sellers__gt=0)
+        return queryset.filter(in_stock_sellers=0)
+
+    def filter_category(self, queryset, name, value):
+        subtree = Product.categories.through.objects.filter(category__path__startswith=value.path)
+        return queryset.filter(pk__in=subtree.values('product_id'))
+
+    def filter_search(self, queryset, name, value):
+        return search_products(queryset, value)
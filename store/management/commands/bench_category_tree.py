@@ -0,0 +1,81 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from store.models import Category
+from store.utils import build_category_tree, get_category_tree, invalidate_category_tree
+
+
+def legacy_category_tree(categories):
+    # The pre-cache implementation: one children query per node.
+    return [
+        {
+            "id": category.id,
+            "name": category.name,
+            "children": legacy_category_tree(Category.objects.filter(parent=category, is_active=True)),
+        }
+        for category in categories
+    ]
+
+
+class Command(BaseCommand):
+    help = "Benchmark the category tree build on a generated catalogue. All rows are rolled back."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--nodes", type=int, default=5000)
+        parser.add_argument("--fanout", type=int, default=10)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.create_tree(options["nodes"], options["fanout"])
+            invalidate_category_tree()
+
+            def cold_cache():
+                invalidate_category_tree()
+                return get_category_tree()
+
+            runs = [
+                ("legacy, query per node", lambda: legacy_category_tree(
+                    Category.objects.filter(parent=None, is_active=True))),
+                ("single query build", build_category_tree),
+                ("cached, cold", cold_cache),
+                ("cached, warm", get_category_tree),
+            ]
+            for label, func in runs:
+                self.measure(label, func, options["repeat"])
+
+            transaction.set_rollback(True)
+        invalidate_category_tree()
+
+    def create_tree(self, total, fanout):
+        level = Category.objects.bulk_create(
+            Category(name=f"Root {i}", image="") for i in range(min(fanout, total))
+        )
+        created = len(level)
+        while created < total:
+            children = []
+            for parent in level:
+                for i in range(fanout):
+                    if created + len(children) >= total:
+                        break
+                    children.append(Category(name=f"{parent.name}.{i}", image="", parent=parent))
+            level = Category.objects.bulk_create(children)
+            created += len(level)
+        self.stdout.write(f"Generated {created} categories (fanout {fanout})")
+
+    def measure(self, label, func, repeat):
+        timings = []
+        queries = []
+
+        def count_query(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        for _ in range(repeat):
+            queries.clear()
+            with connection.execute_wrapper(count_query):
+                start = time.perf_counter()
+                func()
+                timings.append(time.perf_counter() - start)
+        best = min(timings) * 1000
+        self.stdout.write(f"{label:<26} queries={len(queries):<6} best={best:.2f}ms")
@@ -0,0 +1,77 @@
+import random
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from store.facets import PRICE_BUCKETS, RATING_BUCKETS, compute_facets
+from store.models import Category, Product, Store, StoreItem
+from store.views import ProductViewSet
+
+
+def per_facet_counts(queryset, categories):
+    # What the storefront did before: one filtered listing (count) per facet value.
+    counts = [queryset.filter(categories=category).count() for category in categories]
+    counts += [queryset.filter(rating__gte=low, rating__lt=high).count() for low, high in RATING_BUCKETS]
+    counts += [queryset.filter(best_price__gte=low, **({"best_price__lt": high} if high else {})).count()
+               for low, high in PRICE_BUCKETS]
+    counts += [queryset.filter(in_stock_sellers__gt=0).count(), queryset.filter(in_stock_sellers=0).count()]
+    return counts
+
+
+class Command(BaseCommand):
+    help = "Benchmark product facet counts on a generated catalogue. All rows are rolled back."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=100_000)
+        parser.add_argument("--categories", type=int, default=50)
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.populate(options["products"], options["categories"], options["batch_size"])
+            queryset = ProductViewSet().get_queryset()
+            categories = list(Category.objects.all())
+
+            self.measure("per-facet listing calls", lambda: per_facet_counts(queryset, categories))
+            self.measure("grouped facet queries", lambda: compute_facets(queryset))
+            self.measure("grouped, filtered", lambda: compute_facets(queryset.filter(best_price__lt=500000)))
+
+            transaction.set_rollback(True)
+
+    def populate(self, total, category_count, batch_size):
+        rng = random.Random(42)
+        seller = get_user_model().objects.create(username="facet-bench-seller", is_seller=True)
+        store = Store.objects.create(name="Facet bench", seller=seller)
+        categories = Category.objects.bulk_create(Category(name=f"Bench {i}", image="") for i in range(category_count))
+        links = Product.categories.through
+
+        for start in range(0, total, batch_size):
+            products = Product.objects.bulk_create(
+                Product(
+                    name=f"Bench product {i}",
+                    description="Generated for the facet benchmark",
+                    rating=rng.choice([None, 1.5, 2.0, 3.5, 4.0, 4.5, 5.0]),
+                )
+                for i in range(start, min(start + batch_size, total))
+            )
+            StoreItem.objects.bulk_create(
+                StoreItem(product=product, store=store, price=rng.randint(10_000, 9_000_000), stock=rng.randint(0, 3))
+                for product in products
+            )
+            links.objects.bulk_create(
+                links(product_id=product.pk, category_id=rng.choice(categories).pk) for product in products
+            )
+        self.stdout.write(f"Generated {total} products in {category_count} categories")
+
+    def measure(self, label, func):
+        queries = []
+
+        def count_query(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_query):
+            start = time.perf_counter()
+            func()
+            elapsed = (time.perf_counter() - start) * 1000
+        self.stdout.write(f"{label:<26} queries={len(queries):<5} time={elapsed:.1f}ms")
@@ -0,0 +1,42 @@
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from store.models import Product, Review, Store
+
+STAT_FIELDS = ["review_count", "rating_sum"] + [f"rating_{star}_count" for star in range(1, 6)]
+
+
+class Command(BaseCommand):
+    help = "Recompute review counters and Product.rating from Review rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            products = self.rebuild(Product, "product", options["batch_size"])
+            stores = self.rebuild(Store, "store", options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt review stats for {products} products and {stores} stores."))
+
+    def rebuild(self, model, field, batch_size):
+        rows = Review.objects.filter(**{f"{field}__isnull": False}).values(field).annotate(
+            review_count=Count("id"),
+            rating_sum=Sum("rating"),
+            **{f"rating_{star}_count": Count("id", filter=Q(rating=star)) for star in range(1, 6)},
+        )
+        stats = {row.pop(field): row for row in rows}
+        reset = dict.fromkeys(STAT_FIELDS, 0)
+        fields = list(STAT_FIELDS)
+        if model is Product:
+            reset["rating"] = None
+            fields.append("rating")
+
+        model.objects.exclude(pk__in=stats.keys()).update(**reset)
+        objs = list(model.objects.filter(pk__in=stats.keys()).only("id"))
+        for obj in objs:
+            for name, value in stats[obj.pk].items():
+                setattr(obj, name, value)
+            obj.rating = round(Decimal(obj.rating_sum) / obj.review_count, 1)
+        model.objects.bulk_update(objs, fields, batch_size=batch_size)
+        return len(objs)
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+from order.models import OrderItem
+from store.models import StoreItem
+
+
+class Command(BaseCommand):
+    help = "Recompute StoreItem.units_sold and order_count from OrderItem history."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        totals = {
+            row["store_item"]: row
+            for row in OrderItem.objects.values("store_item").annotate(
+                units=Sum("quantity"), orders=Count("order", distinct=True)
+            )
+        }
+
+        with transaction.atomic():
+            StoreItem.objects.exclude(pk__in=totals.keys()).update(units_sold=0, order_count=0)
+            items = list(StoreItem.objects.filter(pk__in=totals.keys()).only("id"))
+            for item in items:
+                item.units_sold = totals[item.pk]["units"]
+                item.order_count = totals[item.pk]["orders"]
+            StoreItem.objects.bulk_update(items, ["units_sold", "order_count"], batch_size=options["batch_size"])
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt sales counters for {len(items)} store items."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from store.models import Product
+from store.search import update_search_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product full-text search documents."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        ids = list(Product.objects.order_by("pk").values_list("pk", flat=True))
+        for start in range(0, len(ids), batch_size):
+            update_search_index(ids[start:start + batch_size])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {len(ids)} products."))
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:09
+
+from django.db import migrations, models
+
+
+def populate_category_paths(apps, schema_editor):
+    Category = apps.get_model('store', 'Category')
+    parents = dict(Category.objects.values_list('id', 'parent_id'))
+    paths = {}
+
+    for pk in parents:
+        chain = []
+        node = pk
+        while node is not None and node not in paths and node not in chain:
+            chain.append(node)
+            node = parents.get(node)
+        prefix = paths.get(node, "/")
+        for node in reversed(chain):
+            prefix = f"{prefix}{node}/"
+            paths[node] = prefix
+
+    categories = list(Category.objects.only('id'))
+    for category in categories:
+        category.path = paths[category.id]
+        category.depth = category.path.count("/") - 2
+    Category.objects.bulk_update(categories, ['path', 'depth'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0002_remove_order_address_remove_cart_user_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(populate_category_paths, migrations.RunPython.noop),
+    ]
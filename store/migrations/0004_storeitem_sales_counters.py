@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0003_category_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storeitem',
+            name='order_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='storeitem',
+            name='units_sold',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='storeitem',
+            index=models.Index(fields=['product', '-order_count'], name='storeitem_product_orders_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:11
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+CATEGORY_NAMES_SQL = (
+    "SELECT {agg} FROM store_category c "
+    "JOIN store_product_categories pc ON pc.category_id = c.id "
+    "WHERE pc.product_id = p.id"
+)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE INDEX store_product_search_vector_gin ON store_product USING gin (search_vector)"
+        )
+        category_names = CATEGORY_NAMES_SQL.format(agg="string_agg(c.name, ' ')")
+        schema_editor.execute(
+            "UPDATE store_product p SET search_vector = "
+            "setweight(to_tsvector('simple', coalesce(p.name, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(p.description, '')), 'B') || "
+            f"setweight(to_tsvector('simple', coalesce(({category_names}), '')), 'C')"
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE store_product_fts USING fts5("
+            "name, description, categories, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        category_names = CATEGORY_NAMES_SQL.format(agg="group_concat(c.name, ' ')")
+        schema_editor.execute(
+            "INSERT INTO store_product_fts(rowid, name, description, categories) "
+            f"SELECT p.id, p.name, p.description, coalesce(({category_names}), '') FROM store_product p"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS store_product_search_vector_gin")
+    elif vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS store_product_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0004_storeitem_sales_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
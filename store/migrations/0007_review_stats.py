@@ -0,0 +1,124 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:23
+
+import django.core.validators
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+STAT_FIELDS = ['review_count', 'rating_sum'] + [f"rating_{star}_count" for star in range(1, 6)]
+
+
+def populate_review_stats(apps, schema_editor):
+    Review = apps.get_model('store', 'Review')
+    for model_name, field in (('Product', 'product'), ('Store', 'store')):
+        Model = apps.get_model('store', model_name)
+        rows = Review.objects.filter(**{f"{field}__isnull": False}).values(field).annotate(
+            review_count=Count('id'),
+            rating_sum=Sum('rating'),
+            **{f"rating_{star}_count": Count('id', filter=Q(rating=star)) for star in range(1, 6)},
+        )
+        stats = {row.pop(field): row for row in rows}
+        fields = STAT_FIELDS + (['rating'] if model_name == 'Product' else [])
+
+        objs = list(Model.objects.filter(pk__in=stats.keys()).only('id'))
+        for obj in objs:
+            for name, value in stats[obj.pk].items():
+                setattr(obj, name, value)
+            obj.rating = round(Decimal(obj.rating_sum) / obj.review_count, 1)
+        Model.objects.bulk_update(objs, fields, batch_size=500)
+
+        if model_name == 'Product':
+            Model.objects.exclude(pk__in=stats.keys()).update(rating=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0006_review_review_product_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_1_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_2_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_3_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_4_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_5_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='store',
+            name='rating_1_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='store',
+            name='rating_2_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='store',
+            name='rating_3_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='store',
+            name='rating_4_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='store',
+            name='rating_5_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='store',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='store',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='rating',
+            field=models.DecimalField(blank=True, db_index=True, decimal_places=1, editable=False, max_digits=3, null=True),
+        ),
+        migrations.AlterField(
+            model_name='review',
+            name='rating',
+            field=models.PositiveSmallIntegerField(validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(5)]),
+        ),
+        migrations.RunPython(populate_review_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0007_review_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storeitem',
+            name='flash_sale',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_storeitem_flash_sale'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storeitem',
+            name='reserved',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
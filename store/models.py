@@ -1,5 +1,10 @@
 from django.db import models
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
+from django.core.exceptions import ValidationError
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Cast, Concat, NullIf, Substr
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
@@ -7,18 +12,116 @@ class Category(models.Model):
     image = models.ImageField(upload_to='categories/')
     is_active = models.BooleanField(default=True)
     parent = models.ForeignKey('self', null=True, blank=True, on_delete=models.SET_NULL)
+    # Materialized ancestry, e.g. "/1/5/12/" for category 12 under 5 under 1.
+    path = models.CharField(max_length=255, db_index=True, editable=False, default='')
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+
+    def save(self, *args, **kwargs):
+        parent_path = "/"
+        if self.parent_id:
+            parent_path = Category.objects.values_list('path', flat=True).get(pk=self.parent_id)
+            if self.pk and f"/{self.pk}/" in parent_path:
+                raise ValidationError("A category cannot be moved under itself or one of its descendants.")
+
+        old_path = ""
+        if self.pk:
+            old_path = Category.objects.filter(pk=self.pk).values_list('path', flat=True).first() or ""
+        # Keep the stored path during the regular save; it is rewritten below.
+        self.path, self.depth = old_path, max(old_path.count("/") - 2, 0)
+        super().save(*args, **kwargs)
+
+        new_path = f"{parent_path}{self.pk}/"
+        if new_path != old_path:
+            if old_path:
+                Category.move_subtree(old_path, new_path)
+            else:
+                Category.objects.filter(pk=self.pk).update(path=new_path, depth=new_path.count("/") - 2)
+        self.path, self.depth = new_path, new_path.count("/") - 2
+
+    @staticmethod
+    def move_subtree(old_path, new_path):
+        Category.objects.filter(path__startswith=old_path).update(
+            path=Concat(Value(new_path), Substr('path', len(old_path) + 1)),
+            depth=F('depth') + (new_path.count("/") - old_path.count("/")),
+        )
+
+    @property
+    def ancestor_ids(self):
+        return [int(pk) for pk in self.path.strip("/").split("/") if pk]
+
+    def get_ancestors(self, include_self=True):
+        ancestors = Category.objects.filter(pk__in=self.ancestor_ids).order_by('depth')
+        if not include_self:
+            ancestors = ancestors.exclude(pk=self.pk)
+        return ancestors
+
+    def get_descendants(self, include_self=True):
+        descendants = Category.objects.filter(path__startswith=self.path)
+        if not include_self:
+            descendants = descendants.exclude(pk=self.pk)
+        return descendants
 
     def __str__(self):
         parent_name = self.parent.name if self.parent else "None"
         return f"Category: {self.name}, Parent: {parent_name}"
 
 
-class Product(models.Model):
+class ReviewStats(models.Model):
+    """Review counters kept up to date by the Review signals in store.signals."""
+    review_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_1_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_2_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_3_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_4_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_5_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def average_rating(self):
+        if not self.review_count:
+            return None
+        return round(self.rating_sum / self.review_count, 1)
+
+    @property
+    def rating_histogram(self):
+        return {star: getattr(self, f"rating_{star}_count") for star in range(1, 6)}
+
+    @classmethod
+    def review_delta(cls, rating, sign):
+        star = f"rating_{min(max(rating, 1), 5)}_count"
+        return {
+            'review_count': F('review_count') + sign,
+            'rating_sum': F('rating_sum') + sign * rating,
+            star: F(star) + sign,
+        }
+
+    @classmethod
+    def apply_review(cls, pk, rating, sign=1):
+        cls.objects.filter(pk=pk).update(**cls.review_delta(rating, sign))
+
+
+class Product(ReviewStats):
     name = models.CharField(max_length=255)
     description = models.TextField()
-    rating = models.DecimalField(max_digits=3, decimal_places=1, null=True, blank=True)
+    # Average of review ratings, maintained with the ReviewStats counters.
+    rating = models.DecimalField(max_digits=3, decimal_places=1, null=True, blank=True, editable=False, db_index=True)
     is_active = models.BooleanField(default=True)
     categories = models.ManyToManyField(Category, related_name='products')
+    # Maintained by store.search; the GIN index is created in migration 0005.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    @classmethod
+    def review_delta(cls, rating, sign):
+        delta = super().review_delta(rating, sign)
+        # SET expressions see the pre-update row, so apply the delta here too.
+        delta['rating'] = Cast(
+            Cast(F('rating_sum') + sign * rating, FloatField()) / NullIf(F('review_count') + sign, 0),
+            models.DecimalField(max_digits=3, decimal_places=1),
+        )
+        return delta
 
     def __str__(self):
         return f"Product: {self.name}, Rating: {self.rating}, Active: {self.is_active}, Categories: {[c.name for c in self.categories.all()]}"
@@ -32,7 +135,7 @@ class ProductImage(models.Model):
         return f"ProductImage for {self.product.name}, URL: {self.image.url}"
 
 
-class Store(models.Model):
+class Store(ReviewStats):
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True)
     seller = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='stores')
@@ -48,9 +151,25 @@ class StoreItem(models.Model):
     discount_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     stock = models.PositiveIntegerField()
     is_active = models.BooleanField(default=True)
+    # Stock is reserved in Redis and reconciled here by order.flash_sale.
+    flash_sale = models.BooleanField(default=False)
+    # Quantity held by carts (order.reservations); available_stock excludes it.
+    reserved = models.PositiveIntegerField(default=0, editable=False)
+    # Sales counters, bumped at checkout and rebuilt by rebuild_sales_counters.
+    units_sold = models.PositiveIntegerField(default=0, editable=False)
+    order_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', '-order_count'], name='storeitem_product_orders_idx'),
+        ]
+
+    @property
+    def available_stock(self):
+        return max(self.stock - self.reserved, 0)
+
     def __str__(self):
         return (
             f"{self.product.name} at {self.store.name}, Price: {self.price}, "
@@ -63,10 +182,15 @@ class Review(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     product = models.ForeignKey('Product', on_delete=models.CASCADE, null=True, blank=True)
     store = models.ForeignKey('Store', on_delete=models.CASCADE, null=True, blank=True)
-    rating = models.PositiveSmallIntegerField()
+    rating = models.PositiveSmallIntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)])
     comment = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', '-created_at', '-id'], name='review_product_created_idx'),
+        ]
+
     def __str__(self):
         target = self.product.name if self.product else self.store.name
         return f"Review by {self.user.username} on {target} — Rating: {self.rating}"
@@ -0,0 +1,14 @@
+from core.pagination import OptInCursorPagination
+
+
+class ProductPagination(OptInCursorPagination):
+    cursor_ordering = ('id',)
+    # ProductFilter orders by these; a cursor can only seek on id.
+    cursor_incompatible_params = ('ordering', 'q')
+
+
+class ReviewPagination(OptInCursorPagination):
+    page_size = 5
+    page_size_query_param = 'page_size'
+    max_page_size = 50
+    cursor_ordering = ('-created_at', '-id')
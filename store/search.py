@@ -0,0 +1,91 @@
+import re
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connections
+from django.db.models import F, Value
+from django.db.models.expressions import RawSQL
+from store.models import Product
+
+
+# Product search runs on a tsvector column with a GIN index on PostgreSQL and on
+# an FTS5 virtual table on SQLite, so tests and local benchmarks need no Postgres.
+SEARCH_CONFIG = "simple"
+FTS_TABLE = "store_product_fts"
+MAX_TERMS = 8
+TERM_RE = re.compile(r"\w+")
+
+
+def search_terms(query):
+    return TERM_RE.findall(query.lower())[:MAX_TERMS]
+
+
+def is_postgres(using="default"):
+    return connections[using].vendor == "postgresql"
+
+
+def search_products(queryset, query):
+    terms = search_terms(query)
+    if not terms:
+        return queryset.none()
+    if is_postgres(queryset.db):
+        return _postgres_search(queryset, terms)
+    return _sqlite_search(queryset, terms)
+
+
+def _postgres_search(queryset, terms):
+    # Every term must match; ":*" turns each one into a prefix match.
+    query = SearchQuery(" & ".join(f"{term}:*" for term in terms), search_type="raw", config=SEARCH_CONFIG)
+    return (
+        queryset.filter(search_vector=query)
+        .annotate(search_rank=SearchRank(F("search_vector"), query))
+        .order_by("-search_rank", "id")
+    )
+
+
+def _sqlite_search(queryset, terms):
+    match = " ".join(f'"{term}"*' for term in terms)
+    table = queryset.model._meta.db_table
+    matches = RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", (match,))
+    # bm25() is lower-is-better; weights mirror the A/B/C weights used on Postgres.
+    rank = RawSQL(
+        f"SELECT -bm25({FTS_TABLE}, 10.0, 5.0, 2.0) FROM {FTS_TABLE} "
+        f"WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id",
+        (match,),
+    )
+    return queryset.filter(pk__in=matches).annotate(search_rank=rank).order_by("-search_rank", "id")
+
+
+def update_search_index(product_ids):
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
+    products = Product.objects.filter(pk__in=product_ids).prefetch_related("categories")
+    if is_postgres():
+        for product in products:
+            category_names = " ".join(category.name for category in product.categories.all())
+            Product.objects.filter(pk=product.pk).update(
+                search_vector=(
+                    SearchVector("name", weight="A", config=SEARCH_CONFIG)
+                    + SearchVector("description", weight="B", config=SEARCH_CONFIG)
+                    + SearchVector(Value(category_names), weight="C", config=SEARCH_CONFIG)
+                )
+            )
+        return
+
+    rows = [
+        (product.pk, product.name, product.description,
+         " ".join(category.name for category in product.categories.all()))
+        for product in products
+    ]
+    remove_from_search_index(product_ids)
+    with connections["default"].cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE}(rowid, name, description, categories) VALUES (%s, %s, %s, %s)", rows
+        )
+
+
+def remove_from_search_index(product_ids):
+    # On Postgres the document lives on the product row and goes with it.
+    if is_postgres():
+        return
+    with connections["default"].cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(pk,) for pk in product_ids])
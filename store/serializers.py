@@ -1,5 +1,5 @@
+from django.db.models import F
 from rest_framework import serializers
-from django.db.models import Min, Count
 from store.models import Category, Product, ProductImage, Store, StoreItem, Review
 from django.contrib.auth import get_user_model
 
@@ -10,6 +10,11 @@ class CategorySerializer(serializers.ModelSerializer):
         model = Category
         fields = '__all__'
 
+    def validate_parent(self, parent):
+        if parent and self.instance and f"/{self.instance.pk}/" in parent.path:
+            raise serializers.ValidationError("A category cannot be moved under itself or one of its descendants.")
+        return parent
+
 
 class ProductImageSerializer(serializers.ModelSerializer):
     class Meta:
@@ -18,15 +23,20 @@ class ProductImageSerializer(serializers.ModelSerializer):
 
 
 class StoreSerializer(serializers.ModelSerializer):
+    average_rating = serializers.FloatField(read_only=True)
+    rating_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
+
     class Meta:
         model = Store
-        fields = ['id', 'name', 'description']
+        fields = ['id', 'name', 'description', 'review_count', 'average_rating', 'rating_histogram']
 
 
 class StoreItemBasicSerializer(serializers.ModelSerializer):
+    available_stock = serializers.IntegerField(read_only=True)
+
     class Meta:
         model = StoreItem
-        fields = ['id', 'store', 'price', 'discount_price', 'stock', 'is_active']
+        fields = ['id', 'store', 'price', 'discount_price', 'stock', 'available_stock', 'is_active']
 
 
 
@@ -42,56 +52,42 @@ class ProductWriteSerializer(serializers.ModelSerializer):
 class ProductSerializer(serializers.ModelSerializer):
     images = ProductImageSerializer(many=True, read_only=True)
     categories = CategorySerializer(many=True, read_only=True)
-    best_price = serializers.SerializerMethodField()
+    best_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    in_stock_sellers = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Product
         fields = [
-            'id', 'name', 'description', 'rating',
-            'is_active', 'categories', 'images', 'best_price'
+            'id', 'name', 'description', 'rating', 'review_count',
+            'is_active', 'categories', 'images', 'best_price', 'in_stock_sellers'
         ]
 
-    def get_best_price(self, obj):
-        discount = obj.storeitem_set.filter(is_active=True).aggregate(Min('discount_price'))['discount_price__min']
-        if discount:
-            return discount
-        return obj.storeitem_set.filter(is_active=True).aggregate(Min('price'))['price__min']
-        
 
 class ProductDetailSerializer(ProductSerializer):
     sellers = serializers.SerializerMethodField()
     category_path = serializers.SerializerMethodField()
     best_seller = serializers.SerializerMethodField()
+    rating_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
 
     class Meta(ProductSerializer.Meta):
         fields = ProductSerializer.Meta.fields + [
-            'sellers', 'category_path', 'best_seller'
+            'sellers', 'category_path', 'best_seller', 'rating_histogram'
         ]
 
     def get_sellers(self, obj):
-        items = obj.storeitem_set.select_related("store").filter(is_active=True, stock__gt=0)
+        # Stock fully held by carts (order.reservations) is not available to buy.
+        items = obj.storeitem_set.select_related("store").filter(is_active=True, stock__gt=F("reserved"))
         return StoreItemBasicSerializer(items, many=True).data
 
     def get_category_path(self, obj):
-        categories = obj.categories.all()
-        def depth(cat):
-            count = 0
-            while cat.parent:
-                cat = cat.parent
-                count += 1
-            return count
-
-        deepest = max(categories, key=depth, default=None)
-        path = []
-        while deepest:
-            path.append({"id": deepest.id, "name": deepest.name})
-            deepest = deepest.parent
-        return path[::-1]
+        deepest = max(obj.categories.all(), key=lambda cat: cat.depth, default=None)
+        if deepest is None:
+            return []
+        return list(deepest.get_ancestors().values('id', 'name'))
 
 
     def get_best_seller(self, obj):
-        top_item = (
-            obj.storeitem_set.annotate(order_count=Count('orderitem')).filter(order_count__gt=0).order_by('-order_count').first())
+        top_item = obj.storeitem_set.filter(order_count__gt=0).order_by('-order_count', '-units_sold').first()
         if top_item:
             return StoreItemBasicSerializer(top_item).data
         return None
@@ -105,11 +101,13 @@ class StoreItemSerializer(serializers.ModelSerializer):
     store = serializers.PrimaryKeyRelatedField(
         queryset=Store.objects.all()
     )
+    available_stock = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = StoreItem
         fields = '__all__'
-        
+        read_only_fields = ['units_sold', 'order_count', 'reserved']
+
     def validate(self, data):
         price = data.get('price')
         discount_price = data.get('discount_price')
@@ -127,15 +125,3 @@ class ReviewSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'product', 'store', 'rating', 'comment', 'created_at']
         read_only_fields = ['id', 'created_at', 'user']
 
-
-
-class CategoryTreeSerializer(serializers.ModelSerializer):
-    children = serializers.SerializerMethodField()
-
-    class Meta:
-        model = Category
-        fields = ['id', 'name', 'children']
-
-    def get_children(self, obj):
-        children = Category.objects.filter(parent=obj, is_active=True)
-        return CategoryTreeSerializer(children, many=True).data
\ No newline at end of file
@@ -0,0 +1,146 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save, pre_delete, m2m_changed
+from django.dispatch import receiver
+from store.models import Category, Product, ProductImage, Store, StoreItem, Review
+from store.cache import invalidate, invalidate_products
+from store.search import update_search_index, remove_from_search_index
+from store.utils import invalidate_category_tree
+
+
+@receiver([post_save, post_delete], sender=Category)
+def category_changed(sender, instance, **kwargs):
+    # Drop the tree now and again after commit, so a rebuild that raced the
+    # open transaction cannot leave a stale tree behind.
+    invalidate_category_tree()
+    transaction.on_commit(invalidate_category_tree)
+    invalidate('categories')
+
+
+@receiver([post_save, post_delete], sender=Product)
+def product_changed(sender, instance, **kwargs):
+    invalidate_products([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=StoreItem)
+@receiver([post_save, post_delete], sender=ProductImage)
+@receiver([post_save, post_delete], sender=Review)
+def product_content_changed(sender, instance, **kwargs):
+    if instance.product_id:
+        invalidate_products([instance.product_id])
+
+
+@receiver([post_save, post_delete], sender=Store)
+def store_changed(sender, instance, **kwargs):
+    invalidate(f"store:{instance.pk}")
+
+
+@receiver([post_save, post_delete], sender=Review)
+def store_review_changed(sender, instance, **kwargs):
+    if instance.store_id:
+        invalidate(f"store:{instance.store_id}")
+
+
+@receiver(post_delete, sender=Category)
+def reroot_orphaned_children(sender, instance, **kwargs):
+    # SET_NULL has already detached the direct children; give their subtrees root paths.
+    if not instance.path:
+        return
+    orphans = Category.objects.filter(parent__isnull=True, path__startswith=instance.path).exclude(pk=instance.pk)
+    for child in orphans:
+        Category.move_subtree(child.path, f"/{child.pk}/")
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, **kwargs):
+    update_search_index([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    remove_from_search_index([instance.pk])
+
+
+@receiver(m2m_changed, sender=Product.categories.through)
+def product_categories_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear" and reverse:
+        instance._search_product_ids = list(instance.products.values_list('pk', flat=True))
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        product_ids = [instance.pk]
+    elif action == "post_clear":
+        product_ids = getattr(instance, "_search_product_ids", [])
+    else:
+        product_ids = pk_set
+    update_search_index(product_ids)
+    invalidate_products(product_ids)
+
+
+@receiver(pre_save, sender=Category)
+def category_renaming(sender, instance, **kwargs):
+    old_name = None
+    if instance.pk:
+        old_name = Category.objects.filter(pk=instance.pk).values_list('name', flat=True).first()
+    instance._search_renamed = old_name is not None and old_name != instance.name
+
+
+@receiver(post_save, sender=Category)
+def category_renamed(sender, instance, **kwargs):
+    if getattr(instance, "_search_renamed", False):
+        update_search_index(instance.products.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Category)
+def category_deleting(sender, instance, **kwargs):
+    instance._search_product_ids = list(instance.products.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    update_search_index(getattr(instance, "_search_product_ids", []))
+
+
+@receiver(pre_save, sender=Review)
+def remember_review_rating(sender, instance, raw=False, **kwargs):
+    instance._stats_previous = None
+    if instance.pk and not raw:
+        instance._stats_previous = (
+            Review.objects.filter(pk=instance.pk).values_list('product_id', 'store_id', 'rating').first()
+        )
+
+
+def apply_review_stats(product_id, store_id, rating, sign):
+    for model, target in zip((Product, Store), (product_id, store_id)):
+        if target:
+            model.apply_review(target, rating, sign)
+
+
+@receiver(post_save, sender=Review)
+def review_stats_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    current = (instance.product_id, instance.store_id, instance.rating)
+    previous = getattr(instance, '_stats_previous', None)
+    if previous == current:
+        return
+    if previous:
+        apply_review_stats(*previous, -1)
+    apply_review_stats(*current, 1)
+
+
+@receiver(post_save, sender=Review)
+def review_target_moved(sender, instance, raw=False, **kwargs):
+    # apply_review updates the old target with .update(), which fires no signal.
+    previous = getattr(instance, '_stats_previous', None)
+    if raw or not previous:
+        return
+    product_id, store_id, _ = previous
+    if product_id and product_id != instance.product_id:
+        invalidate_products([product_id])
+    if store_id and store_id != instance.store_id:
+        invalidate(f"store:{store_id}")
+
+
+@receiver(post_delete, sender=Review)
+def review_stats_deleted(sender, instance, **kwargs):
+    apply_review_stats(instance.product_id, instance.store_id, instance.rating, -1)
@@ -0,0 +1,173 @@
+"""Query budgets: no store endpoint may run more queries as its data grows.
+
+Every router-registered list and detail endpoint, and every admin
+changelist, is fetched after seeding N rows and again after 10N. See the
+assert_constant_queries fixture in the root conftest.
+"""
+from types import SimpleNamespace
+import pytest
+from django.contrib.admin.sites import site
+from django.contrib.auth import get_user_model
+from django.test import Client
+from django.urls import reverse
+from rest_framework.test import APIClient
+from store.models import Category, Product, ProductImage, Store, StoreItem, Review
+from store.urls import router
+
+User = get_user_model()
+
+
+@pytest.fixture
+def world(db):
+    seller = User.objects.create_user(username="budget-seller", password="pass", is_seller=True)
+    client = APIClient()
+    client.force_authenticate(user=seller)
+    root = Category.objects.create(name="Root", image="categories/root.jpg")
+    return SimpleNamespace(
+        seller=seller,
+        client=client,
+        root=root,
+        store=Store.objects.create(name="Budget Store", seller=seller),
+        product=add_product(root),
+        rows=0,
+    )
+
+
+@pytest.fixture
+def admin_client(db):
+    admin = User.objects.create_superuser(username="budget-admin", password="pass", is_seller=True)
+    client = Client()
+    client.force_login(admin)
+    return client
+
+
+def next_id(world):
+    world.rows += 1
+    return world.rows
+
+
+def add_category(parent, name="Category"):
+    return Category.objects.create(name=name, parent=parent, image="categories/c.jpg")
+
+
+def add_product(category, name="Product"):
+    product = Product.objects.create(name=name, description="Budget product")
+    product.categories.add(category)
+    return product
+
+
+def seed_categories(world, count):
+    return [add_category(world.root, f"Category {next_id(world)}") for _ in range(count)]
+
+
+def seed_products(world, count):
+    products = []
+    for _ in range(count):
+        i = next_id(world)
+        product = add_product(add_category(world.root, f"Category {i}"), f"Product {i}")
+        ProductImage.objects.create(product=product, image=f"product_images/{i}.jpg")
+        StoreItem.objects.create(product=product, store=world.store, price=1000 + i, stock=1)
+        products.append(product)
+    return products
+
+
+def seed_seller_categories(world, count):
+    return [product.categories.get() for product in seed_products(world, count)]
+
+
+def seed_product_images(world, count):
+    return [
+        ProductImage.objects.create(product=world.product, image=f"product_images/{next_id(world)}.jpg")
+        for _ in range(count)
+    ]
+
+
+def seed_stores(world, count):
+    return [Store.objects.create(name=f"Store {next_id(world)}", seller=world.seller) for _ in range(count)]
+
+
+def seed_store_items(world, count):
+    return [
+        StoreItem.objects.create(product=world.product, store=world.store, price=1000 + next_id(world), stock=1)
+        for _ in range(count)
+    ]
+
+
+def seed_reviews(world, count):
+    reviews = []
+    for _ in range(count):
+        i = next_id(world)
+        target = {"product": world.product} if i % 2 else {"store": world.store}
+        reviews.append(Review.objects.create(user=world.seller, rating=4, comment=f"Review {i}", **target))
+    return reviews
+
+
+def grow_product(world, product, count):
+    for _ in range(count):
+        i = next_id(world)
+        product.categories.add(add_category(world.root, f"Category {i}"))
+        ProductImage.objects.create(product=product, image=f"product_images/{i}.jpg")
+        StoreItem.objects.create(product=product, store=world.store, price=1000 + i, stock=1)
+        Review.objects.create(user=world.seller, product=product, rating=5, comment=f"Review {i}")
+
+
+# Router basename -> seed(world, count) returning the rows it created.
+SEEDS = {
+    "category": seed_categories,
+    "product": seed_products,
+    "productimage": seed_product_images,
+    "store": seed_stores,
+    "store-items": seed_store_items,
+    "review": seed_reviews,
+    "seller-stores": seed_stores,
+    "seller-products": seed_products,
+    "seller-categories": seed_seller_categories,
+}
+
+# Detail endpoints that nest a collection grow that collection instead.
+GROW = {
+    "product": grow_product,
+}
+
+ADMIN_SEEDS = {
+    Category: seed_categories,
+    Product: seed_products,
+    ProductImage: seed_product_images,
+    Store: seed_stores,
+    StoreItem: seed_store_items,
+    Review: seed_reviews,
+}
+
+
+def test_every_endpoint_has_a_budget():
+    assert {basename for _, _, basename in router.registry} == set(SEEDS)
+    assert {model for model in site._registry if model._meta.app_label == "store"} == set(ADMIN_SEEDS)
+
+
+@pytest.mark.parametrize("basename", sorted(SEEDS))
+def test_list_query_budget(basename, world, assert_constant_queries):
+    url = reverse(f"{basename}-list")
+    before = world.client.get(url).data["count"]
+    response = assert_constant_queries(lambda count: SEEDS[basename](world, count), lambda: world.client.get(url))
+    assert response.data["count"] == before + 10
+
+
+@pytest.mark.parametrize("basename", sorted(SEEDS))
+def test_detail_query_budget(basename, world, assert_constant_queries):
+    instance = SEEDS[basename](world, 1)[0]
+    grow = GROW.get(basename)
+
+    def seed(count):
+        if grow:
+            grow(world, instance, count)
+        else:
+            SEEDS[basename](world, count)
+
+    url = reverse(f"{basename}-detail", args=[instance.pk])
+    assert_constant_queries(seed, lambda: world.client.get(url))
+
+
+@pytest.mark.parametrize("model", sorted(ADMIN_SEEDS, key=lambda model: model.__name__))
+def test_admin_changelist_query_budget(model, world, admin_client, assert_constant_queries):
+    url = reverse(f"admin:store_{model._meta.model_name}_changelist")
+    assert_constant_queries(lambda count: ADMIN_SEEDS[model](world, count), lambda: admin_client.get(url))
@@ -181,3 +181,403 @@ def test_seller_category_create(api_client):
     }, format="multipart")
     assert response.status_code == 201
     assert response.data["name"] == "Accessories"
+
+
+def create_products(count, store):
+    for i in range(count):
+        product = Product.objects.create(name=f"Product {i}", description="Bulk product", is_active=True)
+        StoreItem.objects.create(product=product, store=store, price=1000 + i, stock=i % 2)
+
+
+@pytest.mark.django_db
+def test_product_list_best_price(api_client, store, product):
+    StoreItem.objects.create(product=product, store=store, price=20000, discount_price=15000, stock=0)
+    StoreItem.objects.create(product=product, store=store, price=18000, stock=3)
+    StoreItem.objects.create(product=product, store=store, price=100, stock=3, is_active=False)
+    response = api_client.get("/api/products/")
+    assert response.status_code == 200
+    data = response.data["results"][0]
+    assert data["best_price"] == "15000.00"
+    assert data["in_stock_sellers"] == 1
+
+@pytest.mark.django_db
+def test_product_list_price_filters_and_ordering(api_client, store):
+    create_products(4, store)
+    response = api_client.get("/api/products/", {"min_price": 1001, "max_price": 1002})
+    assert [p["name"] for p in response.data["results"]] == ["Product 1", "Product 2"]
+
+    response = api_client.get("/api/products/", {"in_stock": "true"})
+    assert {p["name"] for p in response.data["results"]} == {"Product 1", "Product 3"}
+
+    response = api_client.get("/api/products/", {"ordering": "-best_price"})
+    assert [p["best_price"] for p in response.data["results"]] == ["1003.00", "1002.00", "1001.00", "1000.00"]
+
+@pytest.mark.django_db
+def test_product_list_query_count_is_constant(api_client, store):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    create_products(1, store)
+    with CaptureQueriesContext(connection) as small_page:
+        api_client.get("/api/products/")
+
+    create_products(9, store)
+    with CaptureQueriesContext(connection) as full_page:
+        response = api_client.get("/api/products/")
+
+    assert len(response.data["results"]) == 10
+    assert len(full_page.captured_queries) == len(small_page.captured_queries)
+
+
+@pytest.mark.django_db
+def test_category_tree_nesting_and_cache(api_client, category):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    child = Category.objects.create(name="Phones", image="", parent=category)
+    android = Category.objects.create(name="Android", image="", parent=child)
+    Category.objects.create(name="Hidden", image="", parent=child, is_active=False)
+
+    with CaptureQueriesContext(connection) as cold:
+        response = api_client.get("/api/category-tree/")
+    assert len(cold.captured_queries) == 1
+    assert response.data == [{
+        "id": category.id,
+        "name": "Electronics",
+        "children": [{
+            "id": child.id,
+            "name": "Phones",
+            "children": [{"id": android.id, "name": "Android", "children": []}],
+        }],
+    }]
+
+    with CaptureQueriesContext(connection) as warm:
+        api_client.get("/api/category-tree/")
+    assert len(warm.captured_queries) == 0
+
+    child.name = "Mobiles"
+    child.save()
+    response = api_client.get("/api/category-tree/")
+    assert response.data[0]["children"][0]["name"] == "Mobiles"
+
+
+@pytest.mark.django_db
+def test_category_paths_follow_reparenting(category):
+    phones = Category.objects.create(name="Phones", image="", parent=category)
+    android = Category.objects.create(name="Android", image="", parent=phones)
+    assert android.path == f"/{category.id}/{phones.id}/{android.id}/"
+    assert android.depth == 2
+
+    gadgets = Category.objects.create(name="Gadgets", image="")
+    phones.parent = gadgets
+    phones.save()
+    android.refresh_from_db()
+    assert android.path == f"/{gadgets.id}/{phones.id}/{android.id}/"
+    assert list(gadgets.get_descendants().values_list('name', flat=True).order_by('depth')) == ["Gadgets", "Phones", "Android"]
+
+    phones.delete()
+    android.refresh_from_db()
+    assert android.parent is None
+    assert android.path == f"/{android.id}/"
+    assert android.depth == 0
+
+@pytest.mark.django_db
+def test_category_cannot_move_under_descendant(api_client, category):
+    child = Category.objects.create(name="Phones", image="", parent=category)
+    response = api_client.patch(f"/api/categories/{category.id}/", {"parent": child.id}, format="json")
+    assert response.status_code == 400
+
+@pytest.mark.django_db
+def test_product_category_path_and_breadcrumb(api_client, category, product):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    phones = Category.objects.create(name="Phones", image="", parent=category)
+    android = Category.objects.create(name="Android", image="", parent=phones)
+    product.categories.add(android)
+
+    with CaptureQueriesContext(connection) as queries:
+        response = api_client.get(f"/api/products/{product.id}/")
+    assert response.data["category_path"] == [
+        {"id": category.id, "name": "Electronics"},
+        {"id": phones.id, "name": "Phones"},
+        {"id": android.id, "name": "Android"},
+    ]
+    assert sum("store_category" in q["sql"] for q in queries.captured_queries) == 2
+
+    response = api_client.get(f"/api/categories/{android.id}/breadcrumb/")
+    assert [c["name"] for c in response.data] == ["Electronics", "Phones", "Android"]
+
+@pytest.mark.django_db
+def test_product_filter_by_category_subtree(api_client, category):
+    phones = Category.objects.create(name="Phones", image="", parent=category)
+    other = Category.objects.create(name="Books", image="")
+    in_root = Product.objects.create(name="Charger", description="USB")
+    in_root.categories.add(category)
+    in_child = Product.objects.create(name="Pixel", description="Android phone")
+    in_child.categories.add(phones, category)
+    Product.objects.create(name="Novel", description="Paper").categories.add(other)
+
+    response = api_client.get("/api/products/", {"category": category.id})
+    assert [p["name"] for p in response.data["results"]] == ["Charger", "Pixel"]
+    response = api_client.get("/api/products/", {"category": phones.id})
+    assert [p["name"] for p in response.data["results"]] == ["Pixel"]
+
+
+@pytest.mark.django_db
+def test_product_search_ranks_name_matches_first(api_client, category):
+    case = Product.objects.create(name="Leather case", description="Fits every phone")
+    phone = Product.objects.create(name="Phone X", description="Flagship")
+    Product.objects.create(name="Desk lamp", description="Warm light")
+
+    response = api_client.get("/api/products/", {"q": "pho"})
+    assert [p["id"] for p in response.data["results"]] == [phone.id, case.id]
+
+    response = api_client.get("/api/products/", {"q": "phone fits"})
+    assert [p["id"] for p in response.data["results"]] == [case.id]
+
+@pytest.mark.django_db
+def test_product_search_follows_category_changes(api_client, category):
+    product = Product.objects.create(name="Pixel", description="Android")
+    assert api_client.get("/api/products/", {"q": "electronics"}).data["results"] == []
+
+    product.categories.add(category)
+    response = api_client.get("/api/products/", {"q": "electronics"})
+    assert [p["id"] for p in response.data["results"]] == [product.id]
+
+    category.name = "Gadgets"
+    category.save()
+    assert api_client.get("/api/products/", {"q": "electronics"}).data["results"] == []
+    assert len(api_client.get("/api/products/", {"q": "gadg"}).data["results"]) == 1
+
+    product.delete()
+    assert api_client.get("/api/products/", {"q": "pixel"}).data["results"] == []
+
+
+@pytest.mark.django_db
+def test_product_list_cursor_pagination(api_client, store):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    create_products(12, store)
+    with CaptureQueriesContext(connection) as queries:
+        response = api_client.get("/api/products/", {"pagination": "cursor"})
+    assert "count" not in response.data
+    assert not any("COUNT(*)" in q["sql"] for q in queries.captured_queries)
+
+    names = [p["name"] for p in response.data["results"]]
+    response = api_client.get(response.data["next"])
+    names += [p["name"] for p in response.data["results"]]
+    assert names == [f"Product {i}" for i in range(12)]
+    assert response.data["next"] is None
+
+@pytest.mark.django_db
+def test_product_cursor_pagination_refuses_custom_order(api_client, store):
+    create_products(3, store)
+    for params in ({"ordering": "best_price"}, {"ordering": "-popularity"}, {"q": "Product"}):
+        response = api_client.get("/api/products/", {"pagination": "cursor", **params})
+        assert response.status_code == 400
+        assert set(response.data) == set(params)
+        assert api_client.get("/api/products/", params).status_code == 200
+
+@pytest.mark.django_db
+def test_review_list_page_size_is_capped(api_client, test_user, product):
+    Review.objects.bulk_create(
+        Review(user=test_user, product=product, rating=4, comment=f"Review {i}") for i in range(60)
+    )
+    response = api_client.get(f"/api/products/{product.id}/review_list/")
+    assert len(response.data["results"]) == 5
+    response = api_client.get(f"/api/products/{product.id}/review_list/", {"page_size": 1000})
+    assert len(response.data["results"]) == 50
+    response = api_client.get(f"/api/products/{product.id}/review_list/", {"pagination": "cursor", "page_size": 20})
+    assert len(response.data["results"]) == 20
+    assert response.data["next"]
+
+
+@pytest.mark.django_db
+def test_anonymous_product_reads_are_cached_and_invalidated(store, product):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from store.cache import get_cache_stats
+
+    anonymous = APIClient()
+    other = Product.objects.create(name="Tablet", description="Big screen")
+    anonymous.get(f"/api/products/{product.id}/")
+    anonymous.get(f"/api/products/{other.id}/")
+    anonymous.get("/api/products/")
+
+    with CaptureQueriesContext(connection) as queries:
+        response = anonymous.get(f"/api/products/{product.id}/")
+        anonymous.get("/api/products/")
+    assert response.data["name"] == "Phone"
+    # Only the ETag lookup runs; the payload comes from the cache.
+    assert len(queries.captured_queries) == 1
+
+    StoreItem.objects.create(product=product, store=store, price=5000, stock=1)
+    response = anonymous.get(f"/api/products/{product.id}/")
+    anonymous.get(f"/api/products/{other.id}/")
+    assert response.data["best_price"] == "5000.00"
+
+    stats = get_cache_stats()
+    assert stats["product-detail"] == {"hits": 2, "misses": 3, "hit_rate": 0.4}
+    assert stats["product-list"]["misses"] == 1
+
+
+@pytest.mark.django_db
+def test_response_cache_key_normalizes_query_params(rf):
+    from rest_framework.request import Request
+    from store.cache import normalized_query
+
+    first = Request(rf.get("/api/products/", {"name": "a", "ordering": "best_price", "q": ""}))
+    second = Request(rf.get("/api/products/?ordering=best_price&name=a"))
+    assert normalized_query(first) == normalized_query(second)
+
+@pytest.mark.django_db
+def test_authenticated_reads_bypass_response_cache(api_client, product):
+    api_client.get("/api/products/")
+    Product.objects.filter(pk=product.pk).update(name="Renamed")
+    response = api_client.get("/api/products/")
+    assert response.data["results"][0]["name"] == "Renamed"
+
+def test_cached_response_mixin_defaults_to_basename_tag():
+    from store.cache import CachedResponseMixin
+
+    view = CachedResponseMixin()
+    view.basename = "store"
+    assert view.get_cache_tags() == ["store"]
+
+
+@pytest.mark.django_db
+def test_product_detail_conditional_get(api_client, store, store_item):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    url = f"/api/products/{store_item.product_id}/"
+    response = api_client.get(url)
+    etag = response["ETag"]
+    assert etag.startswith('"')
+
+    with CaptureQueriesContext(connection) as queries:
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+    assert not response.content
+    assert len(queries.captured_queries) == 1
+
+    store_item.price = 19000
+    store_item.save()
+    response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response["ETag"] != etag
+
+@pytest.mark.django_db
+def test_store_detail_conditional_get(api_client, store):
+    url = f"/api/mystore/{store.id}/"
+    etag = api_client.get(url)["ETag"]
+    assert api_client.get(url, HTTP_IF_NONE_MATCH=f'"other", {etag}').status_code == 304
+
+    store.description = "Updated"
+    store.save()
+    assert api_client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+@pytest.mark.django_db
+def test_conditional_get_without_etag_skips_validation(api_client, store, monkeypatch):
+    from store.views import StoreViewSet
+
+    monkeypatch.setattr(StoreViewSet, "get_etag", lambda self: None)
+    response = api_client.get(f"/api/mystore/{store.id}/", HTTP_IF_NONE_MATCH="*")
+    assert response.status_code == 200
+    assert "ETag" not in response
+
+@pytest.mark.django_db
+def test_list_weak_etag(api_client, product):
+    response = api_client.get("/api/products/")
+    etag = response["ETag"]
+    assert etag.startswith('W/"')
+    assert api_client.get("/api/products/", HTTP_IF_NONE_MATCH=etag).status_code == 304
+    assert api_client.get("/api/products/", {"name": "none"}, HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+
+@pytest.mark.django_db
+def test_product_list_facets(api_client, store, category):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    books = Category.objects.create(name="Books", image="")
+    for i, (rating, price, stock) in enumerate([(4.5, 50000, 1), (3.0, 200000, 0), (None, 200000, 2)]):
+        product = Product.objects.create(name=f"Item {i}", description="Facet", rating=rating)
+        product.categories.add(category if i < 2 else books)
+        StoreItem.objects.create(product=product, store=store, price=price, stock=stock)
+
+    with CaptureQueriesContext(connection) as queries:
+        response = api_client.get("/api/products/", {"facets": "1"})
+    facets = response.data["facets"]
+    assert facets["categories"] == [
+        {"id": category.id, "name": "Electronics", "count": 2},
+        {"id": books.id, "name": "Books", "count": 1},
+    ]
+    assert [bucket["count"] for bucket in facets["rating"]] == [0, 0, 0, 1, 1, 1]
+    assert [bucket["count"] for bucket in facets["price"]] == [1, 2, 0, 0, 0]
+    assert facets["in_stock"] == {"true": 2, "false": 1}
+    grouped = [q["sql"] for q in queries.captured_queries if "FILTER (WHERE" in q["sql"] or "category__name" in q["sql"]]
+    assert len(grouped) == 3
+
+    response = api_client.get("/api/products/", {"facets": "1", "max_price": 100000, "page": 1})
+    assert response.data["facets"]["in_stock"] == {"true": 1, "false": 0}
+
+    with CaptureQueriesContext(connection) as queries:
+        api_client.get("/api/products/", {"facets": "1", "max_price": 100000, "ordering": "best_price"})
+    assert not any("FILTER (WHERE" in q["sql"] or "category__name" in q["sql"] for q in queries.captured_queries)
+
+
+@pytest.mark.django_db
+def test_review_stats_follow_create_update_delete(api_client, test_user, product, store):
+    from django.core.management import call_command
+
+    first = Review.objects.create(user=test_user, product=product, store=store, rating=5, comment="Great")
+    Review.objects.create(user=test_user, product=product, rating=2, comment="Meh")
+    product.refresh_from_db()
+    store.refresh_from_db()
+    assert (product.review_count, product.rating_sum, float(product.rating)) == (2, 7, 3.5)
+    assert product.rating_histogram == {1: 0, 2: 1, 3: 0, 4: 0, 5: 1}
+    assert (store.review_count, store.average_rating) == (1, 5.0)
+
+    first.rating = 3
+    first.store = None
+    first.save()
+    product.refresh_from_db()
+    store.refresh_from_db()
+    assert (product.rating_sum, float(product.rating), product.rating_5_count, product.rating_3_count) == (5, 2.5, 0, 1)
+    assert (store.review_count, store.rating_sum, store.rating_5_count) == (0, 0, 0)
+
+    Review.objects.filter(product=product).delete()
+    product.refresh_from_db()
+    assert (product.review_count, product.rating) == (0, None)
+
+    assert api_client.post(f"/api/products/{product.id}/review_create/", {"rating": 6, "comment": "!"}, format="json").status_code == 400
+    Review.objects.bulk_create([Review(user=test_user, product=product, rating=4, comment="Imported")])
+    call_command("rebuild_review_stats")
+    product.refresh_from_db()
+    assert (product.review_count, float(product.rating), product.rating_4_count) == (1, 4.0, 1)
+    assert api_client.get("/api/products/", {"rating_min": 4}).data["results"][0]["review_count"] == 1
+    assert api_client.get("/api/products/", {"rating_max": 3.9}).data["results"] == []
+
+
+@pytest.mark.django_db
+def test_moving_a_review_refreshes_the_old_targets(test_user, product, store):
+    anonymous = APIClient()
+    other_product = Product.objects.create(name="Tablet", description="Big screen")
+    other_store = Store.objects.create(name="Other Store", seller=test_user)
+    review = Review.objects.create(user=test_user, product=product, store=store, rating=5, comment="Great")
+
+    product_etag = anonymous.get(f"/api/products/{product.id}/")["ETag"]
+    store_etag = anonymous.get(f"/api/mystore/{store.id}/")["ETag"]
+
+    review.product, review.store = other_product, other_store
+    review.save()
+
+    response = anonymous.get(f"/api/products/{product.id}/", HTTP_IF_NONE_MATCH=product_etag)
+    assert response.status_code == 200
+    assert response.data["review_count"] == 0
+    response = anonymous.get(f"/api/mystore/{store.id}/", HTTP_IF_NONE_MATCH=store_etag)
+    assert response.status_code == 200
+    assert response.data["review_count"] == 0
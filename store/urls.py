@@ -8,6 +8,7 @@ from .views import (
     StoreItemViewSet,
     ReviewViewSet,
     category_tree_view,
+    cache_stats_view,
     SellerStoreViewSet,
     SellerProductViewSet,
     SellerCategoryViewSet
@@ -30,4 +31,5 @@ router.register(r'seller/categories', SellerCategoryViewSet, basename='seller-ca
 
 urlpatterns = [
     path('category-tree/', category_tree_view, name='category-tree'),
+    path('cache-stats/', cache_stats_view, name='cache-stats'),
 ] + router.urls
\ No newline at end of file
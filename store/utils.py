@@ -0,0 +1,45 @@
+from django.core.cache import cache
+from django.db.models import Case, IntegerField, Value, When
+from store.models import Category
+
+
+CATEGORY_TREE_CACHE_KEY = "store:category_tree"
+CATEGORY_TREE_CACHE_TIMEOUT = 60 * 60
+
+
+def build_category_tree():
+    rows = Category.objects.filter(is_active=True).order_by('id').values_list('id', 'name', 'parent_id')
+    nodes = {}
+    parents = {}
+    for pk, name, parent_id in rows:
+        nodes[pk] = {"id": pk, "name": name, "children": []}
+        parents[pk] = parent_id
+
+    roots = []
+    for pk, node in nodes.items():
+        parent_id = parents[pk]
+        if parent_id is None:
+            roots.append(node)
+        elif parent_id in nodes:
+            nodes[parent_id]["children"].append(node)
+    return roots
+
+
+def get_category_tree():
+    tree = cache.get(CATEGORY_TREE_CACHE_KEY)
+    if tree is None:
+        tree = build_category_tree()
+        cache.set(CATEGORY_TREE_CACHE_KEY, tree, CATEGORY_TREE_CACHE_TIMEOUT)
+    return tree
+
+
+def invalidate_category_tree():
+    cache.delete(CATEGORY_TREE_CACHE_KEY)
+
+
+def by_store_item(values):
+    """CASE expression mapping {store_item_id: int} for bulk UPDATEs on StoreItem."""
+    return Case(
+        *[When(pk=pk, then=Value(value)) for pk, value in values.items()],
+        output_field=IntegerField(),
+    )
@@ -1,6 +1,8 @@
 from rest_framework import viewsets , status
-from rest_framework.permissions import IsAuthenticatedOrReadOnly , IsAuthenticated
+from rest_framework.permissions import IsAuthenticatedOrReadOnly , IsAuthenticated, IsAdminUser
 from rest_framework.exceptions import PermissionDenied
+from django.db.models import Count, F, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django_filters.rest_framework import DjangoFilterBackend
 from store.models import Category, Product, ProductImage, Store, StoreItem, Review
 from store.serializers import (
@@ -11,20 +13,25 @@ from store.serializers import (
     StoreSerializer,
     StoreItemSerializer,
     ReviewSerializer,
-    CategoryTreeSerializer,
     ProductWriteSerializer
 )
 from store.filters import ProductFilter
+from store.pagination import ProductPagination, ReviewPagination
+from store.utils import get_category_tree
+from store.facets import get_facets
+from store.cache import CachedResponseMixin, ConditionalGetMixin, cached_response, get_cache_stats, get_generations, make_etag
 from store.permissions import IsSeller
-from rest_framework.decorators import api_view , action
+from rest_framework.decorators import api_view , action, permission_classes
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer 
 
+    def get_cache_tags(self):
+        return ['categories']
+
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
             return [IsAuthenticated(), IsSeller()]
@@ -33,12 +40,66 @@ class CategoryViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         return Category.objects.filter(is_active=True)
 
+    @action(detail=True, methods=['get'])
+    def breadcrumb(self, request, pk=None):
+        category = self.get_object()
+        return Response(list(category.get_ancestors().values('id', 'name')))
+
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(ConditionalGetMixin, CachedResponseMixin, viewsets.ModelViewSet):
     queryset = Product.objects.prefetch_related('categories', 'images').order_by('id')
     filterset_class = ProductFilter
     filter_backends = [DjangoFilterBackend]
+    pagination_class = ProductPagination
+
+    def get_cache_tags(self):
+        if self.action == 'retrieve':
+            return [f"product:{self.kwargs['pk']}", 'categories']
+        return ['products', 'categories']
+
+    def get_etag(self):
+        pk = self.kwargs['pk']
+        items = StoreItem.objects.filter(product_id=pk).aggregate(updated=Max('updated_at'), count=Count('id'))
+        return make_etag(pk, *get_generations([f"product:{pk}", 'categories']), items['updated'], items['count'])
+
+    def get_queryset(self):
+        active_items = StoreItem.objects.filter(product=OuterRef('pk'), is_active=True)
+        best_price = (
+            active_items.annotate(effective_price=Coalesce('discount_price', 'price'))
+            .order_by('effective_price')
+            .values('effective_price')[:1]
+        )
+        in_stock_sellers = (
+            active_items.filter(stock__gt=F('reserved'))
+            .values('product')
+            .annotate(count=Count('pk'))
+            .values('count')
+        )
+        popularity = (
+            StoreItem.objects.filter(product=OuterRef('pk'))
+            .values('product')
+            .annotate(total=Sum('units_sold'))
+            .values('total')
+        )
+        return super().get_queryset().annotate(
+            best_price=Subquery(best_price),
+            in_stock_sellers=Coalesce(Subquery(in_stock_sellers), 0),
+        ).alias(
+            popularity=Coalesce(Subquery(popularity), 0),
+        )
+
+    def paginate_queryset(self, queryset):
+        self.facets = None
+        if self.request.query_params.get('facets') in ('1', 'true'):
+            self.facets = get_facets(self.request, queryset)
+        return super().paginate_queryset(queryset)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.facets is not None:
+            response.data['facets'] = self.facets
+        return response
 
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
@@ -50,9 +111,8 @@ class ProductViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'], url_path='review_list')
     def review_list(self, request, pk=None):
         product = self.get_object()
-        reviews = Review.objects.filter(product=product).order_by('-created_at')
-        paginator = PageNumberPagination()
-        paginator.page_size = request.query_params.get('page_size', 5)
+        reviews = Review.objects.filter(product=product).order_by('-created_at', '-id')
+        paginator = ReviewPagination()
         paginated_reviews = paginator.paginate_queryset(reviews, request)
         serializer = ReviewSerializer(paginated_reviews, many=True)
         return paginator.get_paginated_response(serializer.data)
@@ -71,10 +131,14 @@ class ProductImageViewSet(viewsets.ModelViewSet):
     queryset = ProductImage.objects.all()
     serializer_class = ProductImageSerializer
 
-class StoreViewSet(viewsets.ModelViewSet):
+class StoreViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Store.objects.all()
     serializer_class = StoreSerializer
 
+    def get_etag(self):
+        pk = self.kwargs['pk']
+        return make_etag('store', pk, *get_generations([f"store:{pk}"]))
+
     def get_permissions(self):
         if self.action in ['list', 'retrieve']:
             return [IsAuthenticatedOrReadOnly()]
@@ -143,7 +207,7 @@ class SellerProductViewSet(viewsets.ModelViewSet):
     permission_classes = [IsSeller]
 
     def get_queryset(self):
-        return Product.objects.filter(storeitem__store__seller=self.request.user).distinct()
+        return Product.objects.filter(storeitem__store__seller=self.request.user).distinct().prefetch_related('categories')
 
     def perform_create(self, serializer):
         serializer.save()
@@ -166,6 +230,10 @@ class SellerCategoryViewSet(viewsets.ModelViewSet):
 
 @api_view(['GET'])
 def category_tree_view(request):
-    top_categories = Category.objects.filter(parent=None, is_active=True)
-    serializer = CategoryTreeSerializer(top_categories, many=True)
-    return Response(serializer.data)
\ No newline at end of file
+    return cached_response(request, 'category-tree', ['categories'], lambda: Response(get_category_tree()))
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def cache_stats_view(request):
+    return Response(get_cache_stats())